@@ -6,8 +6,29 @@ import json
 from models.threat_model import ThreatModel
 from models.explosion_model import ExplosionModel
 from models.dispersion_model import DispersionModel
-from utils.geo_utils import calculate_threat_zone
+from utils.geo_utils import calculate_threat_zone, incident_key
+from utils.zone_registry import ActiveZoneRegistry
+from utils.sensor_index import SensorGridIndex
+from utils.routing import EvacuationRouter, load_site_graph
+from utils.hazard_raster import HazardRasterCache
+from utils.incidents import IncidentManager
+from utils.admission import AdmissionController
+from utils.singleflight import SingleFlight
+from utils.sensor_store import (HistoricalStore, decode_sensor_records, validate_sensor_records,
+                                reading_to_record, columns_to_records, sensor_record_id)
+from utils.drift import DriftMonitor
+from models.cascade import THREAT_FEATURES
+from utils.wal import WriteAheadLog
+from utils.model_registry import ModelRegistry
+from utils.shadow import ShadowScorer
+from utils.site_models import SiteModelCache
+from models.puff_model import PuffSimulationStore
+from config import Config
 from utils.visualization import generate_threat_zone_map
+import time
+import hmac
+import threading
+import joblib
 import logging
 
 app = Flask(__name__)
@@ -18,10 +39,179 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize models
-threat_model = ThreatModel()
-explosion_model = ExplosionModel()
-dispersion_model = DispersionModel()
+def _published(path):
+    """Check that a published artifact deserializes (the model constructors fall back to defaults instead)"""
+    if path is not None:
+        joblib.load(path)
+    return path
+
+def _load_threat_model(path):
+    if _published(path) is None:
+        return ThreatModel()
+    # A prefilter and training profile published alongside the forest are picked up with it
+    directory = os.path.dirname(path)
+    return ThreatModel(path, prefilter_path=os.path.join(directory, 'threat_prefilter.joblib'),
+                       profile_path=os.path.join(directory, 'threat_profile.joblib'))
+
+def _load_explosion_model(path):
+    if _published(path) is None:
+        return ExplosionModel()
+    # The consequence correction fitted with this version is published alongside it
+    return ExplosionModel(model_path=path,
+                          correction_path=os.path.join(os.path.dirname(path), 'explosion_correction.joblib'))
+
+def _load_dispersion_model(path):
+    return DispersionModel(_published(path))
+
+def _warm_threat_model(model):
+    model.predict(mq2=300, mq4=300, mq6=300, mq8=300, temperature=25, humidity=50)
+
+def _warm_explosion_model(model):
+    if not model.predict(gas_concentration=5000, temperature=25):
+        raise ValueError("explosion model returned no prediction")
+
+def _warm_dispersion_model(model):
+    model.predict(source_strength=1000, wind_speed=3, wind_direction=90, latitude=0, longitude=0)
+
+# Initialize models; new versions are published and swapped in through the registry
+models = ModelRegistry({
+    'threat': (_load_threat_model, _warm_threat_model),
+    'explosion': (_load_explosion_model, _warm_explosion_model),
+    'dispersion': (_load_dispersion_model, _warm_dispersion_model)
+}, companions={
+    'threat': ('threat_prefilter.joblib', 'threat_profile.joblib'),
+    'explosion': ('explosion_correction.joblib',)
+})
+
+# Sites with a model of their own; other requests use the global threat model
+site_models = SiteModelCache(_load_threat_model)
+
+def _threat_model_for(site_id):
+    """Threat model serving a site: its own if it has one, else the global one"""
+    model = site_models.get(site_id) if site_id is not None else None
+    return model if model is not None else models.get('threat')
+
+# Zones of recent incidents, kept for point-in-zone queries
+zone_registry = ActiveZoneRegistry()
+
+# Locations of sensors that have reported in, for proximity lookups
+sensor_index = SensorGridIndex()
+
+# Columnar store of ingested sensor readings, fed through a write-ahead log
+historical_store = HistoricalStore()
+
+def _compact_sensor_log(payloads, segment):
+    """Move the records of a closed write-ahead log segment into the historical store"""
+    records = np.concatenate([decode_sensor_records(payload) for payload in payloads])
+    historical_store.append({name: records[name] for name in records.dtype.names}, segment=segment)
+
+# Opened on the first ingested reading rather than on import, so processes that
+# never ingest (the debug reloader's parent, tooling importing the app) start
+# no WAL threads and claim no writer directory
+_sensor_log = None
+_sensor_log_lock = threading.Lock()
+
+def get_sensor_log():
+    """Write-ahead log of ingested readings, opened on first use"""
+    global _sensor_log
+    with _sensor_log_lock:
+        if _sensor_log is None:
+            _sensor_log = WriteAheadLog(_compact_sensor_log)
+        return _sensor_log
+
+# Live readings per site compared with the threat model's training distribution
+drift_monitor = DriftMonitor(models.get('threat').profile)
+
+def _follow_threat_profile():
+    """Compare with the training profile of the active threat model, which changes on swaps"""
+    profile = models.get('threat').profile
+    if profile is not drift_monitor.profile:
+        drift_monitor.set_profile(profile)
+
+def _monitor_drift(columns):
+    """Add accepted readings to the drift histograms"""
+    _follow_threat_profile()
+    drift_monitor.update(columns['sensor_id'], np.column_stack([columns[name] for name in THREAT_FEATURES]))
+
+# Route over the site's path network when one is available
+site_graph = load_site_graph(Config.SITE_GRAPH_PATH) if os.path.exists(Config.SITE_GRAPH_PATH) else None
+evacuation_router = EvacuationRouter(site_graph) if site_graph is not None else None
+
+# Hazard rasters of recent incidents, shared by all evacuation queries against them
+hazard_rasters = HazardRasterCache(models.get('dispersion'))
+
+# Time-stepped puff simulations of ongoing releases, advanced as wind updates arrive
+puff_simulations = PuffSimulationStore()
+
+def _incident_inputs(zone_id, sensor_data, location_data, wind_data):
+    """Collect the inputs of an incident recomputation from a request"""
+    return {
+        'zone_id': zone_id,
+        'gas_concentration': max(sensor_data['mq2'], sensor_data['mq4'],
+                                 sensor_data['mq6'], sensor_data['mq8']),
+        'temperature': sensor_data['temperature'],
+        'latitude': location_data['latitude'],
+        'longitude': location_data['longitude'],
+        'wind_speed': wind_data['speed'],
+        'wind_direction': wind_data['direction']
+    }
+
+def compute_incident(inputs):
+    """
+    Calculate explosion parameters, dispersion and threat zones of an incident
+    and make the zones available to zone queries and evacuation routing
+    """
+    explosion_params = models.get('explosion').predict(
+        gas_concentration=inputs['gas_concentration'],
+        temperature=inputs['temperature']
+    )
+
+    dispersion_result = models.get('dispersion').predict(
+        source_strength=explosion_params.get('energy_release', 1000),
+        wind_speed=inputs['wind_speed'],
+        wind_direction=inputs['wind_direction'],
+        latitude=inputs['latitude'],
+        longitude=inputs['longitude']
+    )
+
+    zones = calculate_threat_zone(
+        latitude=inputs['latitude'],
+        longitude=inputs['longitude'],
+        explosion_params=explosion_params,
+        dispersion_params=dispersion_result,
+        wind_speed=inputs['wind_speed'],
+        wind_direction=inputs['wind_direction']
+    )
+
+    zone_registry.ingest(inputs['zone_id'], zones)
+    hazard_rasters.register(
+        inputs['zone_id'],
+        latitude=inputs['latitude'],
+        longitude=inputs['longitude'],
+        explosion_params=explosion_params,
+        dispersion_params=dispersion_result,
+        source_strength=explosion_params.get('energy_release', 1000),
+        wind_speed=inputs['wind_speed'],
+        wind_direction=inputs['wind_direction']
+    )
+
+    return {
+        'explosion_params': explosion_params,
+        'dispersion_params': dispersion_result,
+        'zones': zones
+    }
+
+# Incidents alarming at the same time are recomputed by risk, then staleness
+incident_manager = IncidentManager(compute_incident)
+
+# Bounds the number of full predictions in flight; excess requests get a degraded answer
+admission = AdmissionController()
+
+# Concurrent identical prediction requests wait on a single computation
+predictions = SingleFlight()
+
+# Candidate threat model scored off the request path on a sample of /predict traffic
+shadow = ShadowScorer()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -40,6 +230,11 @@ def model_info():
             "threat_zone_calculation"
         ],
         "sensors_supported": ["mq2", "mq4", "mq6", "mq8", "temperature", "humidity"],
+        "admission": admission.stats(),
+        "coalescing": predictions.stats(),
+        "cascade": models.get('threat').cascade_stats(),
+        "models": {name: models.version(name) for name in models.factories},
+        "site_models": site_models.stats(),
         "last_updated": "2024-01-01"
     }), 200
 
@@ -64,7 +259,8 @@ def predict_threat():
         "wind": {
             "speed": float,  # in m/s
             "direction": float  # in degrees from north
-        }
+        },
+        "site_id": "string"  # optional, selects the site's own model if it has one
     }
     """
     try:
@@ -75,6 +271,7 @@ def predict_threat():
         sensor_data = data.get('sensors', {})
         location_data = data.get('location', {})
         wind_data = data.get('wind', {})
+        site_id = data.get('site_id')
 
         # Validate input
         required_sensors = ['mq2', 'mq4', 'mq6', 'mq8', 'temperature', 'humidity']
@@ -88,63 +285,13 @@ def predict_threat():
         if 'speed' not in wind_data or 'direction' not in wind_data:
             return jsonify({"error": "Missing wind data"}), 400
 
-        # Make predictions
-        threat_level = threat_model.predict(
-            mq2=sensor_data['mq2'],
-            mq4=sensor_data['mq4'],
-            mq6=sensor_data['mq6'],
-            mq8=sensor_data['mq8'],
-            temperature=sensor_data['temperature'],
-            humidity=sensor_data['humidity']
+        # Identical concurrent requests share one computation
+        (response, status), _ = predictions.do(
+            _prediction_key('predict/threat', sensor_data, location_data, wind_data, site_id),
+            lambda: _predict_threat(sensor_data, location_data, wind_data, site_id)
         )
 
-        # If threat detected, calculate explosion parameters and dispersion
-        if threat_level['risk_score'] > 0.5:
-            explosion_params = explosion_model.predict(
-                gas_concentration=max(sensor_data['mq2'], sensor_data['mq4'],
-                                      sensor_data['mq6'], sensor_data['mq8']),
-                temperature=sensor_data['temperature']
-            )
-
-            dispersion_result = dispersion_model.predict(
-                source_strength=explosion_params['energy_release'],
-                wind_speed=wind_data['speed'],
-                wind_direction=wind_data['direction'],
-                latitude=location_data['latitude'],
-                longitude=location_data['longitude']
-            )
-
-            # Generate threat zone shapes
-            threat_zones = calculate_threat_zone(
-                latitude=location_data['latitude'],
-                longitude=location_data['longitude'],
-                explosion_params=explosion_params,
-                dispersion_params=dispersion_result,
-                wind_speed=wind_data['speed'],
-                wind_direction=wind_data['direction']
-            )
-
-            # Generate visualization (optional - can be done client-side)
-            map_data = generate_threat_zone_map(
-                latitude=location_data['latitude'],
-                longitude=location_data['longitude'],
-                threat_zones=threat_zones
-            )
-
-            response = {
-                "threat_level": threat_level,
-                "explosion_params": explosion_params,
-                "dispersion_params": dispersion_result,
-                "threat_zones": threat_zones,
-                "map_url": map_data.get('map_url', None)
-            }
-        else:
-            response = {
-                "threat_level": threat_level,
-                "message": "No significant threat detected"
-            }
-
-        return jsonify(response), 200
+        return jsonify(response), status
 
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
@@ -182,8 +329,91 @@ def predict():
             'speed': data.get('wind_speed', 5),
             'direction': data.get('wind_direction', 0)
         }
+        site_id = data.get('site_id')
+
+        # Identical concurrent requests share one computation
+        response, _ = predictions.do(
+            _prediction_key('predict', sensor_data, location_data, wind_data, site_id),
+            lambda: _predict(sensor_data, location_data, wind_data, site_id)
+        )
+
+        return jsonify(response), 200
+
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _predict_threat(sensor_data, location_data, wind_data, site_id=None):
+    """Detailed threat analysis of a validated /predict/threat request"""
+    # Make predictions
+    threat_level = _threat_model_for(site_id).predict(
+        mq2=sensor_data['mq2'],
+        mq4=sensor_data['mq4'],
+        mq6=sensor_data['mq6'],
+        mq8=sensor_data['mq8'],
+        temperature=sensor_data['temperature'],
+        humidity=sensor_data['humidity']
+    )
+
+    # If threat detected, get the incident's explosion parameters, dispersion and zones
+    incident = None
+    warrants_zones = _warrants_zones(threat_level, 0.5)
+    if warrants_zones:
+        zone_id = incident_key(location_data['latitude'], location_data['longitude'])
+        incident = incident_manager.update(
+            zone_id,
+            _incident_inputs(zone_id, sensor_data, location_data, wind_data),
+            threat_level['risk_score'],
+            threat_level['risk_level']
+        )
+
+    if incident is not None:
+        explosion_params = incident['explosion_params']
+        dispersion_result = incident['dispersion_params']
+        threat_zones = incident['zones']
+
+        # Generate visualization (optional - can be done client-side)
+        map_data = generate_threat_zone_map(
+            latitude=location_data['latitude'],
+            longitude=location_data['longitude'],
+            threat_zones=threat_zones
+        )
+
+        response = {
+            "threat_level": threat_level,
+            "explosion_params": explosion_params,
+            "dispersion_params": dispersion_result,
+            "threat_zones": threat_zones,
+            "zone_id": zone_id,
+            "map_url": map_data.get('map_url', None),
+            "is_fallback": False
+        }
+    elif warrants_zones:
+        # Zones did not arrive in time; answer with the threat level alone, like /predict
+        response = {
+            "threat_level": threat_level,
+            "zone_id": zone_id,
+            "is_fallback": True,
+            "message": "Threat zones are still being computed"
+        }
+    else:
+        response = {
+            "threat_level": threat_level,
+            "is_fallback": False,
+            "message": "No significant threat detected"
+        }
+
+    return response, 200
+
+def _predict(sensor_data, location_data, wind_data, site_id=None):
+    """Prediction in the backend format for a parsed /predict request"""
+    with admission.admit() as admitted:
+        if not admitted:
+            return _degraded_prediction(sensor_data, location_data, wind_data)
 
         # Make threat prediction
+        threat_model = _threat_model_for(site_id)
+        start = time.perf_counter()
         threat_result = threat_model.predict(
             mq2=sensor_data['mq2'],
             mq4=sensor_data['mq4'],
@@ -192,65 +422,141 @@ def predict():
             temperature=sensor_data['temperature'],
             humidity=sensor_data['humidity']
         )
+        if threat_model is models.get('threat'):
+            # The candidate is compared with the global model only
+            shadow.submit(sensor_data, threat_result, time.perf_counter() - start)
 
         # If significant threat detected, calculate zones
         zones = {}
+        zone_id = None
         evacuation_routes = []
+        is_fallback = False
 
-        if threat_result['risk_score'] > 0.3:
-            # Calculate explosion parameters
-            explosion_params = explosion_model.predict(
-                gas_concentration=max(sensor_data['mq2'], sensor_data['mq4'],
-                                    sensor_data['mq6'], sensor_data['mq8']),
-                temperature=sensor_data['temperature']
-            )
-
-            # Calculate dispersion
-            dispersion_result = dispersion_model.predict(
-                source_strength=explosion_params.get('energy_release', 1000),
-                wind_speed=wind_data['speed'],
-                wind_direction=wind_data['direction'],
-                latitude=location_data['latitude'],
-                longitude=location_data['longitude']
-            )
-
-            # Generate threat zones
-            zones = calculate_threat_zone(
-                latitude=location_data['latitude'],
-                longitude=location_data['longitude'],
-                explosion_params=explosion_params,
-                dispersion_params=dispersion_result,
-                wind_speed=wind_data['speed'],
-                wind_direction=wind_data['direction']
+        if _warrants_zones(threat_result, 0.3):
+            zone_id = incident_key(location_data['latitude'], location_data['longitude'])
+            incident = incident_manager.update(
+                zone_id,
+                _incident_inputs(zone_id, sensor_data, location_data, wind_data),
+                threat_result['risk_score'],
+                threat_result['risk_level']
             )
+            if incident is not None:
+                zones = incident['zones']
+            else:
+                # Zones did not arrive in time
+                is_fallback = True
 
-            # Generate evacuation routes (simplified)
+            # Generate evacuation routes
             evacuation_routes = generate_evacuation_routes(
                 location_data['latitude'],
                 location_data['longitude'],
-                wind_data['direction']
+                wind_data['direction'],
+                incident_id=zone_id
             )
 
-        # Format response for backend compatibility
-        response = {
-            "threat_level": threat_result['risk_level'].lower(),
-            "prediction_value": int(threat_result['risk_score'] * 10),
-            "confidence": 0.85,
-            "zones": zones,
-            "evacuation_routes": evacuation_routes,
-            "model_version": "1.0.0",
-            "is_fallback": False,
-            "sensor_status": threat_result.get('sensor_status', {}),
-            "recommendations": threat_result.get('recommendations', [])
-        }
+    # Format response for backend compatibility
+    response = {
+        "threat_level": threat_result['risk_level'].lower(),
+        "prediction_value": int(threat_result['risk_score'] * 10),
+        "confidence": threat_result['confidence'] if threat_result['confidence'] is not None else 0.5,
+        "uncertainty": threat_result['uncertainty'],
+        "attributions": threat_result['attributions'],
+        "zones": zones,
+        "zone_id": zone_id,
+        "evacuation_routes": evacuation_routes,
+        "model_version": "1.0.0",
+        "is_fallback": is_fallback,
+        "sensor_status": threat_result.get('sensor_status', {}),
+        "recommendations": threat_result.get('recommendations', [])
+    }
 
-        return jsonify(response), 200
+    return response
 
-    except Exception as e:
-        logger.error(f"Error in prediction: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+def _warrants_zones(threat_result, min_risk_score):
+    """
+    Whether a prediction is worth computing threat zones for: above the risk cutoff and,
+    unless the risk is HIGH, with enough of the model's trees agreeing
+    """
+    if threat_result['risk_score'] <= min_risk_score:
+        return False
+    confidence = threat_result.get('confidence')
+    return (threat_result['risk_level'] == 'HIGH' or confidence is None
+            or confidence >= Config.ZONE_MIN_CONFIDENCE)
+
+def _prediction_key(endpoint, sensor_data, location_data, wind_data, site_id=None):
+    """Normalize prediction inputs so equivalent requests map to the same key"""
+    return (
+        endpoint,
+        site_id,
+        incident_key(location_data['latitude'], location_data['longitude']),
+        tuple(round(float(sensor_data[sensor]), 3)
+              for sensor in ('mq2', 'mq4', 'mq6', 'mq8', 'temperature', 'humidity')),
+        round(float(wind_data['speed']), 2),
+        round(float(wind_data['direction']), 1)
+    )
+
+def _degraded_prediction(sensor_data, location_data, wind_data):
+    """
+    Cheap prediction for requests shed under overload: threshold-based risk,
+    no zones and straight-line evacuation routes
+    """
+    threat_result = models.get('threat').predict(
+        mq2=sensor_data['mq2'],
+        mq4=sensor_data['mq4'],
+        mq6=sensor_data['mq6'],
+        mq8=sensor_data['mq8'],
+        temperature=sensor_data['temperature'],
+        humidity=sensor_data['humidity'],
+        naive=True
+    )
+
+    evacuation_routes = []
+    if threat_result['risk_score'] > 0.3:
+        evacuation_routes = _straight_line_routes(location_data['latitude'], location_data['longitude'],
+                                                  wind_data['direction'])
+
+    return {
+        "threat_level": threat_result['risk_level'].lower(),
+        "prediction_value": int(threat_result['risk_score'] * 10),
+        "confidence": 0.5,
+        "zones": {},
+        "zone_id": None,
+        "evacuation_routes": evacuation_routes,
+        "model_version": "1.0.0",
+        "is_fallback": True,
+        "sensor_status": threat_result.get('sensor_status', {}),
+        "recommendations": threat_result.get('recommendations', [])
+    }
 
-def generate_evacuation_routes(lat, lon, wind_direction):
+def plan_evacuation_routes(latitudes, longitudes, incident_id=None):
+    """
+    Route a batch of origins to safety
+
+    Uses the site graph when one is loaded and the incident's precomputed
+    hazard raster when the incident is known. Returns one route per origin,
+    None where no hazard-aware route is available.
+    """
+    raster = hazard_rasters.get(incident_id) if incident_id is not None else None
+
+    if evacuation_router is not None:
+        if raster is not None:
+            return evacuation_router.routes(latitudes, longitudes, hazard=raster.edge_levels(site_graph))
+        return evacuation_router.routes(latitudes, longitudes, zone_registry.zone_polygons())
+
+    if raster is not None:
+        return raster.routes(latitudes, longitudes)
+
+    return [None] * len(latitudes)
+
+def generate_evacuation_routes(lat, lon, wind_direction, incident_id=None):
+    """Generate evacuation routes, avoiding known hazards where possible"""
+    route = plan_evacuation_routes([lat], [lon], incident_id)[0]
+    if route is not None:
+        return [route]
+
+    return _straight_line_routes(lat, lon, wind_direction)
+
+def _straight_line_routes(lat, lon, wind_direction):
     """Generate simple evacuation routes"""
     routes = []
 
@@ -280,7 +586,14 @@ def generate_evacuation_routes(lat, lon, wind_direction):
 
 @app.route('/evacuation-routes', methods=['POST'])
 def evacuation_routes():
-    """Generate evacuation routes for a given threat zone"""
+    """
+    Generate evacuation routes for a given threat zone
+    Optional fields:
+    {
+        "incident_id": str,  # zone_id returned by /predict, defaults to the source location
+        "origins": [[latitude, longitude], ...]  # route many people at once
+    }
+    """
     try:
         data = request.get_json()
 
@@ -299,29 +612,452 @@ def evacuation_routes():
         elif 'wind_direction' in data:
             wind_direction = data['wind_direction']
 
-        routes = generate_evacuation_routes(lat, lon, wind_direction)
+        # Routes are planned against the incident at the source location
+        incident_id = data.get('incident_id') or incident_key(lat, lon)
 
-        return jsonify({"routes": routes}), 200
+        # Batched queries route every origin over the same precomputed hazard field
+        origins = data.get('origins')
+        if origins:
+            origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+            routes = plan_evacuation_routes(origins[:, 0], origins[:, 1], incident_id)
+            routes = [
+                route if route is not None else _straight_line_routes(o_lat, o_lon, wind_direction)[0]
+                for route, (o_lat, o_lon) in zip(routes, origins.tolist())
+            ]
+        else:
+            routes = generate_evacuation_routes(lat, lon, wind_direction, incident_id=incident_id)
+
+        return jsonify({"routes": routes, "incident_id": incident_id}), 200
 
     except Exception as e:
         logger.error(f"Error generating evacuation routes: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/zones/query', methods=['POST'])
+def query_zones():
+    """
+    Find the active threat zones containing each of a batch of points
+    Expected JSON format:
+    {
+        "points": [[latitude, longitude], ...]
+    }
+    """
+    try:
+        data = request.get_json()
+
+        points = data.get('points') if data else None
+        if not points:
+            return jsonify({"error": "Missing points"}), 400
+
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[1] != 2:
+            return jsonify({"error": "Points must be [latitude, longitude] pairs"}), 400
+
+        results = zone_registry.query(points[:, 0], points[:, 1])
+
+        return jsonify({
+            "results": results,
+            "active_incidents": len(zone_registry.active_zones())
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error querying zones: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/incidents', methods=['GET'])
+def list_incidents():
+    """List the tracked incidents with their risk and recomputation state"""
+    try:
+        return jsonify({"incidents": incident_manager.status()}), 200
+
+    except Exception as e:
+        logger.error(f"Error listing incidents: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/dispersion/puff', methods=['POST'])
+def step_puff_dispersion():
+    """
+    Advance the puff simulation of an ongoing release and sample its concentration
+    Expected JSON format:
+    {
+        "incident_id": str,  # optional, derived from the location if omitted
+        "location": [latitude, longitude],
+        "release_rate": float,  # mass per second, optional after the first step
+        "wind_speed": float,  # in m/s
+        "wind_direction": float,  # bearing the wind carries the release towards, in degrees
+        "dt": float,  # seconds to advance, up to Config.PUFF_MAX_DT, optional (0 only samples)
+        "points": [[latitude, longitude], ...]  # optional
+    }
+    """
+    try:
+        data = request.get_json()
+
+        location = data.get('location') if data else None
+        if not location:
+            return jsonify({"error": "Missing location data"}), 400
+
+        lat, lon = location if isinstance(location, list) else (location.get('latitude'), location.get('longitude'))
+        incident_id = data.get('incident_id') or incident_key(lat, lon)
+        release_rate = data.get('release_rate')
+        dt = float(data.get('dt', 0))
+        if not np.isfinite(dt) or dt < 0 or dt > Config.PUFF_MAX_DT:
+            return jsonify({"error": f"dt must be between 0 and {Config.PUFF_MAX_DT:g} seconds"}), 400
+
+        simulation, lock = puff_simulations.get_or_create(incident_id, lat, lon, float(release_rate or 0))
+
+        with lock:
+            if dt > 0:
+                simulation.step(dt, float(data.get('wind_speed', 5.0)), float(data.get('wind_direction', 0.0)),
+                                release_rate=float(release_rate) if release_rate is not None else None)
+
+            concentrations = []
+            points = data.get('points')
+            if points:
+                points = np.asarray(points, dtype=float)
+                if points.ndim != 2 or points.shape[1] != 2:
+                    return jsonify({"error": "Points must be [latitude, longitude] pairs"}), 400
+                concentrations = simulation.concentration(points[:, 0], points[:, 1]).tolist()
+
+            summary = simulation.summary()
+
+        return jsonify({
+            "incident_id": incident_id,
+            "simulation": summary,
+            "concentrations": concentrations
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error stepping puff dispersion: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/sensors/data', methods=['POST'])
 def receive_sensor_data():
-    """Endpoint to receive and store raw sensor data from Arduino"""
+    """
+    Endpoint to receive and store raw sensor data from Arduino
+
+    Accepts a single JSON reading, or with Content-Type application/octet-stream
+    a batch of fixed-layout binary records (see utils.sensor_store.SENSOR_RECORD_DTYPE)
+    """
     try:
-        data = request.get_json()
+        if request.mimetype == 'application/octet-stream':
+            return _receive_sensor_batch(request.get_data())
 
-        # Here you would typically store this data in a database
-        # For now, we'll just log it
+        data = request.get_json()
         logger.info(f"Received sensor data: {data}")
 
-        return jsonify({"status": "received"}), 200
+        # Store the reading durably, cleaned like a batch record
+        columns, accepted = validate_sensor_records(reading_to_record(data))
+        if data.get('site_id') is not None:
+            drift_monitor.assign(columns['sensor_id'], data['site_id'])
+        if accepted[0]:
+            get_sensor_log().append(columns_to_records(columns).tobytes())
+            _monitor_drift(columns)
+
+        # Keep track of where each sensor is for proximity lookups
+        _register_sensor_location(data)
+
+        return jsonify({"status": "received", "stored": bool(accepted[0])}), 200
 
     except Exception as e:
         logger.error(f"Error processing sensor data: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _receive_sensor_batch(payload):
+    """Validate a binary batch of sensor records and append it to the historical store"""
+    try:
+        records = decode_sensor_records(payload)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns, accepted = validate_sensor_records(records)
+    if accepted.any():
+        get_sensor_log().append(columns_to_records(columns).tobytes())
+        _monitor_drift(columns)
+
+    # Keep track of where each sensor is, using its latest located reading
+    located = np.flatnonzero(np.isfinite(columns['latitude']) & np.isfinite(columns['longitude']))[::-1]
+    if len(located):
+        unique_ids, first = np.unique(columns['sensor_id'][located], return_index=True)
+        latest = located[first]
+        sensor_index.register_many(unique_ids.tolist(), columns['latitude'][latest], columns['longitude'][latest])
+
+    rejected = int(len(records) - accepted.sum())
+    if rejected:
+        logger.warning(f"Rejected {rejected} of {len(records)} sensor records")
+
+    return jsonify({"status": "received", "accepted": int(accepted.sum()), "rejected": rejected}), 200
+
+def _register_sensor_location(data):
+    """Register the location of a sensor reading in the sensor index, if present"""
+    sensor_id = data.get('sensor_id', data.get('sensorId'))
+    if sensor_id is None:
+        return
+
+    location = data.get('location')
+    if isinstance(location, list) and len(location) == 2:
+        latitude, longitude = location
+    elif isinstance(location, dict):
+        latitude, longitude = location.get('latitude'), location.get('longitude')
+    else:
+        latitude, longitude = data.get('latitude'), data.get('longitude')
+
+    if latitude is not None and longitude is not None:
+        sensor_index.register(sensor_id, latitude, longitude)
+
+@app.route('/sensors/register', methods=['POST'])
+def register_sensors():
+    """
+    Register the locations of many sensors at once
+    Expected JSON format:
+    {
+        "sensors": [{"sensor_id": str, "latitude": float, "longitude": float,
+                     "site_id": str}, ...]  # site_id optional, groups readings for drift monitoring
+    }
+    """
+    try:
+        data = request.get_json()
+
+        sensors = data.get('sensors') if data else None
+        if not sensors:
+            return jsonify({"error": "Missing sensors"}), 400
+
+        for sensor in sensors:
+            if 'sensor_id' not in sensor or 'latitude' not in sensor or 'longitude' not in sensor:
+                return jsonify({"error": "Each sensor needs sensor_id, latitude and longitude"}), 400
+
+        sensor_index.register_many(
+            [sensor['sensor_id'] for sensor in sensors],
+            [sensor['latitude'] for sensor in sensors],
+            [sensor['longitude'] for sensor in sensors]
+        )
+        for sensor in sensors:
+            if sensor.get('site_id') is not None:
+                drift_monitor.assign([sensor_record_id(sensor['sensor_id'])], sensor['site_id'])
+
+        return jsonify({"status": "registered", "count": len(sensors), "total_sensors": len(sensor_index)}), 200
+
+    except Exception as e:
+        logger.error(f"Error registering sensors: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/drift', methods=['GET'])
+def drift_scores():
+    """
+    Drift of live readings from the threat model's training distribution, per site
+    Optional query parameter site_id restricts the report to one site
+    """
+    try:
+        _follow_threat_profile()
+        if drift_monitor.profile is None:
+            return jsonify({"error": "The active threat model has no training profile"}), 404
+
+        sites = drift_monitor.scores()
+        site_id = request.args.get('site_id')
+        if site_id is not None:
+            if site_id not in sites:
+                return jsonify({"error": f"No readings from site {site_id}"}), 404
+            sites = {site_id: sites[site_id]}
+
+        return jsonify({
+            "threat_model_version": models.version('threat'),
+            "thresholds": {"warning": Config.DRIFT_PSI_WARNING, "alert": Config.DRIFT_PSI_ALERT},
+            "sites": sites
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error computing drift scores: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/sensors/nearby', methods=['POST'])
+def nearby_sensors():
+    """
+    Find registered sensors within a radius of a location
+    Expected JSON format:
+    {
+        "location": [latitude, longitude],
+        "radius": float  # in meters, optional
+    }
+    """
+    try:
+        data = request.get_json()
+
+        location = data.get('location') if data else None
+        if not location:
+            return jsonify({"error": "Missing location data"}), 400
+
+        lat, lon = location if isinstance(location, list) else (location.get('latitude'), location.get('longitude'))
+        radius = float(data.get('radius', Config.SENSOR_NEARBY_RADIUS))
+
+        sensors = sensor_index.nearby(lat, lon, radius)
+
+        return jsonify({"sensors": sensors, "radius": radius}), 200
+
+    except Exception as e:
+        logger.error(f"Error finding nearby sensors: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _check_admin():
+    """
+    Error response unless the request may use the admin endpoints: it must carry the
+    admin token, or without a configured token come from this machine
+    """
+    if Config.ADMIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), Config.ADMIN_TOKEN):
+            return jsonify({"error": "Invalid admin token"}), 403
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({"error": "Admin endpoints are limited to localhost unless ADMIN_TOKEN is set"}), 403
+    return None
+
+@app.route('/admin/models', methods=['GET'])
+def model_status():
+    """Active, loading and published versions of every model"""
+    denied = _check_admin()
+    if denied:
+        return denied
+    return jsonify({"models": models.status()}), 200
+
+@app.route('/admin/models/<name>/publish', methods=['POST'])
+def publish_model(name):
+    """
+    Copy model artifacts into the registry as a new version
+    Expected JSON format:
+    {
+        "files": ["model.joblib", ...],  # relative to MODEL_STAGING_DIR, the first is the model itself
+        "version": "string",  # optional, defaults to a timestamp
+        "activate": bool  # optional, swap the version in once published
+    }
+    """
+    denied = _check_admin()
+    if denied:
+        return denied
+    try:
+        data = request.get_json() or {}
+        if name not in models.factories:
+            return jsonify({"error": f"Unknown model {name}"}), 404
+        if not data.get('files'):
+            return jsonify({"error": "Missing files"}), 400
+
+        version = models.publish(name, data['files'], data.get('version'))
+        if data.get('activate'):
+            models.activate(name, version)
+
+        return jsonify({"model": name, "version": version, "activating": bool(data.get('activate'))}), 201
+
+    except (ValueError, FileExistsError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error publishing {name} model: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/models/<name>/activate', methods=['POST'])
+def activate_model(name):
+    """
+    Load and warm a model version in the background, then swap it in
+    Expected JSON format:
+    {
+        "version": "string"
+    }
+    """
+    denied = _check_admin()
+    if denied:
+        return denied
+    try:
+        data = request.get_json() or {}
+        if name not in models.factories:
+            return jsonify({"error": f"Unknown model {name}"}), 404
+        if not data.get('version'):
+            return jsonify({"error": "Missing version"}), 400
+
+        started = models.activate(name, data['version'])
+        return jsonify({"model": name, "version": data['version'], "started": started}), 202
+
+    except Exception as e:
+        logger.error(f"Error activating {name} model: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/models/threat/shadow', methods=['GET', 'POST', 'DELETE'])
+def shadow_threat_model():
+    """
+    Compare a candidate threat model version with the active one on live /predict traffic
+    GET reports the comparison, DELETE stops it, POST starts it
+    Expected JSON format for POST:
+    {
+        "version": "string",  # published version to shadow
+        "sample_rate": float  # optional, fraction of requests scored
+    }
+    """
+    denied = _check_admin()
+    if denied:
+        return denied
+    try:
+        if request.method == 'DELETE':
+            shadow.stop()
+        elif request.method == 'POST':
+            data = request.get_json() or {}
+            if not data.get('version'):
+                return jsonify({"error": "Missing version"}), 400
+            sample_rate = data.get('sample_rate')
+            if sample_rate is not None and not 0 <= float(sample_rate) <= 1:
+                return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+
+            candidate = models.load('threat', data['version'])
+            shadow.start(candidate, data['version'], None if sample_rate is None else float(sample_rate))
+
+        return jsonify({"active": models.version('threat'), "shadow": shadow.stats()}), 200
+
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error in threat model shadow scoring: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/sites/<site_id>/model', methods=['POST', 'DELETE'])
+def site_model(site_id):
+    """
+    Manage the cached model of a site
+    Expected JSON format for POST:
+    {
+        "pinned": bool,  # optional, keep the model loaded
+        "reload": bool  # optional, drop the cached model so it is loaded again
+    }
+    DELETE drops the cached model
+    """
+    denied = _check_admin()
+    if denied:
+        return denied
+    try:
+        data = (request.get_json(silent=True) or {}) if request.method == 'POST' else {'reload': True}
+        if data.get('pinned') is True:
+            site_models.pin(site_id)
+        elif data.get('pinned') is False:
+            site_models.unpin(site_id)
+        if data.get('reload'):
+            site_models.invalidate(site_id)
+
+        return jsonify({"site_id": site_id, "site_models": site_models.stats()}), 200
+
+    except Exception as e:
+        logger.error(f"Error managing model of site {site_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/admin/models/<name>/rollback', methods=['POST'])
+def rollback_model(name):
+    """Swap back to the version that was active before the current one"""
+    denied = _check_admin()
+    if denied:
+        return denied
+    try:
+        if name not in models.factories:
+            return jsonify({"error": f"Unknown model {name}"}), 404
+
+        started = models.rollback(name)
+        return jsonify({"model": name, "started": started}), 202
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        logger.error(f"Error rolling back {name} model: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5001)))
+    app.run(debug=Config.DEBUG, host='0.0.0.0', port=int(os.environ.get('PORT', 5001)))
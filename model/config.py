@@ -30,16 +30,96 @@ class Config:
     ZONE_HIGH_THRESHOLD = float(os.environ.get('ZONE_HIGH_THRESHOLD', '0.8'))
     ZONE_MEDIUM_THRESHOLD = float(os.environ.get('ZONE_MEDIUM_THRESHOLD', '0.5'))
     ZONE_LOW_THRESHOLD = float(os.environ.get('ZONE_LOW_THRESHOLD', '0.2'))
+    ZONE_MIN_CONFIDENCE = float(os.environ.get('ZONE_MIN_CONFIDENCE', '0'))  # tree agreement below which only HIGH risk gets zones
+    ZONE_TTL_SECONDS = float(os.environ.get('ZONE_TTL_SECONDS', '900'))  # How long computed zones stay active
     
     # Geospatial parameters
     DEFAULT_PROJECTION = os.environ.get('DEFAULT_PROJECTION', 'EPSG:4326')
+    SENSOR_NEARBY_RADIUS = float(os.environ.get('SENSOR_NEARBY_RADIUS', '2000'))  # meters
+
+    # Evacuation routing
+    EVACUATION_WALKING_SPEED = float(os.environ.get('EVACUATION_WALKING_SPEED', '1.4'))  # m/s
+    HAZARD_RASTER_CELL_SIZE = float(os.environ.get('HAZARD_RASTER_CELL_SIZE', '10'))  # meters
+    HAZARD_RASTER_MAX_CELLS = int(os.environ.get('HAZARD_RASTER_MAX_CELLS', '201'))  # cells per side
+    HAZARD_RASTER_CACHE_SIZE = int(os.environ.get('HAZARD_RASTER_CACHE_SIZE', '64'))  # incidents
+
+    # Puff dispersion simulation
+    PUFF_MAX_DT = float(os.environ.get('PUFF_MAX_DT', '600'))  # longest step a request may advance, seconds
+
+    # Admission control for prediction requests
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '4'))
+    ADMISSION_MAX_WAITING = int(os.environ.get('ADMISSION_MAX_WAITING', '16'))
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '2'))  # seconds, well inside the backend's 10 s timeout
+
+    # Sensor data write-ahead log
+    WAL_FLUSH_INTERVAL = float(os.environ.get('WAL_FLUSH_INTERVAL', '0.01'))  # seconds between group commits
+    WAL_FLUSH_RECORDS = int(os.environ.get('WAL_FLUSH_RECORDS', '1000'))  # pending appends forcing a commit
+    WAL_SEGMENT_BYTES = int(os.environ.get('WAL_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+    WAL_COMPACT_INTERVAL = float(os.environ.get('WAL_COMPACT_INTERVAL', '30'))  # seconds
+
+    # Incident recomputation scheduling
+    INCIDENT_WORKERS = int(os.environ.get('INCIDENT_WORKERS', '2'))
+    INCIDENT_WAIT_TIMEOUT = float(os.environ.get('INCIDENT_WAIT_TIMEOUT', '5'))  # seconds a request waits for fresh zones
+    INCIDENT_REFRESH_INTERVALS = {  # minimum seconds between recomputations per risk level
+        'HIGH': float(os.environ.get('INCIDENT_REFRESH_HIGH', '0')),
+        'MEDIUM': float(os.environ.get('INCIDENT_REFRESH_MEDIUM', '10')),
+        'LOW': float(os.environ.get('INCIDENT_REFRESH_LOW', '30')),
+        'SAFE': float(os.environ.get('INCIDENT_REFRESH_SAFE', '30'))
+    }
     
+    # Explosion consequences (see models/consequence.py)
+    EXPLOSION_CLOUD_VOLUME = float(os.environ.get('EXPLOSION_CLOUD_VOLUME', '750'))  # m³ of gas cloud at a sensor
+    EXPLOSION_BACKEND = os.environ.get('EXPLOSION_BACKEND', 'merged')  # 'merged' single-pass trees or 'model' as loaded
+    EXPLOSION_CONFINEMENT = float(os.environ.get('EXPLOSION_CONFINEMENT', '0.2'))  # 0 open air to 1 fully confined
+
+    # Model registry
+    MODEL_REGISTRY_POLL_INTERVAL = float(os.environ.get('MODEL_REGISTRY_POLL_INTERVAL', '5'))  # seconds, 0 disables
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # required in X-Admin-Token by /admin endpoints; unset: loopback only
+
+    # Shadow scoring of a candidate threat model on sampled /predict traffic
+    SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', '0.1'))  # fraction of requests scored
+    SHADOW_WORKERS = int(os.environ.get('SHADOW_WORKERS', '1'))
+    SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', '256'))  # readings beyond this are dropped
+
+    # Per-site threat models, loaded on demand from SITE_MODEL_DIR/<site_id>/threat_model.joblib
+    SITE_MODEL_CACHE_BYTES = int(os.environ.get('SITE_MODEL_CACHE_BYTES', str(512 * 1024 * 1024)))
+    SITE_MODEL_PINNED = [s for s in os.environ.get('SITE_MODEL_PINNED', '').split(',') if s]  # never evicted
+    SITE_MODEL_NEGATIVE_TTL = float(os.environ.get('SITE_MODEL_NEGATIVE_TTL', '30'))  # seconds a site without a model is remembered
+
+    # Cascade: readings inside the calibrated safe boxes skip the threat model
+    THREAT_CASCADE = os.environ.get('THREAT_CASCADE', 'True').lower() == 'true'
+
+    # Per-feature contributions to the threat model's risk score (see FlatForest.attributions)
+    THREAT_ATTRIBUTIONS = os.environ.get('THREAT_ATTRIBUTIONS', 'True').lower() == 'true'
+    ATTRIBUTION_CACHE_SIZE = int(os.environ.get('ATTRIBUTION_CACHE_SIZE', '4096'))  # cached readings, 0 disables
+    ATTRIBUTION_QUANTUM = float(os.environ.get('ATTRIBUTION_QUANTUM', '0.01'))  # rounding step of cache keys, 0 exact
+
+    # Drift of live readings from the threat model's training profile (see utils/drift.py)
+    DRIFT_BINS = int(os.environ.get('DRIFT_BINS', '10'))  # quantile bins per feature
+    DRIFT_WINDOW = int(os.environ.get('DRIFT_WINDOW', '5000'))  # readings per site before older ones fade
+    DRIFT_MIN_READINGS = int(os.environ.get('DRIFT_MIN_READINGS', '200'))
+    DRIFT_PSI_WARNING = float(os.environ.get('DRIFT_PSI_WARNING', '0.1'))
+    DRIFT_PSI_ALERT = float(os.environ.get('DRIFT_PSI_ALERT', '0.25'))
+
+    # Floating point type of features from loading through model inference
+    # ('float32' halves memory; sklearn trees compute in float32 anyway)
+    FEATURE_DTYPE = os.environ.get('FEATURE_DTYPE', 'float32')
+
     # File paths
     DATA_DIR = os.environ.get('DATA_DIR', 'data')
     MODEL_DIR = os.environ.get('MODEL_DIR', 'models/saved')
     HISTORICAL_DATA_DIR = os.path.join(DATA_DIR, 'historical')
+    SENSOR_STORE_DIR = os.environ.get('SENSOR_STORE_DIR', os.path.join(HISTORICAL_DATA_DIR, 'store'))
+    WAL_DIR = os.environ.get('WAL_DIR', os.path.join(HISTORICAL_DATA_DIR, 'wal'))
     TRAINING_DATA_DIR = os.path.join(DATA_DIR, 'training')
     TEST_DATA_DIR = os.path.join(DATA_DIR, 'test')
+    THREAT_PREFILTER_PATH = os.environ.get('THREAT_PREFILTER_PATH', os.path.join(MODEL_DIR, 'threat_prefilter.joblib'))
+    THREAT_PROFILE_PATH = os.environ.get('THREAT_PROFILE_PATH', os.path.join(MODEL_DIR, 'threat_profile.joblib'))
+    EXPLOSION_CORRECTION_PATH = os.environ.get('EXPLOSION_CORRECTION_PATH', os.path.join(MODEL_DIR, 'explosion_correction.joblib'))
+    MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', os.path.join(MODEL_DIR, 'registry'))
+    MODEL_STAGING_DIR = os.environ.get('MODEL_STAGING_DIR', os.path.join(MODEL_DIR, 'staging'))  # publishable artifacts
+    SITE_MODEL_DIR = os.environ.get('SITE_MODEL_DIR', os.path.join(MODEL_DIR, 'sites'))
+    SITE_GRAPH_PATH = os.environ.get('SITE_GRAPH_PATH', os.path.join(DATA_DIR, 'site', 'site_graph.geojson'))
 
     # Arduino sensor settings
     ARDUINO_PORT = os.environ.get('ARDUINO_PORT', '/dev/ttyUSB0')
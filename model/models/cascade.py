@@ -0,0 +1,345 @@
+import pickle
+import numpy as np
+import joblib
+import zlib
+import logging
+from config import Config
+from utils.data_processing import THREAT_FEATURES
+
+logger = logging.getLogger(__name__)
+
+def forest_fingerprint(model):
+    """Checksum of a forest's split features and thresholds, to tell whether a prefilter matches it"""
+    checksum = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        checksum = zlib.crc32(tree.feature.tobytes(), checksum)
+        checksum = zlib.crc32(tree.threshold.tobytes(), checksum)
+    return checksum
+
+def model_nbytes(model):
+    """
+    Approximate memory held by a loaded model
+
+    Tree ensembles are measured by their node and value arrays, which dominate
+    their footprint; anything else by the size of its pickle.
+
+    Parameters:
+    - model: ThreatModel (or any object with a fitted .model)
+
+    Returns:
+    - Size in bytes
+    """
+    estimator = getattr(model, 'model', model)
+    if hasattr(estimator, 'estimators_'):
+        total = 0
+        for tree in estimator.estimators_:
+            state = tree.tree_.__getstate__()
+            total += state['nodes'].nbytes + state['values'].nbytes
+        return total
+    return len(pickle.dumps(estimator, protocol=pickle.HIGHEST_PROTOCOL))
+
+class FlatForest:
+    """
+    The nodes of all trees of a fitted forest classifier in flat arrays.
+
+    Node indices are offset per tree so that one set of arrays covers the
+    whole forest and traversals run over every tree at once.
+    """
+
+    def __init__(self, model, positive_class=1):
+        """
+        Flatten a fitted forest
+
+        Parameters:
+        - model: Fitted RandomForestClassifier (or other forest of decision trees)
+        - positive_class: Class whose probability is scored
+        """
+        column = list(model.classes_).index(positive_class)
+        features, thresholds, left, right, values, tree_ids, roots = [], [], [], [], [], [], []
+        offset = 0
+        for index, estimator in enumerate(model.estimators_):
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            value = tree.value[:, 0, :]
+            features.append(tree.feature)
+            thresholds.append(tree.threshold)
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            values.append(value[:, column] / value.sum(axis=1))
+            tree_ids.append(np.full(tree.node_count, index))
+            roots.append(offset)
+            offset += tree.node_count
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.value = np.concatenate(values)
+        self.tree = np.concatenate(tree_ids)
+        self.roots = np.array(roots)
+        self.n_trees = len(roots)
+        self.n_features = model.n_features_in_
+
+        # Score of the forest before any split: the mean of the root values
+        self.bias = float(self.value[self.roots].mean())
+
+        # Each split on the way to a leaf moves the tree's probability from the parent's
+        # value to the child's; crediting the move to the split feature (Saabas path
+        # attribution) gives every leaf a fixed contribution per feature
+        contributions = np.zeros((offset, self.n_features))
+        frontier = self.roots
+        while len(frontier):
+            parent = frontier[self.left[frontier] >= 0]
+            for child in (self.left[parent], self.right[parent]):
+                contributions[child] = contributions[parent]
+                contributions[child, self.feature[parent]] += self.value[child] - self.value[parent]
+            frontier = np.concatenate([self.left[parent], self.right[parent]])
+        leaves = np.flatnonzero(self.left < 0)
+        self.leaf_row = np.full(offset, -1)
+        self.leaf_row[leaves] = np.arange(len(leaves))
+        self.leaf_contributions = contributions[leaves]
+
+    def leaves(self, X):
+        """
+        Leaf reached in every tree by each reading, descending all trees at once
+
+        Parameters:
+        - X: Readings of shape (n_samples, n_features)
+
+        Returns:
+        - Flat node indices of shape (n_samples, n_trees)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.tile(self.roots, (len(X), 1))
+        while True:
+            internal = self.left[node] >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return node
+
+    def tree_scores(self, X):
+        """Positive class probability of every tree for each reading, shape (n_samples, n_trees)"""
+        return self.value[self.leaves(X)]
+
+    def attributions(self, leaves):
+        """
+        Per-feature contributions to the forest's probability
+
+        The bias plus a reading's contributions add up to the forest's probability.
+
+        Parameters:
+        - leaves: Flat leaf indices of shape (n_samples, n_trees), as returned by leaves
+
+        Returns:
+        - Array of shape (n_samples, n_features)
+        """
+        return self.leaf_contributions[self.leaf_row[leaves]].sum(axis=1) / self.n_trees
+
+    def upper_bound(self, lower, upper):
+        """
+        Upper bound of the forest's probability over an axis-aligned box
+
+        A tree sends x left when x[feature] <= threshold, so a box reaches the
+        left child if its lower edge is at or below the threshold and the right
+        child if its upper edge is above it. The forest's probability is the
+        mean over trees, so the mean of each tree's highest reachable leaf
+        bounds it from above for every point of the box.
+
+        Parameters:
+        - lower: Lower edge of the box per feature (float32 values)
+        - upper: Upper edge of the box per feature (float32 values)
+
+        Returns:
+        - Upper bound of the positive class probability
+        """
+        return float(self.tree_upper_bounds(lower, upper).mean())
+
+    def tree_upper_bounds(self, lower, upper):
+        """Highest probability each tree can give anywhere in an axis-aligned box (see upper_bound)"""
+        best = np.zeros(self.n_trees)
+        frontier = self.roots
+        while len(frontier):
+            leaf = self.left[frontier] < 0
+            leaves = frontier[leaf]
+            np.maximum.at(best, self.tree[leaves], self.value[leaves])
+
+            internal = frontier[~leaf]
+            feature = self.feature[internal]
+            threshold = self.threshold[internal]
+            frontier = np.concatenate([
+                self.left[internal[lower[feature] <= threshold]],
+                self.right[internal[upper[feature] > threshold]]
+            ])
+        return best
+
+class ThresholdPrefilter:
+    """
+    Cheap first stage of the threat model cascade.
+
+    Holds boxes of sensor readings over which the forest provably scores
+    below the SAFE cutoff and no threshold triggers the immediate-danger
+    override, so readings inside any of them can be answered SAFE without
+    running the forest. The boxes are calibrated offline against a specific
+    forest and are only valid for that forest.
+    """
+
+    def __init__(self, lower, upper, bounds, fingerprint=None):
+        """
+        Initialize the prefilter
+
+        Parameters:
+        - lower: Lower edges of the safe boxes, shape (n_boxes, 6) in THREAT_FEATURES order
+        - upper: Upper edges of the safe boxes, shape (n_boxes, 6)
+        - bounds: Upper bound of the forest's probability inside each box
+        - fingerprint: forest_fingerprint of the forest the boxes were calibrated against
+        """
+        self.lower = np.asarray(lower, dtype=np.float32).reshape(-1, len(THREAT_FEATURES))
+        self.upper = np.asarray(upper, dtype=np.float32).reshape(-1, len(THREAT_FEATURES))
+        self.bounds = np.asarray(bounds, dtype=np.float64).reshape(-1)
+        self.fingerprint = fingerprint
+
+    @property
+    def bound(self):
+        """Upper bound of the forest's probability anywhere inside the safe boxes"""
+        return float(self.bounds.max()) if len(self.bounds) else 0.0
+
+    def is_safe(self, X):
+        """
+        Check which readings fall inside a safe box
+
+        Parameters:
+        - X: Array of shape (n_samples, 6) in THREAT_FEATURES order
+
+        Returns:
+        - Boolean array, True where the forest would certainly answer SAFE
+        """
+        # The trees compare float32 features, so the boxes are checked on the same values
+        X = np.asarray(X, dtype=np.float32)
+        safe = np.zeros(len(X), dtype=bool)
+        for lower, upper in zip(self.lower, self.upper):
+            safe |= np.all((X >= lower) & (X <= upper), axis=1)
+        return safe
+
+    def matches(self, model):
+        """Whether the prefilter was calibrated against this forest"""
+        return self.fingerprint is not None and self.fingerprint == forest_fingerprint(model)
+
+    def to_dict(self):
+        """Describe the safe boxes"""
+        return {
+            'bound': self.bound,
+            'boxes': [
+                {feature: [float(low), float(high)] for feature, low, high in zip(THREAT_FEATURES, lower, upper)}
+                for lower, upper in zip(self.lower, self.upper)
+            ]
+        }
+
+    def save(self, path):
+        joblib.dump({'lower': self.lower, 'upper': self.upper, 'bounds': self.bounds,
+                     'fingerprint': self.fingerprint}, path)
+        logger.info(f"Threat prefilter saved to {path}")
+
+    @classmethod
+    def load(cls, path):
+        state = joblib.load(path)
+        return cls(state['lower'], state['upper'], state['bounds'], state['fingerprint'])
+
+    @classmethod
+    def calibrate(cls, model, X, safe_threshold=None, max_boxes=4, min_coverage=0.01, grid_size=200,
+                  max_rounds=5):
+        """
+        Find large boxes of readings the forest provably scores SAFE
+
+        Each box grows from the reading closest to the median of the readings
+        not yet covered that the forest scores SAFE. Its edges are pushed
+        outwards in turn, by binary search over quantiles of the calibration
+        readings (or to infinity), as far as the forest's bound over the box
+        stays below safe_threshold; rounds repeat until no edge moves. Upper
+        edges of gas and high-temperature readings never pass their alert
+        thresholds. Boxes are added until max_boxes or until a new box would
+        cover less than min_coverage of the readings.
+
+        Parameters:
+        - model: Fitted forest classifier used by ThreatModel
+        - X: Calibration readings of shape (n_samples, 6) in THREAT_FEATURES order
+        - safe_threshold: Score below which a reading is SAFE (defaults to Config.ZONE_LOW_THRESHOLD)
+        - max_boxes: Maximum number of boxes
+        - min_coverage: Minimum fraction of the readings a box must add
+        - grid_size: Number of quantiles tried per edge
+        - max_rounds: Maximum passes over the edges of a box
+
+        Returns:
+        - ThresholdPrefilter
+        """
+        safe_threshold = Config.ZONE_LOW_THRESHOLD if safe_threshold is None else safe_threshold
+        X = np.asarray(X, dtype=np.float32)
+        forest = FlatForest(model)
+        forest_safe = forest_scores(model, X) < safe_threshold
+
+        # Above these the immediate-danger override applies, so the boxes stay strictly
+        # below them even after rounding readings to float32
+        thresholds = np.array([Config.THRESHOLD_MQ2, Config.THRESHOLD_MQ4, Config.THRESHOLD_MQ6,
+                               Config.THRESHOLD_MQ8, Config.THRESHOLD_TEMP_HIGH, np.inf], dtype=np.float32)
+        caps = np.nextafter(thresholds, np.float32(-np.inf))
+        quantiles = np.quantile(X, np.linspace(0, 1, grid_size), axis=0).astype(np.float32)
+        scale = np.maximum(X.std(axis=0), 1e-6)
+
+        prefilter = cls(np.zeros((0, X.shape[1])), np.zeros((0, X.shape[1])), [], forest_fingerprint(model))
+        while len(prefilter.bounds) < max_boxes:
+            candidates = X[forest_safe & ~prefilter.is_safe(X) & np.all(X <= caps, axis=1)]
+            if len(candidates) < min_coverage * len(X):
+                break
+            seed = candidates[np.argmin(np.abs((candidates - np.median(candidates, axis=0)) / scale).sum(axis=1))]
+
+            lower, upper = cls._grow(forest, seed, quantiles, caps, safe_threshold, max_rounds)
+            grown = cls(np.vstack([prefilter.lower, lower]), np.vstack([prefilter.upper, upper]),
+                        np.append(prefilter.bounds, forest.upper_bound(lower, upper)), prefilter.fingerprint)
+            if grown.is_safe(X).mean() - prefilter.is_safe(X).mean() < min_coverage:
+                break
+            prefilter = grown
+
+        logger.info(f"Calibrated threat prefilter with {len(prefilter.bounds)} boxes, "
+                    f"forest bound {prefilter.bound:.3f} inside them")
+        return prefilter
+
+    @staticmethod
+    def _grow(forest, seed, quantiles, caps, safe_threshold, max_rounds):
+        """Grow a box from a single reading while the forest's bound stays below safe_threshold"""
+        lower, upper = seed.copy(), seed.copy()
+        for _ in range(max_rounds):
+            moved = False
+            for feature in range(len(seed)):
+                for edge in (lower, upper):
+                    if edge is lower:
+                        candidates = np.concatenate([quantiles[::-1, feature], [-np.inf]])
+                        candidates = candidates[candidates < edge[feature]]
+                    else:
+                        candidates = np.concatenate([quantiles[:, feature], [caps[feature]]])
+                        candidates = candidates[(candidates > edge[feature]) & (candidates <= caps[feature])]
+
+                    # Candidates run outwards and the bound only grows with the box,
+                    # so binary search finds the furthest one that keeps it
+                    low, high = 0, len(candidates)
+                    while low < high:
+                        middle = (low + high) // 2
+                        trial = edge.copy()
+                        trial[feature] = candidates[middle]
+                        box = (trial, upper) if edge is lower else (lower, trial)
+                        if forest.upper_bound(*box) < safe_threshold:
+                            low = middle + 1
+                        else:
+                            high = middle
+                    if low:
+                        edge[feature] = candidates[low - 1]
+                        moved = True
+            if not moved:
+                break
+        return lower, upper
+
+def forest_scores(model, X, positive_class=1):
+    """Positive class probability of a forest classifier for each reading"""
+    return model.predict_proba(X)[:, list(model.classes_).index(positive_class)]
@@ -0,0 +1,175 @@
+import copy
+import time
+import numpy as np
+import logging
+from sklearn.ensemble import RandomForestClassifier
+from config import Config
+from models.cascade import forest_scores, model_nbytes
+
+logger = logging.getLogger(__name__)
+
+def risk_levels(scores, X):
+    """
+    Risk level ThreatModel.predict reports for each reading, as 0 (SAFE) to 3 (HIGH)
+
+    Parameters:
+    - scores: Positive class probabilities of the forest
+    - X: Readings of shape (n_samples, 6) in THREAT_FEATURES order
+
+    Returns:
+    - Integer array
+    """
+    immediate_danger = (
+        (X[:, 0] > Config.THRESHOLD_MQ2) | (X[:, 1] > Config.THRESHOLD_MQ4) |
+        (X[:, 2] > Config.THRESHOLD_MQ6) | (X[:, 3] > Config.THRESHOLD_MQ8) |
+        (X[:, 4] > Config.THRESHOLD_TEMP_HIGH)
+    )
+    scores = np.where(immediate_danger, np.maximum(scores, 0.8), scores)
+    return np.searchsorted([Config.ZONE_LOW_THRESHOLD, Config.ZONE_MEDIUM_THRESHOLD, Config.ZONE_HIGH_THRESHOLD],
+                           scores, side='right')
+
+def select_trees(model, X, n_trees):
+    """
+    Greedily pick the trees whose average best matches the whole forest
+
+    Parameters:
+    - model: Fitted forest classifier
+    - X: Readings the scores are matched on
+    - n_trees: Trees to keep
+
+    Returns:
+    - Copy of the forest with only the selected trees
+    """
+    target = forest_scores(model, X)
+    positive = list(model.classes_).index(1)
+    per_tree = np.stack([tree.predict_proba(X)[:, positive] for tree in model.estimators_])
+
+    selected = []
+    total = np.zeros(len(X))
+    remaining = list(range(len(model.estimators_)))
+    for k in range(1, min(n_trees, len(remaining)) + 1):
+        errors = [np.abs((total + per_tree[i]) / k - target).mean() for i in remaining]
+        best = remaining.pop(int(np.argmin(errors)))
+        selected.append(best)
+        total += per_tree[best]
+
+    compressed = copy.copy(model)
+    compressed.estimators_ = [model.estimators_[i] for i in sorted(selected)]
+    compressed.n_estimators = len(selected)
+    return compressed
+
+def distill(model, X, n_trees, max_depth, augment=4, noise=0.05, random_state=42):
+    """
+    Train a small, depth-limited forest to reproduce a forest's scores
+
+    The student learns the teacher's probabilities rather than its hard labels:
+    every reading appears once as each class, weighted by the teacher's
+    probability of that class, so the class fractions in the student's leaves
+    estimate the teacher's score. The readings are augmented with jittered
+    copies so the student also follows the teacher between them.
+
+    Parameters:
+    - model: Fitted forest classifier (the teacher)
+    - X: Training readings
+    - n_trees: Trees of the student
+    - max_depth: Depth limit of the student's trees
+    - augment: Jittered copies of the readings added
+    - noise: Jitter as a fraction of each feature's standard deviation
+    - random_state: Seed of the jitter and the student
+
+    Returns:
+    - Fitted RandomForestClassifier with classes 0 and 1
+    """
+    rng = np.random.default_rng(random_state)
+    scale = X.std(axis=0) * noise
+    samples = np.concatenate([X] + [X + rng.normal(0, 1, X.shape) * scale for _ in range(augment)])
+    scores = forest_scores(model, samples.astype(Config.FEATURE_DTYPE))
+
+    student = RandomForestClassifier(n_estimators=n_trees, max_depth=max_depth, random_state=random_state,
+                                     n_jobs=1)
+    student.fit(np.concatenate([samples, samples]), np.repeat([0, 1], len(samples)),
+                sample_weight=np.concatenate([1 - scores, scores]))
+    return student
+
+def measure(model, X, repeats=200, batch_size=10000):
+    """
+    Size and speed of a forest
+
+    Parameters:
+    - model: Fitted forest classifier
+    - X: Readings used for timing
+    - repeats: Single-row predictions timed
+    - batch_size: Rows of the batch timing (X repeated)
+
+    Returns:
+    - Dictionary with trees, nodes, bytes, single-row p50 latency in milliseconds
+      and batch throughput in readings per second
+    """
+    X = X.astype(Config.FEATURE_DTYPE)
+    rows = [X[i % len(X)][None, :] for i in range(repeats)]
+    model.predict_proba(rows[0])  # warm up
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+
+    batch = np.resize(X, (batch_size, X.shape[1]))
+    start = time.perf_counter()
+    model.predict_proba(batch)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'trees': len(model.estimators_),
+        'nodes': int(sum(tree.tree_.node_count for tree in model.estimators_)),
+        'bytes': model_nbytes(model),
+        'single_row_p50_ms': float(np.median(timings) * 1000),
+        'batch_readings_per_second': batch_size / batch_seconds
+    }
+
+def compress(model, X_train, X_val, tolerance=0.01, tree_counts=(5, 10, 20, 40), depths=(6, 8, 10, 12)):
+    """
+    Smallest forest that matches a forest's risk levels within a tolerance
+
+    Candidates are subsets of the original trees and distilled depth-limited
+    forests. They are scored on the validation readings, and the one with
+    the fewest nodes that agrees on at least 1 - tolerance of the risk
+    levels is kept.
+
+    Parameters:
+    - model: Fitted forest classifier
+    - X_train: Readings for selecting trees and distilling
+    - X_val: Readings the agreement is measured on
+    - tolerance: Largest acceptable fraction of validation readings with a different risk level
+    - tree_counts: Tree counts tried for both kinds of candidates
+    - depths: Depth limits tried for distilled candidates
+
+    Returns:
+    - (compressed model or None if no candidate is within tolerance, list of candidate reports)
+    """
+    X_train = X_train.astype(Config.FEATURE_DTYPE)
+    X_val = X_val.astype(Config.FEATURE_DTYPE)
+    reference_scores = forest_scores(model, X_val)
+    reference = risk_levels(reference_scores, X_val)
+
+    candidates = [(f'subset_{n}', lambda n=n: select_trees(model, X_train, n))
+                  for n in tree_counts if n < len(model.estimators_)]
+    candidates += [(f'distilled_{n}x{depth}', lambda n=n, depth=depth: distill(model, X_train, n, depth))
+                   for n in tree_counts for depth in depths]
+
+    best, reports = None, []
+    for name, build in candidates:
+        candidate = build()
+        scores = forest_scores(candidate, X_val)
+        report = {
+            'candidate': name,
+            'nodes': int(sum(tree.tree_.node_count for tree in candidate.estimators_)),
+            'disagreement': float((risk_levels(scores, X_val) != reference).mean()),
+            'max_score_difference': float(np.abs(scores - reference_scores).max())
+        }
+        reports.append(report)
+        if report['disagreement'] <= tolerance and (best is None or report['nodes'] < best[1]['nodes']):
+            best = (candidate, report)
+        logger.info(f"{name}: {report['nodes']} nodes, {report['disagreement']:.2%} risk levels differ")
+
+    return (best[0] if best else None), reports
@@ -0,0 +1,196 @@
+import numpy as np
+import joblib
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Threshold levels reported by the engine, in the keys calculate_threat_zone reads
+OVERPRESSURE_THRESHOLDS = {'15kPa': 15.0, '7kPa': 7.0, '3kPa': 3.0}      # kPa
+RADIATION_THRESHOLDS = {'10kW/m²': 10.0, '5kW/m²': 5.0, '2kW/m²': 2.0}   # kW/m²
+
+GAS_CONSTANT = 8.314             # J/(mol K)
+REFERENCE_PRESSURE = 101325.0    # Pa
+TNT_ENERGY = 4.68e6              # J/kg
+FIREBALL_MAX_EMISSIVE_POWER = 350.0  # kW/m², upper end for hydrocarbon fireballs
+
+def _kinney_graham(scaled_distance):
+    """Peak side-on overpressure over ambient pressure of a TNT charge at a scaled distance (m/kg^1/3)"""
+    z = scaled_distance
+    return 808.0 * (1 + (z / 4.5) ** 2) / (
+        np.sqrt(1 + (z / 0.048) ** 2) * np.sqrt(1 + (z / 0.32) ** 2) * np.sqrt(1 + (z / 1.35) ** 2))
+
+# The Kinney-Graham curve falls monotonically, so it is inverted by
+# interpolating a dense log-spaced table (ascending overpressure for np.interp)
+_SCALED_DISTANCES = np.logspace(-2, 3, 4000)
+_LOG_RATIOS = np.log(_kinney_graham(_SCALED_DISTANCES))[::-1]
+_LOG_DISTANCES = np.log(_SCALED_DISTANCES)[::-1]
+
+def scaled_distance_for(overpressure_ratio):
+    """
+    Scaled distance at which a TNT blast falls to a given overpressure
+
+    Parameters:
+    - overpressure_ratio: Peak overpressure over ambient pressure (array)
+
+    Returns:
+    - Scaled distance in m/kg^(1/3)
+    """
+    return np.exp(np.interp(np.log(overpressure_ratio), _LOG_RATIOS, _LOG_DISTANCES))
+
+class ConsequenceEngine:
+    """
+    Closed-form explosion consequences for batches of gas release scenarios.
+
+    The flammable mass in the cloud follows from the measured concentration
+    through the ideal gas law. Blast distances use TNT equivalence with a
+    yield that grows with confinement (a coarse stand-in for the multi-energy
+    strength classes) and the Kinney-Graham overpressure curve with Sachs
+    scaling for ambient pressure. Radiation distances use a point-source
+    fireball (CCPS correlations for diameter and duration) and assume no
+    atmospheric attenuation, which errs on the safe side. Every formula is
+    evaluated over whole arrays, so thousands of scenarios cost one call.
+
+    An optional correction model, fitted on observed consequences, scales the
+    overpressure and radiation distances by a learned factor per scenario.
+    """
+
+    def __init__(self, cloud_volume=None, heat_of_combustion=50e6, molar_mass=0.016, radiative_fraction=0.3,
+                 min_yield=0.01, max_yield=0.1, correction=None):
+        """
+        Initialize the engine
+
+        Parameters:
+        - cloud_volume: Volume of the gas cloud in m³ (defaults to Config.EXPLOSION_CLOUD_VOLUME)
+        - heat_of_combustion: Heat of combustion of the fuel in J/kg (methane by default)
+        - molar_mass: Molar mass of the fuel in kg/mol
+        - radiative_fraction: Fraction of the combustion energy radiated by the fireball
+        - min_yield: TNT yield of an unconfined cloud
+        - max_yield: TNT yield of a fully confined cloud
+        - correction: Fitted regressor from correction_features to the log ratios of observed
+          to computed 15 kPa and 10 kW/m² distances
+        """
+        self.cloud_volume = cloud_volume or Config.EXPLOSION_CLOUD_VOLUME
+        self.heat_of_combustion = heat_of_combustion
+        self.molar_mass = molar_mass
+        self.radiative_fraction = radiative_fraction
+        self.min_yield = min_yield
+        self.max_yield = max_yield
+        self.correction = correction
+
+    def compute(self, gas_concentration, temperature, pressure=None, confinement_factor=None, correct=True):
+        """
+        Compute the consequences of a batch of scenarios
+
+        Parameters:
+        - gas_concentration: Fuel concentration in ppm
+        - temperature: Temperature in Celsius
+        - pressure: Ambient pressure in hPa (defaults to standard pressure)
+        - confinement_factor: Degree of confinement between 0 and 1 (defaults to Config.EXPLOSION_CONFINEMENT)
+        - correct: Apply the correction model if there is one
+
+        All inputs are scalars or arrays broadcastable to a common shape.
+
+        Returns:
+        - Dictionary of arrays: fuel_mass (kg), energy_release (MJ), tnt_equivalent (kg),
+          fireball_radius (m), fireball_duration (s), surface_emissive_power (kW/m²),
+          overpressure (kPa at the fireball edge), distance_to_overpressure and
+          distance_to_radiation (m, one column per threshold in OVERPRESSURE_THRESHOLDS
+          and RADIATION_THRESHOLDS order)
+        """
+        pressure = REFERENCE_PRESSURE / 100 if pressure is None else pressure
+        confinement_factor = Config.EXPLOSION_CONFINEMENT if confinement_factor is None else confinement_factor
+        concentration, temperature, pressure, confinement = np.broadcast_arrays(
+            *(np.asarray(v, dtype=np.float64) for v in (gas_concentration, temperature, pressure, confinement_factor)))
+        ambient = pressure * 100  # Pa
+
+        # Fuel in the cloud: n = x P V / (R T)
+        fuel_mass = (np.maximum(concentration, 0) * 1e-6 * ambient * self.cloud_volume
+                     * self.molar_mass / (GAS_CONSTANT * (temperature + 273.15)))
+        energy = fuel_mass * self.heat_of_combustion
+
+        # Blast: R = Z(dP / P0) W^(1/3) (P_ref / P0)^(1/3)
+        tnt = energy * (self.min_yield + (self.max_yield - self.min_yield) * np.clip(confinement, 0, 1)) / TNT_ENERGY
+        blast_scale = np.cbrt(tnt) * np.cbrt(REFERENCE_PRESSURE / ambient)
+        thresholds = np.array(list(OVERPRESSURE_THRESHOLDS.values())) * 1000
+        overpressure_distance = scaled_distance_for(thresholds / ambient[..., None]) * blast_scale[..., None]
+
+        # Fireball: D = 5.8 m^(1/3), t = 0.45 m^(1/3); point source q = f E / (4 pi R² t)
+        fireball_radius = 2.9 * np.cbrt(fuel_mass)
+        duration = 0.45 * np.cbrt(fuel_mass)
+        radiated_power = np.divide(self.radiative_fraction * energy, duration,
+                                   out=np.zeros_like(energy), where=duration > 0)
+        surface_area = 4 * np.pi * fireball_radius ** 2
+        emissive_power = np.minimum(np.divide(radiated_power / 1000, surface_area, out=np.zeros_like(energy),
+                                              where=surface_area > 0), FIREBALL_MAX_EMISSIVE_POWER)
+        fluxes = np.array(list(RADIATION_THRESHOLDS.values())) * 1000
+        radiation_distance = np.sqrt(radiated_power[..., None] / (4 * np.pi * fluxes))
+        # Inside the fireball the flux is its surface emissive power
+        radiation_distance = np.where(emissive_power[..., None] * 1000 >= fluxes,
+                                      np.maximum(radiation_distance, fireball_radius[..., None]), 0.0)
+
+        if correct and self.correction is not None:
+            factors = np.exp(self.correction.predict(
+                self.correction_features(concentration, temperature, pressure, confinement).reshape(-1, 4)))
+            overpressure_distance *= factors[:, 0].reshape(concentration.shape)[..., None]
+            radiation_distance *= factors[:, 1].reshape(concentration.shape)[..., None]
+
+        # Overpressure where the fireball ends (none without fuel)
+        edge_ratio = np.zeros_like(energy)
+        has_fuel = blast_scale > 0
+        edge_ratio[has_fuel] = _kinney_graham(fireball_radius[has_fuel] / blast_scale[has_fuel])
+
+        return {
+            'fuel_mass': fuel_mass,
+            'energy_release': energy / 1e6,
+            'tnt_equivalent': tnt,
+            'fireball_radius': fireball_radius,
+            'fireball_duration': duration,
+            'surface_emissive_power': emissive_power,
+            'overpressure': edge_ratio * ambient / 1000,
+            'distance_to_overpressure': overpressure_distance,
+            'distance_to_radiation': radiation_distance
+        }
+
+    @staticmethod
+    def correction_features(gas_concentration, temperature, pressure, confinement_factor):
+        """Features of the correction model, one row per scenario"""
+        return np.stack([np.log1p(np.maximum(gas_concentration, 0)), temperature, pressure, confinement_factor],
+                        axis=-1)
+
+    def fit_correction(self, data, estimator=None):
+        """
+        Fit the correction model on observed consequences
+
+        Parameters:
+        - data: DataFrame with gas_concentration, temperature, pressure, confinement_factor,
+          distance_to_overpressure_15kPa and distance_to_radiation_10kW columns
+          (as in data/training/explosion_data.csv)
+        - estimator: Unfitted multi-output regressor (defaults to ridge regression)
+
+        Returns:
+        - The fitted correction model
+        """
+        if estimator is None:
+            from sklearn.linear_model import Ridge
+            estimator = Ridge(alpha=1.0)
+
+        inputs = [data[c].to_numpy(dtype=np.float64)
+                  for c in ('gas_concentration', 'temperature', 'pressure', 'confinement_factor')]
+        physics = self.compute(*inputs, correct=False)
+        observed = data[['distance_to_overpressure_15kPa', 'distance_to_radiation_10kW']].to_numpy(dtype=np.float64)
+        computed = np.stack([physics['distance_to_overpressure'][:, 0], physics['distance_to_radiation'][:, 0]], axis=1)
+
+        valid = np.all((observed > 0) & (computed > 0), axis=1)
+        estimator.fit(self.correction_features(*inputs)[valid], np.log(observed[valid] / computed[valid]))
+        self.correction = estimator
+        logger.info(f"Fitted consequence correction on {int(valid.sum())} scenarios")
+        return estimator
+
+    def save_correction(self, path):
+        joblib.dump(self.correction, path)
+        logger.info(f"Consequence correction saved to {path}")
+
+    def load_correction(self, path):
+        self.correction = joblib.load(path)
+        logger.info(f"Loaded consequence correction from {path}")
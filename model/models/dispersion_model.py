@@ -3,6 +3,7 @@ import os
 import joblib
 import logging
 from sklearn.ensemble import RandomForestRegressor
+from models.preprocessing import FEATURE_DTYPE
 
 # Dummy Config class for directory management
 class Config:
@@ -12,6 +13,31 @@ class Config:
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Pasquill-Gifford style (a, b) coefficients for sigma_y = a * x^0.9, sigma_z = b * x^0.7
+DISPERSION_COEFFICIENTS = {
+    'A': (0.22, 0.20),
+    'B': (0.16, 0.12),
+    'C': (0.11, 0.08),
+    'D': (0.08, 0.06),
+    'E': (0.06, 0.03),
+    'F': (0.04, 0.02)
+}
+
+def get_stability_class(wind_speed):
+    """Pasquill stability class used by the plume and puff models for a wind speed in m/s"""
+    if wind_speed < 2:
+        return 'A'
+    elif wind_speed < 3:
+        return 'B'
+    elif wind_speed < 5:
+        return 'C'
+    elif wind_speed < 6:
+        return 'D'
+    elif wind_speed < 7:
+        return 'E'
+    else:
+        return 'F'
+
 class DispersionModel:
     """
     Model to predict gas dispersion patterns based on source strength,
@@ -55,7 +81,7 @@ class DispersionModel:
         Predict gas dispersion based on source and weather conditions
         """
         if self.model:
-            X = np.array([[source_strength, wind_speed, wind_direction]])
+            X = np.array([[source_strength, wind_speed, wind_direction]], dtype=FEATURE_DTYPE)
             try:
                 prediction = self.model.predict(X)[0]
                 plume_length = prediction[0]
@@ -89,44 +115,46 @@ class DispersionModel:
         return max(100, min(5000, plume_length)), max(30, min(1000, plume_width))
 
     def _get_stability_class(self, wind_speed):
-        if wind_speed < 2:
-            return 'A'
-        elif wind_speed < 3:
-            return 'B'
-        elif wind_speed < 5:
-            return 'C'
-        elif wind_speed < 6:
-            return 'D'
-        elif wind_speed < 7:
-            return 'E'
-        else:
-            return 'F'
+        return get_stability_class(wind_speed)
 
     def _get_dispersion_coefficients(self, distance, stability_class):
-        coefficients = {
-            'A': (0.22, 0.20),
-            'B': (0.16, 0.12),
-            'C': (0.11, 0.08),
-            'D': (0.08, 0.06),
-            'E': (0.06, 0.03),
-            'F': (0.04, 0.02)
-        }
-        a, b = coefficients.get(stability_class, (0.1, 0.1))
-        sigma_y = a * distance ** 0.9
-        sigma_z = b * distance ** 0.7
+        sigma_y, sigma_z = self._dispersion_sigmas(distance, stability_class)
         return {"sigma_y": float(sigma_y), "sigma_z": float(sigma_z)}
 
+    def _dispersion_sigmas(self, distance, stability_class):
+        """Vectorized sigma_y and sigma_z for scalar or array downwind distances"""
+        a, b = DISPERSION_COEFFICIENTS.get(stability_class, (0.1, 0.1))
+        distance = np.asarray(distance, dtype=float)
+        return a * distance ** 0.9, b * distance ** 0.7
+
     def _concentration_at_point(self, source_strength, wind_speed, x, y, stability_class):
-        disp = self._get_dispersion_coefficients(x, stability_class)
-        sigma_y = disp["sigma_y"]
-        sigma_z = disp["sigma_z"]
+        return float(self.concentration_field(source_strength, wind_speed, x, y, stability_class))
+
+    def concentration_field(self, source_strength, wind_speed, downwind, crosswind, stability_class):
+        """
+        Ground-level plume concentration at many points at once
+
+        Parameters:
+        - source_strength: Release strength
+        - wind_speed: Wind speed in m/s
+        - downwind: Distances along the plume axis in meters (scalar or array)
+        - crosswind: Distances across the plume axis in meters (scalar or array)
+        - stability_class: Pasquill stability class
+
+        Returns:
+        - Array of concentrations (zero upwind of the source)
+        """
+        x = np.asarray(downwind, dtype=float)
+        y = np.asarray(crosswind, dtype=float)
+        upwind = x <= 0
+        sigma_y, sigma_z = self._dispersion_sigmas(np.where(upwind, 1.0, x), stability_class)
         h = 0  # effective stack height
 
-        term1 = source_strength / (2 * np.pi * wind_speed * sigma_y * sigma_z)
+        term1 = source_strength / (2 * np.pi * max(wind_speed, 0.1) * sigma_y * sigma_z)
         term2 = np.exp(-0.5 * (y / sigma_y) ** 2)
         term3 = np.exp(-0.5 * (h / sigma_z) ** 2)
 
-        return term1 * term2 * term3
+        return np.where(upwind, 0.0, term1 * term2 * term3)
 
 
 # ===== Test Block =====
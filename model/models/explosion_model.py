@@ -4,15 +4,105 @@ import logging
 import numpy as np
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.multioutput import MultiOutputRegressor
+from sklearn.dummy import DummyRegressor
+from models.preprocessing import FEATURE_DTYPE
+from models.consequence import ConsequenceEngine, OVERPRESSURE_THRESHOLDS, RADIATION_THRESHOLDS
+from config import Config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class MergedBoostingRegressor:
+    """
+    Single-pass predictor equivalent to a MultiOutputRegressor of gradient boosting regressors.
+
+    The trees of every output are merged into flat node arrays (leaf values
+    premultiplied by the learning rate), and all rows descend all trees
+    together one level per step, so the five outputs come from one vectorized
+    traversal instead of five predict calls over their trees. Predictions
+    match the wrapped model's. The traversal cost grows with rows times trees,
+    so large batches go to the wrapped model's compiled per-tree code instead.
+    """
+
+    def __init__(self, model, max_rows=64):
+        """
+        Merge the trees of a fitted model
+
+        Parameters:
+        - model: Fitted MultiOutputRegressor of GradientBoostingRegressor with the default
+          (mean) or zero initial estimator
+        - max_rows: Largest batch predicted by the merged traversal
+        """
+        self.model = model
+        self.max_rows = max_rows
+        features, thresholds, left, right, values, roots, init = [], [], [], [], [], [], []
+        trees_per_output = []
+        offset = 0
+        depth = 0
+        for estimator in model.estimators_:
+            if not isinstance(estimator, GradientBoostingRegressor):
+                raise ValueError(f"Cannot merge {type(estimator).__name__}")
+            if estimator.init_ == 'zero':
+                init.append(0.0)
+            elif isinstance(estimator.init_, DummyRegressor):
+                init.append(float(np.ravel(estimator.init_.constant_)[0]))
+            else:
+                raise ValueError("Cannot merge gradient boosting with a custom initial estimator")
+
+            trees_per_output.append(len(estimator.estimators_))
+            for tree_estimator in estimator.estimators_[:, 0]:
+                tree = tree_estimator.tree_
+                is_leaf = tree.children_left < 0
+                features.append(np.where(is_leaf, 0, tree.feature))
+                thresholds.append(tree.threshold)
+                # Leaves point to themselves, so extra descent steps leave them in place
+                left.append(np.where(is_leaf, np.arange(tree.node_count), tree.children_left) + offset)
+                right.append(np.where(is_leaf, np.arange(tree.node_count), tree.children_right) + offset)
+                values.append(tree.value[:, 0, 0] * estimator.learning_rate)
+                roots.append(offset)
+                offset += tree.node_count
+                depth = max(depth, tree.max_depth)
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(left)
+        self.right = np.concatenate(right)
+        self.value = np.concatenate(values)
+        self.roots = np.array(roots)
+        self.depth = depth
+        self.init = np.array(init)
+        # Trees of each output are contiguous; reduceat sums them per output
+        self.output_starts = np.concatenate([[0], np.cumsum(trees_per_output)[:-1]])
+        self.n_features_in_ = model.estimators_[0].n_features_in_
+
+    def predict(self, X):
+        """
+        Predict all outputs
+
+        Parameters:
+        - X: Array of shape (n_samples, n_features)
+
+        Returns:
+        - Array of shape (n_samples, n_outputs)
+        """
+        if len(X) > self.max_rows:
+            return self.model.predict(X)
+
+        # sklearn trees compare float32 features
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.init + np.add.reduceat(self.value[nodes], self.output_starts, axis=1)
+
 class ExplosionModel:
-    def __init__(self, model_path='models/saved/explosion_model.joblib'):
+    def __init__(self, model_path='models/saved/explosion_model.joblib', backend=None, correction_path=None):
         self.model_path = model_path
         self.model = None
+        self.backend = backend or Config.EXPLOSION_BACKEND
 
         if os.path.exists(self.model_path):
             try:
@@ -25,6 +115,17 @@ class ExplosionModel:
             logger.warning(f"No model found at {self.model_path}. Creating a default model.")
             self._create_default_model()
 
+        self.predictor = self._build_predictor()
+
+        # Threshold distances come from the physics engine, corrected by a fitted model if there is one
+        self.consequences = ConsequenceEngine()
+        correction_path = correction_path or Config.EXPLOSION_CORRECTION_PATH
+        if os.path.exists(correction_path):
+            try:
+                self.consequences.load_correction(correction_path)
+            except Exception as e:
+                logger.error(f"Failed to load consequence correction: {e}")
+
     def _create_default_model(self):
         """Create a default model when no trained model is available"""
         try:
@@ -49,22 +150,68 @@ class ExplosionModel:
             logger.error(f"Error creating or saving default model: {e}")
             raise
 
-    def predict(self, gas_concentration, temperature):
+    def _build_predictor(self):
+        """Pick the object whose predict returns all outputs for the configured backend"""
+        if self.backend == 'merged' and isinstance(self.model, MultiOutputRegressor):
+            try:
+                return MergedBoostingRegressor(self.model)
+            except ValueError as e:
+                logger.warning(f"Using the unmerged explosion model: {e}")
+        # Native multi-output models (e.g. random forests) already predict in one pass
+        return self.model
+
+    def predict(self, gas_concentration, temperature, pressure=None, confinement_factor=None):
         try:
-            input_data = np.array([[gas_concentration, temperature]])
-            prediction = self.model.predict(input_data)[0]
+            input_data = np.array([[gas_concentration, temperature]], dtype=FEATURE_DTYPE)
+            prediction = self.predictor.predict(input_data)[0]
+            consequences = self.consequences.compute(gas_concentration, temperature, pressure, confinement_factor)
 
             return {
                 "energy_release": float(prediction[0]),
                 "fireball_radius": float(prediction[1]),
                 "explosion_duration": float(prediction[2]),
                 "overpressure": float(prediction[3]),
-                "thermal_radiation": float(prediction[4])
+                "thermal_radiation": float(prediction[4]),
+                "distance_to_overpressure": dict(zip(OVERPRESSURE_THRESHOLDS,
+                                                     consequences['distance_to_overpressure'].tolist())),
+                "distance_to_radiation": dict(zip(RADIATION_THRESHOLDS,
+                                                  consequences['distance_to_radiation'].tolist()))
             }
         except Exception as e:
             logger.error(f"Prediction failed: {e}")
             return {}
 
+    def predict_batch(self, gas_concentration, temperature, pressure=None, confinement_factor=None):
+        """
+        Predict explosion parameters for a batch of scenarios in one call
+
+        Parameters:
+        - gas_concentration: Array of gas concentrations in ppm
+        - temperature: Array of temperatures in Celsius
+        - pressure: Ambient pressures in hPa (scalar or array, optional)
+        - confinement_factor: Degrees of confinement between 0 and 1 (scalar or array, optional)
+
+        Returns:
+        - Dictionary of arrays: the five model outputs, plus distance_to_overpressure and
+          distance_to_radiation with one column per threshold (15/7/3 kPa, 10/5/2 kW/m²)
+        """
+        gas_concentration, temperature = np.broadcast_arrays(np.asarray(gas_concentration, dtype=np.float64),
+                                                             np.asarray(temperature, dtype=np.float64))
+        input_data = np.column_stack([gas_concentration.ravel(), temperature.ravel()]).astype(FEATURE_DTYPE)
+        prediction = self.predictor.predict(input_data)
+        consequences = self.consequences.compute(gas_concentration.ravel(), temperature.ravel(), pressure,
+                                                 confinement_factor)
+
+        return {
+            "energy_release": prediction[:, 0],
+            "fireball_radius": prediction[:, 1],
+            "explosion_duration": prediction[:, 2],
+            "overpressure": prediction[:, 3],
+            "thermal_radiation": prediction[:, 4],
+            "distance_to_overpressure": consequences['distance_to_overpressure'],
+            "distance_to_radiation": consequences['distance_to_radiation']
+        }
+
 # Optional: run as script for testing
 if __name__ == "__main__":
     model = ExplosionModel()
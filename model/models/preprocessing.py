@@ -3,9 +3,29 @@ import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import SimpleImputer
 import logging
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Floating point type used for features (see Config.FEATURE_DTYPE)
+FEATURE_DTYPE = np.dtype(Config.FEATURE_DTYPE)
+
+# Plausible ranges for each sensor
+SENSOR_VALID_RANGES = {
+    'mq2': (0, 10000),  # ppm
+    'mq4': (0, 10000),  # ppm
+    'mq6': (0, 10000),  # ppm
+    'mq8': (0, 10000),  # ppm
+    'temperature': (-50, 100),  # Celsius
+    'humidity': (0, 100)  # percentage
+}
+
+def _range_bounds(columns):
+    """Lower and upper valid bounds for columns (unbounded for non-sensor columns)"""
+    low = np.array([SENSOR_VALID_RANGES.get(column, (-np.inf, np.inf))[0] for column in columns], dtype=np.float64)
+    high = np.array([SENSOR_VALID_RANGES.get(column, (-np.inf, np.inf))[1] for column in columns], dtype=np.float64)
+    return low, high
+
 class SensorDataPreprocessor:
     """Class to preprocess sensor data for model training and prediction"""
     
@@ -13,6 +33,13 @@ class SensorDataPreprocessor:
         self.scaler = StandardScaler()
         self.imputer = SimpleImputer(strategy='mean')
         self.fitted = False
+
+        # Parameters of the fused transform, set by fit or partial_fit
+        self.columns_ = None
+        self.fill_ = None
+        self.mean_ = None
+        self.scale_ = None
+        self._stats = None
     
     def fit(self, data):
         """
@@ -29,6 +56,11 @@ class SensorDataPreprocessor:
             # Normalize data
             self.scaler.fit(imputed_data)
             self.fitted = True
+
+            self.columns_ = list(data.columns) if hasattr(data, 'columns') else None
+            self.fill_ = self.imputer.statistics_
+            self.mean_ = self.scaler.mean_
+            self.scale_ = self.scaler.scale_
             
             logger.info("Preprocessor fitted successfully")
             return True
@@ -36,6 +68,102 @@ class SensorDataPreprocessor:
             logger.error(f"Error fitting preprocessor: {str(e)}")
             return False
     
+    def partial_fit(self, X, columns=None, clean=True):
+        """
+        Update the fit with one chunk of data, for data too large to fit at once
+        
+        Gives the same parameters as fit on all chunks together: the mean of
+        each column's present values for imputation, and the mean and standard
+        deviation of the imputed columns for scaling.
+        
+        Parameters:
+        - X: 2-D array chunk with sensor readings
+        - columns: Column names of X (needed for cleaning; defaults to the sensor columns)
+        - clean: Treat readings outside SENSOR_VALID_RANGES as missing
+        """
+        X = np.asarray(X)
+        columns = list(columns) if columns is not None else (self.columns_ or list(SENSOR_VALID_RANGES))
+        
+        if clean:
+            low, high = _range_bounds(columns)
+            present = (X >= low) & (X <= high)
+        else:
+            present = ~np.isnan(X)
+        
+        # Per-column count, mean and sum of squared deviations of present values,
+        # merged into the running totals (Chan et al.) in float64
+        count = present.sum(axis=0).astype(np.float64)
+        total = np.where(present, X, 0).sum(axis=0, dtype=np.float64)
+        mean = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+        m2 = (np.where(present, X - mean, 0).astype(np.float64) ** 2).sum(axis=0)
+        
+        if self._stats is None:
+            self._stats = {'rows': 0, 'count': count, 'mean': mean, 'm2': m2}
+        else:
+            stats = self._stats
+            merged = stats['count'] + count
+            delta = mean - stats['mean']
+            weight = np.divide(count, merged, out=np.zeros_like(merged), where=merged > 0)
+            stats['mean'] = stats['mean'] + delta * weight
+            stats['m2'] = stats['m2'] + m2 + delta ** 2 * stats['count'] * weight
+            stats['count'] = merged
+        self._stats['rows'] += len(X)
+        
+        # Imputed values sit at the mean, so they add rows but no deviation
+        stats = self._stats
+        variance = stats['m2'] / max(stats['rows'], 1)
+        scale = np.sqrt(variance)
+        scale[scale == 0] = 1.0
+        
+        self.columns_ = columns
+        self.fill_ = stats['mean'].copy()
+        self.mean_ = stats['mean'].copy()
+        self.scale_ = scale
+        self.fitted = True
+        return self
+    
+    def _params(self):
+        """Imputation and scaling parameters (read from sklearn for preprocessors saved before partial_fit)"""
+        fill = getattr(self, 'fill_', None)
+        if fill is None:
+            return self.imputer.statistics_, self.scaler.mean_, self.scaler.scale_
+        return fill, self.mean_, self.scale_
+    
+    def transform_array(self, X, clean=False, chunk_size=65536):
+        """
+        Clean, impute and scale a 2-D float array in place
+        
+        Works through the array in row chunks so temporaries stay small and
+        each chunk is processed while it is in cache.
+        
+        Parameters:
+        - X: Writable 2-D float array (float32 or float64) with the fitted columns
+        - clean: Also treat readings outside SENSOR_VALID_RANGES as missing
+        - chunk_size: Rows per chunk
+        
+        Returns:
+        - X, transformed
+        """
+        fill, mean, scale = self._params()
+        mean = np.asarray(mean, dtype=X.dtype)
+        inverse_scale = (1.0 / np.asarray(scale)).astype(X.dtype)
+        scaled_fill = ((np.asarray(fill) - np.asarray(mean)) / np.asarray(scale)).astype(X.dtype)
+        if clean:
+            low, high = _range_bounds(self.columns_ or list(SENSOR_VALID_RANGES))
+            low, high = low.astype(X.dtype), high.astype(X.dtype)
+        
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            if clean:
+                missing = ~((chunk >= low) & (chunk <= high))
+            else:
+                missing = np.isnan(chunk)
+            chunk -= mean
+            chunk *= inverse_scale
+            np.copyto(chunk, np.broadcast_to(scaled_fill, chunk.shape), where=missing)
+        
+        return X
+    
     def transform(self, data):
         """
         Transform data using fitted preprocessor
@@ -51,13 +179,8 @@ class SensorDataPreprocessor:
             return np.array(data)
         
         try:
-            # Fill missing values
-            imputed_data = self.imputer.transform(data)
-            
-            # Normalize data
-            transformed_data = self.scaler.transform(imputed_data)
-            
-            return transformed_data
+            # Fill missing values and normalize in one pass over a single copy
+            return self.transform_array(np.array(data, dtype=FEATURE_DTYPE))
         except Exception as e:
             logger.error(f"Error transforming data: {str(e)}")
             return np.array(data)
@@ -90,7 +213,8 @@ class SensorDataPreprocessor:
             return np.array(data)
         
         try:
-            return self.scaler.inverse_transform(data)
+            _, mean, scale = self._params()
+            return (np.asarray(data, dtype=FEATURE_DTYPE) * scale + mean).astype(FEATURE_DTYPE)
         except Exception as e:
             logger.error(f"Error inverse transforming data: {str(e)}")
             return np.array(data)
@@ -109,29 +233,25 @@ def clean_sensor_data(data):
     # Make a copy to avoid modifying the original
     df = data.copy()
     
-    # Define plausible ranges for each sensor
-    valid_ranges = {
-        'mq2': (0, 10000),  # ppm
-        'mq4': (0, 10000),  # ppm
-        'mq6': (0, 10000),  # ppm
-        'mq8': (0, 10000),  # ppm
-        'temperature': (-50, 100),  # Celsius
-        'humidity': (0, 100)  # percentage
-    }
-    
-    # Replace out-of-range values with NaN
-    for column, (min_val, max_val) in valid_ranges.items():
-        if column in df.columns:
-            mask = (df[column] < min_val) | (df[column] > max_val)
-            df.loc[mask, column] = np.nan
-            logger.info(f"Removed {mask.sum()} invalid values from {column}")
+    # Replace out-of-range values with NaN, all sensor columns at once
+    columns = [column for column in SENSOR_VALID_RANGES if column in df.columns]
+    if columns:
+        values = df[columns].to_numpy(dtype=np.float64)
+        low, high = _range_bounds(columns)
+        invalid = (values < low) | (values > high)
+        values[invalid] = np.nan
+        df[columns] = values
+        
+        removed = invalid.sum(axis=0)
+        logger.info("Removed invalid values: " +
+                    ", ".join(f"{column}={count}" for column, count in zip(columns, removed)))
     
     # Remove rows with too many NaNs (more than half of columns)
     threshold = len(df.columns) // 2
     df = df.dropna(thresh=threshold)
     
     # For remaining NaNs, fill with median of column
-    df = df.fillna(df.median())
+    df = df.fillna(df.median(numeric_only=True))
     
     return df
 
@@ -177,7 +297,7 @@ def generate_synthetic_data(n_samples=1000, include_anomalies=True, anomaly_rati
     normal_data = {}
     for sensor, params in normal_params.items():
         normal_data[sensor] = np.random.normal(
-            params['mean'], params['std'], n_normal)
+            params['mean'], params['std'], n_normal).astype(FEATURE_DTYPE)
     
     normal_df = pd.DataFrame(normal_data)
     normal_labels = pd.Series([0] * n_normal)
@@ -190,7 +310,7 @@ def generate_synthetic_data(n_samples=1000, include_anomalies=True, anomaly_rati
     anomaly_data = {}
     for sensor, params in anomaly_params.items():
         anomaly_data[sensor] = np.random.normal(
-            params['mean'], params['std'], n_anomalies)
+            params['mean'], params['std'], n_anomalies).astype(FEATURE_DTYPE)
     
     anomaly_df = pd.DataFrame(anomaly_data)
     anomaly_labels = pd.Series([1] * n_anomalies)
@@ -0,0 +1,232 @@
+import numpy as np
+from collections import OrderedDict
+import math
+import threading
+import time
+import logging
+from config import Config
+from models.dispersion_model import DISPERSION_COEFFICIENTS, get_stability_class
+
+logger = logging.getLogger(__name__)
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111320.0
+
+class PuffSimulator:
+    """
+    Time-stepped Gaussian puff dispersion for a single release.
+
+    The release is discretized into puffs that are advected with the wind of
+    each step. Every puff carries its own position, mass and spread, so a
+    step only moves and grows the existing puffs and adds new ones; history
+    is never recomputed. Spreads grow along the Pasquill-Gifford curves of the
+    current stability class, continuing from each puff's present size, which
+    keeps them consistent when the wind changes.
+    """
+
+    def __init__(self, latitude, longitude, release_rate, puff_interval=1.0,
+                 max_puffs=5000, min_concentration=1e-6):
+        """
+        Initialize a simulation with no puffs released yet
+
+        Parameters:
+        - latitude, longitude: Source coordinates
+        - release_rate: Mass released per second
+        - puff_interval: Seconds of release represented by one puff
+        - max_puffs: Upper bound on live puffs (oldest are dropped first)
+        - min_concentration: Puffs whose peak concentration falls below this are dropped
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.release_rate = release_rate
+        self.puff_interval = puff_interval
+        self.max_puffs = max_puffs
+        self.min_concentration = min_concentration
+        self._meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(latitude))
+
+        self.time = 0.0
+        self.released_mass = 0.0
+
+        # Puff state, positions in meters east/north of the source
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.mass = np.zeros(0)
+        self.sigma_y = np.zeros(0)
+        self.sigma_z = np.zeros(0)
+        self.born = np.zeros(0)
+
+    @property
+    def puff_count(self):
+        return len(self.mass)
+
+    def _grow(self, sigma_y, sigma_z, travel, stability_class):
+        """Grow spreads by a travel distance along the curves of a stability class"""
+        a, b = DISPERSION_COEFFICIENTS.get(stability_class, (0.1, 0.1))
+
+        # Distance at which the current class would have produced the current spread
+        virtual_y = (sigma_y / a) ** (1 / 0.9)
+        virtual_z = (sigma_z / b) ** (1 / 0.7)
+
+        return a * (virtual_y + travel) ** 0.9, b * (virtual_z + travel) ** 0.7
+
+    def step(self, dt, wind_speed, wind_direction, release_rate=None):
+        """
+        Advance the simulation
+
+        Parameters:
+        - dt: Time step in seconds
+        - wind_speed: Wind speed in m/s during the step
+        - wind_direction: Bearing the wind carries puffs towards, in degrees from north
+        - release_rate: New release rate from this step on (unchanged if None)
+
+        Returns:
+        - Number of live puffs after the step
+        """
+        if not math.isfinite(dt) or dt < 0:
+            raise ValueError(f"Time step must be a finite, non-negative number of seconds, got {dt}")
+        if release_rate is not None:
+            self.release_rate = release_rate
+
+        speed = max(float(wind_speed), 0.1)
+        theta = math.radians(wind_direction)
+        ux, uy = speed * math.sin(theta), speed * math.cos(theta)
+        stability = get_stability_class(wind_speed)
+
+        # Move and grow the existing puffs
+        travel = speed * dt
+        self.x += ux * dt
+        self.y += uy * dt
+        self.sigma_y, self.sigma_z = self._grow(self.sigma_y, self.sigma_z, travel, stability)
+
+        # Release new puffs spread over the step, each already carried for its share of it.
+        # Only the newest max_puffs are built, since pruning would drop the older ones anyway,
+        # and they are ordered oldest first like the existing puffs
+        if self.release_rate > 0:
+            released = max(1, int(math.ceil(dt / self.puff_interval)))
+            count = min(released, self.max_puffs)
+            carried = (np.arange(count)[::-1] + 0.5) / released * dt
+            a, b = DISPERSION_COEFFICIENTS.get(stability, (0.1, 0.1))
+            start = np.full(count, 1e-3)
+            sigma_y, sigma_z = self._grow(a * start ** 0.9, b * start ** 0.7, speed * carried, stability)
+
+            mass = self.release_rate * dt
+            self.x = np.concatenate([self.x, ux * carried])
+            self.y = np.concatenate([self.y, uy * carried])
+            self.mass = np.concatenate([self.mass, np.full(count, mass / released)])
+            self.sigma_y = np.concatenate([self.sigma_y, sigma_y])
+            self.sigma_z = np.concatenate([self.sigma_z, sigma_z])
+            self.born = np.concatenate([self.born, self.time + dt - carried])
+            self.released_mass += mass
+
+        self.time += dt
+        self._prune()
+        return self.puff_count
+
+    def _prune(self):
+        """Drop puffs that no longer matter and cap the number of live puffs"""
+        peak = self.mass / ((2 * np.pi) ** 1.5 * self.sigma_y ** 2 * self.sigma_z)
+        keep = peak >= self.min_concentration
+        if keep.sum() > self.max_puffs:
+            # Puffs are stored oldest first, so keep the newest ones
+            keep[np.flatnonzero(keep)[:-self.max_puffs]] = False
+        if not np.all(keep):
+            self.x, self.y, self.mass = self.x[keep], self.y[keep], self.mass[keep]
+            self.sigma_y, self.sigma_z = self.sigma_y[keep], self.sigma_z[keep]
+            self.born = self.born[keep]
+
+    def concentration(self, latitudes, longitudes, chunk_size=4096):
+        """
+        Ground-level concentration at many points
+
+        Parameters:
+        - latitudes, longitudes: Point coordinates
+        - chunk_size: Points evaluated per block (bounds memory to chunk_size x puffs)
+
+        Returns:
+        - Array of concentrations, one per point
+        """
+        px = (np.asarray(longitudes, dtype=float).ravel() - self.longitude) * self._meters_per_lon
+        py = (np.asarray(latitudes, dtype=float).ravel() - self.latitude) * METERS_PER_DEGREE
+        result = np.zeros(len(px))
+        if self.puff_count == 0:
+            return result
+
+        # Ground-level puff without stack height, consistent with the steady plume model
+        amplitude = self.mass / ((2 * np.pi) ** 1.5 * self.sigma_y ** 2 * self.sigma_z)
+        inv_two_var = 1.0 / (2 * self.sigma_y ** 2)
+
+        for start in range(0, len(px), chunk_size):
+            stop = start + chunk_size
+            dx = px[start:stop, None] - self.x[None, :]
+            dy = py[start:stop, None] - self.y[None, :]
+            result[start:stop] = np.exp(-(dx * dx + dy * dy) * inv_two_var) @ amplitude
+
+        return result
+
+    def summary(self):
+        """
+        Describe the current state of the simulation
+
+        Returns:
+        - Dictionary with simulated time, puff count and the extent of the cloud
+        """
+        summary = {
+            "time": float(self.time),
+            "puff_count": int(self.puff_count),
+            "released_mass": float(self.released_mass),
+            "airborne_mass": float(self.mass.sum())
+        }
+        if self.puff_count:
+            reach = np.hypot(self.x, self.y) + 2 * self.sigma_y
+            summary["max_extent"] = float(reach.max())
+        return summary
+
+class PuffSimulationStore:
+    """Puff simulations kept per incident, dropped when not stepped for a while"""
+
+    def __init__(self, ttl=None, max_incidents=256):
+        """
+        Initialize an empty store
+
+        Parameters:
+        - ttl: Seconds an idle simulation is kept
+        - max_incidents: Maximum number of simulations (least recently used are dropped)
+        """
+        self.ttl = ttl if ttl is not None else Config.ZONE_TTL_SECONDS
+        self.max_incidents = max_incidents
+        self._lock = threading.Lock()
+        self._simulations = OrderedDict()
+
+    def get_or_create(self, incident_id, latitude, longitude, release_rate):
+        """
+        Get the simulation of an incident, starting one if needed
+
+        Parameters:
+        - incident_id: Identifier of the incident
+        - latitude, longitude: Source coordinates used for a new simulation
+        - release_rate: Release rate used for a new simulation
+
+        Returns:
+        - (PuffSimulator, lock) pair; hold the lock while stepping or reading it
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._simulations.items() if entry['touched'] + self.ttl <= now]
+            for key in expired:
+                del self._simulations[key]
+
+            entry = self._simulations.get(incident_id)
+            if entry is None:
+                entry = {
+                    'simulation': PuffSimulator(latitude, longitude, release_rate),
+                    'lock': threading.Lock(),
+                    'touched': now
+                }
+                self._simulations[incident_id] = entry
+                logger.info(f"Started puff simulation for {incident_id}")
+                while len(self._simulations) > self.max_incidents:
+                    self._simulations.popitem(last=False)
+
+            entry['touched'] = now
+            self._simulations.move_to_end(incident_id)
+            return entry['simulation'], entry['lock']
@@ -3,18 +3,27 @@ import joblib
 import os
 from sklearn.ensemble import RandomForestClassifier
 import logging
+import threading
+from collections import OrderedDict
 from config import Config
+from models.cascade import ThresholdPrefilter, FlatForest, THREAT_FEATURES
+from utils.drift import TrainingProfile
 
 logger = logging.getLogger(__name__)
 
 class ThreatModel:
     """Model to predict threat level based on sensor readings"""
     
-    def __init__(self, model_path=None):
+    # Up to this many readings the trees are descended in numpy; beyond it by the fitted forest
+    FLAT_MAX_ROWS = 64
+    
+    def __init__(self, model_path=None, prefilter_path=None, profile_path=None):
         """Initialize the threat prediction model"""
         self.model = None
         self.config = Config()
         self.model_path = model_path or os.path.join(Config.MODEL_DIR, 'threat_model.joblib')
+        prefilter_path = prefilter_path or self.config.THREAT_PREFILTER_PATH
+        self.profile_path = profile_path or self.config.THREAT_PROFILE_PATH
         
         # Try to load pre-trained model
         try:
@@ -27,6 +36,35 @@ class ThreatModel:
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             self._create_default_model()
+        self.flat = FlatForest(self.model)
+        
+        # Scores and attributions of recently seen readings; sensors often repeat the same values
+        self._attribution_cache = OrderedDict()
+        self._attribution_lock = threading.Lock()
+        
+        # Optional cascade prefilter, only valid for the forest it was calibrated against
+        self.prefilter = None
+        self._cascade_counts = {'short_circuited': 0, 'escalated': 0}
+        self._cascade_lock = threading.Lock()
+        if self.config.THREAT_CASCADE and os.path.exists(prefilter_path):
+            try:
+                prefilter = ThresholdPrefilter.load(prefilter_path)
+                if prefilter.matches(self.model):
+                    self.prefilter = prefilter
+                    logger.info(f"Loaded threat prefilter from {prefilter_path}")
+                else:
+                    logger.warning("Threat prefilter was calibrated against another model; cascade disabled")
+            except Exception as e:
+                logger.error(f"Error loading threat prefilter: {str(e)}")
+        
+        # Distribution of the training readings, for drift monitoring
+        self.profile = None
+        if os.path.exists(self.profile_path):
+            try:
+                self.profile = TrainingProfile.load(self.profile_path)
+                logger.info(f"Loaded threat training profile from {self.profile_path}")
+            except Exception as e:
+                logger.error(f"Error loading threat training profile: {str(e)}")
     
     def _create_default_model(self):
         """Create a default model when no trained model is available"""
@@ -40,7 +78,117 @@ class ThreatModel:
         self.model.fit(X_dummy, y_dummy)
         logger.warning("Created a default model with random data. Train with real data as soon as possible.")
     
-    def predict(self, mq2, mq4, mq6, mq8, temperature, humidity):
+    @property
+    def prefilter(self):
+        """Cascade prefilter in front of the forest (None when disabled)"""
+        return self._prefilter
+    
+    @prefilter.setter
+    def prefilter(self, prefilter):
+        self._prefilter = prefilter
+        # Trees whose every leaf inside a safe box votes SAFE bound the vote agreement there from below
+        self._prefilter_confidence = None if prefilter is None else float(min(
+            (np.mean(self.flat.tree_upper_bounds(lower, upper) <= 0.5)
+             for lower, upper in zip(prefilter.lower, prefilter.upper)
+        ), default=1.0))  # a prefilter without boxes never answers
+    
+    def _leaves(self, X):
+        """Flat index of the leaf every tree sends each reading to, shape (n_samples, n_trees)"""
+        if len(X) <= self.FLAT_MAX_ROWS:
+            return self.flat.leaves(X)
+        return self.model.apply(X) + self.flat.roots
+    
+    def _explain(self, X):
+        """
+        Score one reading with its attributions, reusing the attributions of a reading seen before
+        
+        The score always comes from the exact reading. Cached attributions are
+        looked up by the reading rounded to Config.ATTRIBUTION_QUANTUM, so
+        readings differing only by sensor noise share an entry, and are reused
+        only if the reading lands in the same leaves, which determine them.
+        
+        Returns:
+        - (risk_score, confidence, uncertainty, attributions dictionary)
+        """
+        leaves = self._leaves(X)
+        risk_score, confidence, uncertainty = (float(v[0]) for v in self._vote_stats(self.flat.value[leaves]))
+        
+        quantum = self.config.ATTRIBUTION_QUANTUM
+        key = (np.round(X / quantum) if quantum > 0 else X).tobytes()
+        path = leaves.tobytes()
+        with self._attribution_lock:
+            cached = self._attribution_cache.get(key)
+            if cached is not None and cached[0] == path:
+                self._attribution_cache.move_to_end(key)
+                return risk_score, confidence, uncertainty, cached[1]
+        
+        attributions = {feature: float(c) for feature, c in zip(THREAT_FEATURES, self.flat.attributions(leaves)[0])}
+        if self.config.ATTRIBUTION_CACHE_SIZE:
+            with self._attribution_lock:
+                self._attribution_cache[key] = (path, attributions)
+                self._attribution_cache.move_to_end(key)
+                if len(self._attribution_cache) > self.config.ATTRIBUTION_CACHE_SIZE:
+                    self._attribution_cache.popitem(last=False)
+        return risk_score, confidence, uncertainty, attributions
+    
+    @staticmethod
+    def _vote_stats(tree_scores):
+        """
+        Risk score and its spread over the trees
+        
+        Parameters:
+        - tree_scores: Per-tree positive class probabilities, shape (n_samples, n_trees)
+        
+        Returns:
+        - (risk_score, confidence, uncertainty) arrays: the forest's probability, the fraction
+          of trees voting for the class the forest decides, and the standard deviation of
+          the trees' probabilities
+        """
+        risk_score = tree_scores.mean(axis=1)
+        positive_votes = (tree_scores > 0.5).mean(axis=1)
+        confidence = np.where(risk_score > 0.5, positive_votes, 1 - positive_votes)
+        return risk_score, confidence, tree_scores.std(axis=1)
+    
+    def predict_batch(self, X, attributions=False):
+        """
+        Predict the threat level of many readings in one pass over the forest
+        
+        Parameters:
+        - X: Readings of shape (n_samples, 6) ordered mq2, mq4, mq6, mq8, temperature, humidity
+        - attributions: Also return each feature's contribution to the forest's probability
+        
+        Returns:
+        - Dictionary of arrays: risk_score, risk_level, confidence and uncertainty
+          (the same values predict returns for each reading on the model path), and
+          with attributions, attributions of shape (n_samples, 6) and attribution_bias
+        """
+        X = np.ascontiguousarray(X, dtype=self.config.FEATURE_DTYPE)
+        leaves = self._leaves(X)
+        risk_score, confidence, uncertainty = self._vote_stats(self.flat.value[leaves])
+        
+        immediate_danger = (
+            (X[:, 0] > self.config.THRESHOLD_MQ2) | (X[:, 1] > self.config.THRESHOLD_MQ4) |
+            (X[:, 2] > self.config.THRESHOLD_MQ6) | (X[:, 3] > self.config.THRESHOLD_MQ8) |
+            (X[:, 4] > self.config.THRESHOLD_TEMP_HIGH)
+        )
+        risk_score = np.where(immediate_danger, np.maximum(risk_score, 0.8), risk_score)
+        
+        thresholds = [self.config.ZONE_LOW_THRESHOLD, self.config.ZONE_MEDIUM_THRESHOLD,
+                      self.config.ZONE_HIGH_THRESHOLD]
+        risk_level = np.array(['SAFE', 'LOW', 'MEDIUM', 'HIGH'])[np.searchsorted(thresholds, risk_score, side='right')]
+        
+        result = {
+            "risk_score": risk_score,
+            "risk_level": risk_level,
+            "confidence": confidence,
+            "uncertainty": uncertainty
+        }
+        if attributions:
+            result["attributions"] = self.flat.attributions(leaves)
+            result["attribution_bias"] = self.flat.bias
+        return result
+    
+    def predict(self, mq2, mq4, mq6, mq8, temperature, humidity, naive=False):
         """
         Predict threat level based on sensor readings
         
@@ -51,12 +199,16 @@ class ThreatModel:
         - mq8: Hydrogen reading
         - temperature: Temperature in Celsius
         - humidity: Humidity percentage
+        - naive: Skip the model and use the threshold-based risk score
         
         Returns:
-        - Dictionary containing risk score, classification, and recommended actions
+        - Dictionary containing risk score, classification, and recommended actions;
+          confidence and uncertainty describe how the trees' votes agree (None without the model);
+          attributions give each sensor's contribution to the model's probability, which is
+          attribution_bias plus their sum (None unless the forest scored the reading)
         """
         # Prepare input data
-        X = np.array([[mq2, mq4, mq6, mq8, temperature, humidity]])
+        X = np.array([[mq2, mq4, mq6, mq8, temperature, humidity]], dtype=self.config.FEATURE_DTYPE)
         
         # Check against thresholds for immediate danger
         immediate_danger = (
@@ -68,11 +220,27 @@ class ThreatModel:
         )
         
         # Get model prediction
-        if self.model:
-            risk_score = float(self.model.predict_proba(X)[0, 1])  # Probability of the positive class
+        if self.model and not naive and self.prefilter is not None and self.prefilter.is_safe(X)[0]:
+            # Inside the calibrated safe region the forest provably scores below the bound
+            risk_score = self.prefilter.bound
+            confidence, uncertainty, attributions = self._prefilter_confidence, None, None
+            self._count_cascade('short_circuited')
+        elif self.model and not naive and self.config.THREAT_ATTRIBUTIONS:
+            # Probability of the positive class, the agreement of the trees and the
+            # contribution of each sensor, from one pass along the decision paths
+            risk_score, confidence, uncertainty, attributions = self._explain(X)
+            if self.prefilter is not None:
+                self._count_cascade('escalated')
+        elif self.model and not naive:
+            # Probability of the positive class and the agreement of the trees, from one pass
+            risk_score, confidence, uncertainty = (float(v[0]) for v in self._vote_stats(self.flat.value[self._leaves(X)]))
+            attributions = None
+            if self.prefilter is not None:
+                self._count_cascade('escalated')
         else:
             # If model isn't available, calculate a naive risk score
             risk_score = self._calculate_naive_risk(mq2, mq4, mq6, mq8, temperature, humidity)
+            confidence, uncertainty, attributions = None, None, None
             
         # Adjust risk score if immediate danger is detected
         if immediate_danger:
@@ -113,6 +281,10 @@ class ThreatModel:
         return {
             "risk_score": risk_score,
             "risk_level": risk_level,
+            "confidence": confidence,
+            "uncertainty": uncertainty,
+            "attributions": attributions,
+            "attribution_bias": self.flat.bias if attributions is not None else None,
             "recommendations": recommendations,
             "sensor_status": {
                 "mq2": "ALERT" if mq2 > self.config.THRESHOLD_MQ2 else "NORMAL",
@@ -126,6 +298,26 @@ class ThreatModel:
             }
         }
     
+    def _count_cascade(self, outcome):
+        with self._cascade_lock:
+            self._cascade_counts[outcome] += 1
+
+    def cascade_stats(self):
+        """
+        Report how often the cascade prefilter answered without the model
+        
+        Returns:
+        - Dictionary with whether the cascade is active and its outcome counts
+        """
+        with self._cascade_lock:
+            counts = dict(self._cascade_counts)
+        total = counts['short_circuited'] + counts['escalated']
+        return {
+            "active": self.prefilter is not None,
+            **counts,
+            "short_circuit_rate": counts['short_circuited'] / total if total else None
+        }
+    
     def _calculate_naive_risk(self, mq2, mq4, mq6, mq8, temperature, humidity):
         """Calculate a naive risk score based on sensor thresholds"""
         # Normalize each reading relative to its threshold
@@ -153,12 +345,25 @@ class ThreatModel:
         - X: Features (sensor readings)
         - y: Labels (0 for safe, 1 for threat)
         """
+        # Convert once to the feature dtype; the forest then fits without another copy
+        X = np.ascontiguousarray(X, dtype=self.config.FEATURE_DTYPE)
+
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
         self.model.fit(X, y)
+        self.flat = FlatForest(self.model)
+        with self._attribution_lock:
+            self._attribution_cache.clear()
+        
+        # The prefilter was calibrated against the previous forest
+        if self.prefilter is not None:
+            self.prefilter = None
+            logger.warning("Threat prefilter disabled until it is recalibrated for the new model")
         
-        # Save the trained model
+        # Save the trained model and the distribution it was trained on
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         joblib.dump(self.model, self.model_path)
         logger.info(f"Model trained and saved to {self.model_path}")
+        self.profile = TrainingProfile.from_data(X, THREAT_FEATURES)
+        self.profile.save(self.profile_path)
         
         return self.model
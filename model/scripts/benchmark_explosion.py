@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Script to compare the latency and accuracy of explosion model backends
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import logging
+
+# Add parent directory to path to import from models and utils
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.model_selection import KFold
+from models.explosion_model import MergedBoostingRegressor
+from models.consequence import ConsequenceEngine
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TARGETS = ['energy_release', 'fireball_radius', 'explosion_duration', 'overpressure', 'thermal_radiation']
+
+def load_targets(data):
+    """
+    Build the five ExplosionModel targets for a table of explosion scenarios
+
+    explosion_data.csv records energy_release and fireball_radius; the other
+    three targets are not measured there and are taken from the consequence
+    engine (fireball duration, overpressure at the fireball edge and surface
+    emissive power) so every backend learns the same five outputs.
+
+    Parameters:
+    - data: DataFrame of data/training/explosion_data.csv
+
+    Returns:
+    - (X, y) with X of shape (n, 2) (gas_concentration, temperature) and y of shape (n, 5)
+    """
+    physics = ConsequenceEngine().compute(data['gas_concentration'].to_numpy(), data['temperature'].to_numpy(),
+                                          data.get('pressure'), data.get('confinement_factor'), correct=False)
+    y = np.column_stack([
+        data['energy_release'].to_numpy(dtype=np.float64) if 'energy_release' in data else physics['energy_release'],
+        data['fireball_radius'].to_numpy(dtype=np.float64) if 'fireball_radius' in data else physics['fireball_radius'],
+        physics['fireball_duration'],
+        physics['overpressure'],
+        physics['surface_emissive_power']
+    ])
+    X = data[['gas_concentration', 'temperature']].to_numpy(dtype=np.float64)
+    return X, y
+
+def make_backends(n_estimators=100):
+    """Factories of the compared backends, each returning (fitted model, predictor)"""
+    def boosting(X, y):
+        model = MultiOutputRegressor(GradientBoostingRegressor(n_estimators=n_estimators, random_state=42)).fit(X, y)
+        return model, model
+
+    def merged(X, y):
+        model, _ = boosting(X, y)
+        return model, MergedBoostingRegressor(model)
+
+    def forest(X, y):
+        model = RandomForestRegressor(n_estimators=n_estimators, random_state=42, n_jobs=1).fit(X, y)
+        return model, model
+
+    return {'boosting': boosting, 'merged_boosting': merged, 'forest': forest}
+
+def _latency(predictor, X, repeats):
+    """Per-call latencies in microseconds of predicting each row of X on its own"""
+    rows = [X[i:i + 1].astype(np.float32) for i in range(len(X))]
+    predictor.predict(rows[0])  # warm up
+    timings = []
+    for _ in range(repeats):
+        for row in rows:
+            start = time.perf_counter()
+            predictor.predict(row)
+            timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1e6
+
+def benchmark(training_data_path, test_data_path, n_estimators=100, folds=5, repeats=20, batch_size=10000):
+    """
+    Compare backends on accuracy (cross-validated) and latency
+
+    Parameters:
+    - training_data_path: explosion_data.csv with measured outputs
+    - test_data_path: test_explosion_scenarios.csv used for latency
+    - n_estimators: Trees per ensemble
+    - folds: Cross-validation folds
+    - repeats: Passes over the test scenarios for single-row latency
+    - batch_size: Rows of the batch latency measurement (test scenarios repeated)
+
+    Returns:
+    - DataFrame with one row per backend
+    """
+    X, y = load_targets(pd.read_csv(training_data_path))
+    test = pd.read_csv(test_data_path)[['gas_concentration', 'temperature']].to_numpy(dtype=np.float64)
+    batch = np.resize(test, (batch_size, test.shape[1])).astype(np.float32)
+    backends = make_backends(n_estimators)
+
+    results = {}
+    for name, build in backends.items():
+        # Accuracy: mean absolute error per target over held-out folds
+        predictions = np.zeros_like(y)
+        for train, held_out in KFold(folds, shuffle=True, random_state=42).split(X):
+            _, predictor = build(X[train], y[train])
+            predictions[held_out] = predictor.predict(X[held_out].astype(np.float32))
+        errors = np.abs(predictions - y).mean(axis=0)
+
+        model, predictor = build(X, y)
+        single = _latency(predictor, test, repeats)
+        start = time.perf_counter()
+        predictor.predict(batch)
+        batch_seconds = time.perf_counter() - start
+
+        results[name] = {
+            'single_p50_us': float(np.percentile(single, 50)),
+            'single_p99_us': float(np.percentile(single, 99)),
+            'batch_rows_per_second': batch_size / batch_seconds,
+            **{f'mae_{target}': float(error) for target, error in zip(TARGETS, errors)}
+        }
+
+        if name == 'merged_boosting':
+            # Compare on a batch small enough for the merged traversal
+            sample = batch[:predictor.max_rows]
+            difference = np.abs(predictor.predict(sample) - model.predict(sample)).max()
+            results[name]['max_difference_to_boosting'] = float(difference)
+
+    return pd.DataFrame(results).T
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Benchmark explosion model backends')
+
+    parser.add_argument('--training_data', '-t', type=str,
+                        default=os.path.join(Config.TRAINING_DATA_DIR, 'explosion_data.csv'),
+                        help='Explosion scenarios with measured outputs')
+    parser.add_argument('--test_data', type=str,
+                        default=os.path.join(Config.TEST_DATA_DIR, 'test_explosion_scenarios.csv'),
+                        help='Explosion scenarios used for latency')
+    parser.add_argument('--trees', type=int, default=100, help='Trees per ensemble')
+    parser.add_argument('--output', '-o', type=str, help='Write the results as JSON to this file')
+
+    args = parser.parse_args()
+
+    report = benchmark(args.training_data, args.test_data, args.trees)
+    logger.info("Explosion backends:\n" + report.to_string(float_format='{:.4g}'.format))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report.to_dict(orient='index'), f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Script to calibrate the threshold prefilter of the threat model cascade
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import logging
+
+# Add parent directory to path to import from models and utils
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.threat_model import ThreatModel
+from models.cascade import ThresholdPrefilter, THREAT_FEATURES, forest_scores
+from utils.data_processing import load_data
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def pipeline_is_safe(model, X):
+    """
+    Whether ThreatModel.predict answers SAFE for each reading
+
+    Parameters:
+    - model: Forest used by ThreatModel
+    - X: Readings of shape (n_samples, 6) in THREAT_FEATURES order
+
+    Returns:
+    - Boolean array
+    """
+    immediate_danger = (
+        (X[:, 0] > Config.THRESHOLD_MQ2) | (X[:, 1] > Config.THRESHOLD_MQ4) |
+        (X[:, 2] > Config.THRESHOLD_MQ6) | (X[:, 3] > Config.THRESHOLD_MQ8) |
+        (X[:, 4] > Config.THRESHOLD_TEMP_HIGH)
+    )
+    return (forest_scores(model, X.astype(Config.FEATURE_DTYPE)) < Config.ZONE_LOW_THRESHOLD) & ~immediate_danger
+
+def calibrate_cascade(validation_data_path, training_data_path=None, model_path=None, output_path=None, max_boxes=4,
+                      timing_samples=200, calibration_fraction=0.5, save=True):
+    """
+    Calibrate the prefilter against the threat model and report how it performs
+
+    The prefilter is calibrated on training readings and measured on held-out
+    validation readings, so the reported disagreement reflects readings it
+    was not fitted to. Without training readings, a random calibration fold
+    of the validation readings is held out for calibrating instead.
+
+    Parameters:
+    - validation_data_path: CSV file of raw held-out readings the prefilter is measured on
+    - training_data_path: CSV file of raw readings the prefilter is calibrated on (optional)
+    - model_path: Path to the trained threat model
+    - output_path: Where to save the prefilter (defaults to Config.THREAT_PREFILTER_PATH)
+    - max_boxes: Maximum number of safe boxes
+    - timing_samples: Readings timed through ThreatModel.predict with and without the cascade
+    - calibration_fraction: Share of the validation readings calibrated on when no training data is given
+    - save: Whether to save the prefilter
+
+    Returns:
+    - Dictionary with the short-circuit fraction and disagreement rate on the validation readings,
+      latencies and the safe boxes
+    """
+    threat_model = ThreatModel(model_path)
+    X = load_data(validation_data_path)[THREAT_FEATURES].dropna().to_numpy(dtype=np.float64)
+    if training_data_path:
+        X_train = load_data(training_data_path)[THREAT_FEATURES].dropna().to_numpy(dtype=np.float64)
+    else:
+        order = np.random.default_rng(42).permutation(len(X))
+        fold = int(len(X) * calibration_fraction)
+        X_train, X = X[order[:fold]], X[order[fold:]]
+    logger.info(f"Calibrating on {len(X_train)} readings, measuring on {len(X)} held-out readings")
+
+    prefilter = ThresholdPrefilter.calibrate(threat_model.model, X_train, max_boxes=max_boxes)
+    short_circuited = prefilter.is_safe(X)
+    # Held-out readings the cascade answers SAFE although the full pipeline would not
+    disagreements = short_circuited & ~pipeline_is_safe(threat_model.model, X)
+
+    report = {
+        'calibration_readings': int(len(X_train)),
+        'readings': int(len(X)),
+        'short_circuit_fraction': float(short_circuited.mean()),
+        'disagreement_rate': float(disagreements.mean()),
+        **prefilter.to_dict()
+    }
+
+    # Per-reading latency of the single-reading path with and without the prefilter
+    sample = X[np.random.default_rng(0).permutation(len(X))[:timing_samples]]
+    for name, active in (('model_only', None), ('cascade', prefilter)):
+        threat_model.prefilter = active
+        start = time.perf_counter()
+        for reading in sample:
+            threat_model.predict(*reading)
+        report[f'{name}_ms_per_reading'] = (time.perf_counter() - start) * 1000 / max(len(sample), 1)
+
+    if report['short_circuit_fraction'] < 0.9:
+        logger.warning(f"Only {report['short_circuit_fraction']:.1%} of validation readings skip the model")
+    if save:
+        output_path = output_path or Config.THREAT_PREFILTER_PATH
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        prefilter.save(output_path)
+
+    return report
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Calibrate the threat model cascade prefilter')
+
+    parser.add_argument('--training_data', '-t', type=str,
+                        help='CSV file of raw readings to calibrate on (default: a fold of the validation data)')
+    parser.add_argument('--validation_data', '-v', type=str,
+                        default=os.path.join(Config.TEST_DATA_DIR, 'validation.csv'),
+                        help='CSV file of raw held-out readings to measure on')
+    parser.add_argument('--model', '-m', type=str, help='Path to the trained threat model')
+    parser.add_argument('--output', '-o', type=str, help='Where to save the prefilter')
+    parser.add_argument('--boxes', type=int, default=4, help='Maximum number of safe boxes')
+    parser.add_argument('--calibration_fraction', type=float, default=0.5,
+                        help='Share of the validation data calibrated on when no training data is given')
+    parser.add_argument('--dry_run', action='store_true', help='Report without saving the prefilter')
+
+    args = parser.parse_args()
+
+    report = calibrate_cascade(args.validation_data, args.training_data, args.model, args.output, args.boxes,
+                               calibration_fraction=args.calibration_fraction, save=not args.dry_run)
+    logger.info("Cascade calibration:\n" + json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Script to compress the threat model forest by tree selection and distillation
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import joblib
+import logging
+
+# Add parent directory to path to import from models and utils
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.threat_model import ThreatModel
+from models.cascade import THREAT_FEATURES
+from models.compression import compress, measure
+from utils.data_processing import load_data
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def compress_threat_model(training_data_path, validation_data_path, model_path=None, output_path=None,
+                          tolerance=0.01, save=True):
+    """
+    Compress the threat model and report its size and speed before and after
+
+    Parameters:
+    - training_data_path: CSV file of raw training readings
+    - validation_data_path: CSV file of raw validation readings
+    - model_path: Path to the trained threat model
+    - output_path: Where to save the compressed model (defaults to threat_model.compressed.joblib next to it)
+    - tolerance: Largest acceptable fraction of validation readings with a different risk level
+    - save: Whether to save the compressed model
+
+    Returns:
+    - Dictionary with the chosen candidate, the measurements of both models and every candidate tried
+    """
+    threat_model = ThreatModel(model_path)
+    X_train = load_data(training_data_path)[THREAT_FEATURES].dropna().to_numpy(dtype=np.float64)
+    X_val = load_data(validation_data_path)[THREAT_FEATURES].dropna().to_numpy(dtype=np.float64)
+    logger.info(f"Compressing with {len(X_train)} training and {len(X_val)} validation readings")
+
+    compressed, candidates = compress(threat_model.model, X_train, X_val, tolerance)
+    report = {
+        'tolerance': tolerance,
+        'original': measure(threat_model.model, X_val),
+        'candidates': candidates
+    }
+    if compressed is None:
+        logger.warning(f"No candidate matches the model within {tolerance:.1%}; keeping the original")
+        return report
+
+    chosen = min((c for c in candidates if c['disagreement'] <= tolerance), key=lambda c: c['nodes'])
+    report['chosen'] = chosen
+    report['compressed'] = measure(compressed, X_val)
+
+    if save:
+        output_path = output_path or os.path.splitext(threat_model.model_path)[0] + '.compressed.joblib'
+        joblib.dump(compressed, output_path)
+        logger.info(f"Compressed threat model saved to {output_path}; recalibrate its cascade prefilter "
+                    f"(scripts/calibrate_cascade.py --model {output_path}) before serving it")
+        report['output'] = output_path
+
+    return report
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Compress the threat model forest')
+
+    parser.add_argument('--training_data', '-t', type=str,
+                        default=os.path.join(Config.TRAINING_DATA_DIR, 'train.csv'),
+                        help='CSV file of raw training readings')
+    parser.add_argument('--validation_data', '-v', type=str,
+                        default=os.path.join(Config.TEST_DATA_DIR, 'validation.csv'),
+                        help='CSV file of raw validation readings')
+    parser.add_argument('--model', '-m', type=str, help='Path to the trained threat model')
+    parser.add_argument('--output', '-o', type=str, help='Where to save the compressed model')
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='Largest fraction of validation readings allowed a different risk level')
+    parser.add_argument('--dry_run', action='store_true', help='Report without saving the compressed model')
+
+    args = parser.parse_args()
+
+    report = compress_threat_model(args.training_data, args.validation_data, args.model, args.output,
+                                   args.tolerance, save=not args.dry_run)
+    logger.info("Threat model compression:\n" + json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
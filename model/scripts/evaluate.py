@@ -79,20 +79,12 @@ def evaluate_model(model_path, test_data_path, output_dir=None):
     logger.info(f"Loading model from {model_path}")
     model = ThreatModel(model_path=model_path)
     
-    # Make predictions
-    predictions = []
-    scores = []
-    
+    # Make predictions in one pass over the forest
     logger.info("Making predictions")
-    for _, row in X_test.iterrows():
-        result = model.predict(
-            row['mq2'], row['mq4'], row['mq6'], row['mq8'], 
-            row['temperature'], row['humidity']
-        )
-        # Convert risk score to binary prediction using threshold
-        prediction = 1 if result['risk_score'] >= config.ZONE_MEDIUM_THRESHOLD else 0
-        predictions.append(prediction)
-        scores.append(result['risk_score'])
+    result = model.predict_batch(X_test[['mq2', 'mq4', 'mq6', 'mq8', 'temperature', 'humidity']].to_numpy())
+    scores = result['risk_score']
+    # Convert risk score to binary prediction using threshold
+    predictions = (scores >= config.ZONE_MEDIUM_THRESHOLD).astype(int)
     
     # Calculate metrics
     logger.info("Calculating evaluation metrics")
@@ -153,6 +145,7 @@ def evaluate_model(model_path, test_data_path, output_dir=None):
         'recall': float(recall),
         'f1_score': float(f1),
         'roc_auc': float(roc_auc) if roc_auc is not None else None,
+        'mean_confidence': float(result['confidence'].mean()),
         'confusion_matrix': cm.tolist(),
         'classification_report': report
     }
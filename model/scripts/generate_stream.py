@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Script to generate large volumes of synthetic sensor time series for load testing
+"""
+
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+import logging
+
+# Add parent directory to path to import from models and utils
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.synthetic_stream import SyntheticSensorStream
+from utils.sensor_store import columns_to_records
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def generate_stream(output_file, n_rows, n_locations=50, chunk_rows=1000000, seed=None, output_format='csv'):
+    """
+    Write synthetic readings to a file chunk by chunk
+
+    Parameters:
+    - output_file: Path of the output file
+    - n_rows: Number of readings to write
+    - n_locations: Number of sensor locations
+    - chunk_rows: Readings generated per chunk
+    - seed: Seed of the generator
+    - output_format: 'csv', or 'binary' for SENSOR_RECORD_DTYPE records as accepted by /sensors/data
+
+    Returns:
+    - Number of readings written
+    """
+    stream = SyntheticSensorStream(n_locations=n_locations, seed=seed)
+    written = 0
+    start = time.perf_counter()
+
+    with open(output_file, 'wb' if output_format == 'binary' else 'w') as f:
+        for chunk in stream.chunks(n_rows, chunk_rows):
+            if output_format == 'binary':
+                f.write(columns_to_records(chunk).tobytes())
+            else:
+                pd.DataFrame(chunk).to_csv(f, header=written == 0, index=False)
+            written += len(chunk['timestamp'])
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Wrote {written} readings to {output_file} in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s)")
+    return written
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Generate synthetic sensor time series for load testing')
+
+    parser.add_argument('--output', '-o', type=str, required=True, help='Output file')
+    parser.add_argument('--rows', '-n', type=int, default=1000000, help='Number of readings')
+    parser.add_argument('--locations', '-l', type=int, default=50, help='Number of sensor locations')
+    parser.add_argument('--chunk_rows', type=int, default=1000000, help='Readings generated per chunk')
+    parser.add_argument('--seed', type=int, help='Random seed')
+    parser.add_argument('--format', '-f', choices=['csv', 'binary'], default='csv', help='Output format')
+
+    args = parser.parse_args()
+
+    generate_stream(args.output, args.rows, args.locations, args.chunk_rows, args.seed, args.format)
+
+if __name__ == '__main__':
+    main()
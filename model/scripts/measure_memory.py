@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Script to measure the memory used by the feature pipeline under float64 and float32
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+import logging
+
+# Add parent directory to path to import from models and utils
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sklearn.ensemble import RandomForestClassifier
+from models.preprocessing import SensorDataPreprocessor, generate_synthetic_data
+from utils.data_processing import apply_dtype_policy
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def _peak(function):
+    """Run a function and return its result with the peak traced allocation in bytes"""
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+def measure(n_samples=1000000, fit_samples=100000, n_estimators=10):
+    """
+    Measure memory of each pipeline stage for both dtypes
+
+    Parameters:
+    - n_samples: Rows of synthetic sensor data
+    - fit_samples: Rows used for the model fit measurement
+    - n_estimators: Trees in the measured forest
+
+    Returns:
+    - DataFrame with bytes per stage (rows) and dtype (columns)
+    """
+    data, labels = generate_synthetic_data(n_samples)
+    results = {}
+
+    for dtype in ('float64', 'float32'):
+        frame = apply_dtype_policy(data.copy(), dtype)
+        stages = {'frame': int(frame.memory_usage(index=False).sum())}
+
+        preprocessor = SensorDataPreprocessor()
+        preprocessor.partial_fit(frame.to_numpy(dtype), columns=frame.columns, clean=False)
+        features, stages['preprocess_peak'] = _peak(
+            lambda: preprocessor.transform_array(frame.to_numpy(dtype, copy=True), chunk_size=65536))
+        stages['features'] = int(features.nbytes)
+
+        X = np.ascontiguousarray(features[:fit_samples])
+        y = labels.to_numpy()[:fit_samples]
+        model = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=1)
+        _, stages['fit_peak'] = _peak(lambda: model.fit(X, y))
+
+        results[dtype] = stages
+
+    report = pd.DataFrame(results)
+    report['saved'] = 1 - report['float32'] / report['float64']
+    return report
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Measure feature pipeline memory for float64 and float32')
+
+    parser.add_argument('--samples', '-n', type=int, default=1000000, help='Rows of synthetic data')
+    parser.add_argument('--fit_samples', type=int, default=100000, help='Rows used for the model fit')
+    parser.add_argument('--trees', type=int, default=10, help='Trees in the measured forest')
+
+    args = parser.parse_args()
+
+    report = measure(args.samples, args.fit_samples, args.trees)
+    logger.info("Memory by stage (bytes):\n" + report.to_string(formatters={'saved': '{:.0%}'.format}))
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,7 @@ import logging
 # Add parent directory to path to import from models and utils
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from models.preprocessing import clean_sensor_data, SensorDataPreprocessor, generate_synthetic_data
+from models.preprocessing import clean_sensor_data, SensorDataPreprocessor, generate_synthetic_data, SENSOR_VALID_RANGES
 from utils.data_processing import load_data, save_data, split_dataset
 from config import Config
 
@@ -141,6 +141,82 @@ def preprocess_data(input_file=None, output_dir=None, generate_synthetic=False,
     
     return train_path, val_path, test_path
 
+def _split_chunks(input_file, chunksize, test_size, val_size, random_state):
+    """
+    Read a CSV in chunks and assign every row to the train, validation or test split
+
+    Yields (columns, features, labels, split) per chunk, where features is a float32
+    array of the sensor columns, labels the threat levels (None if absent) and split an array
+    of 0 (train), 1 (validation) or 2 (test). The assignment is reproducible for a
+    given random_state, so several passes over the file see the same splits.
+    """
+    rng = np.random.default_rng(random_state)
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        columns = [column for column in SENSOR_VALID_RANGES if column in chunk.columns]
+        features = chunk[columns].to_numpy(dtype=np.float32, copy=True)
+        labels = chunk['threat_level'].to_numpy() if 'threat_level' in chunk.columns else None
+
+        u = rng.random(len(chunk))
+        split = np.where(u < test_size, 2, np.where(u < test_size + val_size, 1, 0))
+        yield columns, features, labels, split
+
+def preprocess_data_chunked(input_file, output_dir=None, chunksize=1000000, test_size=0.2, val_size=0.1,
+                            random_state=42):
+    """
+    Preprocess a CSV too large for memory in two streaming passes
+
+    The first pass fits the preprocessor on the training rows chunk by chunk;
+    the second cleans, imputes and scales each chunk in place as float32 and
+    appends it to the output files. Out-of-range readings are imputed with the
+    training mean rather than dropped or filled with a median, and rows are
+    assigned to splits at random instead of by exact proportions.
+
+    Parameters:
+    - input_file: Path to the raw CSV file
+    - output_dir: Directory to save processed data
+    - chunksize: Rows read per chunk
+    - test_size: Proportion of rows for the test set
+    - val_size: Proportion of rows for the validation set
+    - random_state: Seed of the split assignment
+
+    Returns:
+    - Tuple of (training data path, validation data path, test data path)
+    """
+    output_dir = output_dir or Config.DATA_DIR
+    paths = [
+        os.path.join(output_dir, 'training', 'train.csv'),
+        os.path.join(output_dir, 'test', 'validation.csv'),
+        os.path.join(output_dir, 'test', 'test.csv')
+    ]
+    for path in paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Pass 1: fit on training rows only to avoid data leakage
+    preprocessor = SensorDataPreprocessor()
+    for columns, features, _, split in _split_chunks(input_file, chunksize, test_size, val_size, random_state):
+        preprocessor.partial_fit(features[split == 0], columns=columns)
+    logger.info("Preprocessor fitted on training rows")
+
+    # Pass 2: transform in place and append to the split files
+    written = [False, False, False]
+    for columns, features, labels, split in _split_chunks(input_file, chunksize, test_size, val_size, random_state):
+        preprocessor.transform_array(features, clean=True)
+        for index, path in enumerate(paths):
+            rows = split == index
+            if not rows.any():
+                continue
+            frame = pd.DataFrame(features[rows], columns=columns)
+            if labels is not None:
+                frame['threat_level'] = labels[rows]
+            frame.to_csv(path, mode='a' if written[index] else 'w', header=not written[index], index=False)
+            written[index] = True
+
+    for path, done in zip(paths, written):
+        if done:
+            logger.info(f"Processed data saved to {path}")
+
+    return tuple(path if done else None for path, done in zip(paths, written))
+
 def main():
     """Main function for command line usage"""
     parser = argparse.ArgumentParser(description='Preprocess sensor data for model training')
@@ -149,10 +225,14 @@ def main():
     parser.add_argument('--output_dir', '-o', type=str, help='Output directory')
     parser.add_argument('--synthetic', '-s', action='store_true', help='Generate synthetic data')
     parser.add_argument('--samples', '-n', type=int, default=10000, help='Number of synthetic samples')
+    parser.add_argument('--chunksize', '-c', type=int, help='Process the input CSV in chunks of this many rows')
     
     args = parser.parse_args()
     
-    preprocess_data(args.input, args.output_dir, args.synthetic, args.samples)
+    if args.chunksize and args.input and not args.synthetic:
+        preprocess_data_chunked(args.input, args.output_dir, args.chunksize)
+    else:
+        preprocess_data(args.input, args.output_dir, args.synthetic, args.samples)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Script to replay historical sensor readings against the prediction service
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import numpy as np
+import logging
+
+# Add parent directory to path to import from models and utils
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+COMPASS_DEGREES = {
+    'N': 0, 'NNE': 22.5, 'NE': 45, 'ENE': 67.5, 'E': 90, 'ESE': 112.5, 'SE': 135, 'SSE': 157.5,
+    'S': 180, 'SSW': 202.5, 'SW': 225, 'WSW': 247.5, 'W': 270, 'WNW': 292.5, 'NW': 315, 'NNW': 337.5
+}
+
+# Predicted levels that count as detecting an incident
+ALERT_LEVELS = ('high', 'medium')
+
+def _scan_readings(path, chunksize):
+    """
+    Read only the timestamp and location columns of a readings file
+
+    Returns:
+    - (location ids in order of first appearance, whether the timestamps are in order)
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    id_column = 'location_id' if 'location_id' in header else 'sensor_id'
+    ids, in_order, last = {}, True, None
+    for chunk in pd.read_csv(path, usecols=['timestamp', id_column], chunksize=chunksize):
+        ids.update(dict.fromkeys(chunk[id_column].astype(str)))
+        timestamps = _parse_timestamps(chunk['timestamp'])
+        if in_order and len(timestamps):
+            in_order = timestamps.is_monotonic_increasing and (last is None or timestamps.iloc[0] >= last)
+            last = timestamps.iloc[-1]
+    return list(ids), in_order
+
+def _parse_timestamps(timestamps):
+    if pd.api.types.is_numeric_dtype(timestamps):
+        return pd.to_datetime(timestamps, unit='s')
+    return pd.to_datetime(timestamps)
+
+def load_readings(path, locations=None, origin=(28.6139, 77.2090), spacing=0.01, chunksize=100000):
+    """
+    Read readings in timestamp order, one chunk at a time
+
+    Accepts historical_readings.csv (location ids, compass wind directions) as
+    well as generate_stream.py output (sensor ids, coordinates, epoch timestamps).
+    A first pass over the timestamp and location columns lays out the location
+    grid and checks the order; files already in timestamp order are then
+    streamed, while others are loaded whole and sorted.
+
+    Parameters:
+    - path: CSV file of readings
+    - locations: Dictionary mapping location ids to (latitude, longitude); locations
+      without coordinates are otherwise laid out on a grid around origin
+    - origin: Center of the default location grid
+    - spacing: Grid spacing in degrees
+    - chunksize: Readings per chunk
+
+    Returns:
+    - Generator of DataFrames with timestamp (datetime), location, latitude, longitude,
+      sensor_id, gas and weather columns, in timestamp order
+    """
+    ids, in_order = _scan_readings(path, chunksize)
+    side = int(np.ceil(np.sqrt(len(ids))))
+    coordinates = {
+        location: tuple((locations or {}).get(location) or
+                        (origin[0] + (k // side) * spacing, origin[1] + (k % side) * spacing))
+        for k, location in enumerate(ids)
+    }
+    sensor_ids = {i: zlib.crc32(i.encode()) for i in ids}
+
+    if in_order:
+        chunks = pd.read_csv(path, chunksize=chunksize)
+    else:
+        logger.warning(f"{path} is not in timestamp order; loading it whole to sort it")
+        readings = pd.read_csv(path)
+        readings['timestamp'] = _parse_timestamps(readings['timestamp'])
+        readings = readings.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        chunks = (readings.iloc[start:start + chunksize] for start in range(0, len(readings), chunksize))
+
+    for chunk in chunks:
+        data = chunk.copy()
+        data['timestamp'] = _parse_timestamps(data['timestamp'])
+        data['location'] = data['location_id' if 'location_id' in data.columns else 'sensor_id'].astype(str)
+        if 'sensor_id' not in data.columns:
+            data['sensor_id'] = data['location'].map(sensor_ids)
+
+        if 'latitude' not in data.columns or 'longitude' not in data.columns:
+            data['latitude'] = data['location'].map(lambda location: coordinates[location][0])
+            data['longitude'] = data['location'].map(lambda location: coordinates[location][1])
+
+        if 'wind_direction' in data.columns and not pd.api.types.is_numeric_dtype(data['wind_direction']):
+            data['wind_direction'] = data['wind_direction'].str.upper().map(COMPASS_DEGREES)
+
+        yield data
+
+def reading_payload(row, target):
+    """
+    Build the JSON body of one reading
+
+    Parameters:
+    - row: Reading as a dictionary
+    - target: 'predict' or 'sensors'
+
+    Returns:
+    - Dictionary in the format of /predict or /sensors/data
+    """
+    wind_speed = row.get('wind_speed', 5)
+    wind_direction = row.get('wind_direction', 0)
+    if target == 'predict':
+        return {
+            'mq2_reading': float(row['mq2']),
+            'mq4_reading': float(row['mq4']),
+            'mq6_reading': float(row['mq6']),
+            'mq8_reading': float(row['mq8']),
+            'temperature': float(row['temperature']),
+            'humidity': float(row['humidity']),
+            'location': [float(row['latitude']), float(row['longitude'])],
+            'wind_speed': 5.0 if pd.isna(wind_speed) else float(wind_speed),
+            'wind_direction': 0.0 if pd.isna(wind_direction) else float(wind_direction)
+        }
+
+    return {
+        'sensor_id': int(row['sensor_id']),
+        'timestamp': row['timestamp'].timestamp(),
+        'mq2': float(row['mq2']),
+        'mq4': float(row['mq4']),
+        'mq6': float(row['mq6']),
+        'mq8': float(row['mq8']),
+        'temperature': float(row['temperature']),
+        'humidity': float(row['humidity']),
+        'latitude': float(row['latitude']),
+        'longitude': float(row['longitude'])
+    }
+
+class HttpClient:
+    """Sends readings to a running service, one keep-alive session per thread"""
+
+    def __init__(self, base_url, timeout=30):
+        import requests
+        self.requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, body):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+        response = session.post(self.base_url + path, json=body, timeout=self.timeout)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+class InProcessClient:
+    """Sends readings through the Flask app in this process, without a network hop"""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def post(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+def replay(chunks, client, target='predict', speed=0.0, concurrency=8):
+    """
+    Replay readings in timestamp order
+
+    Each reading is scheduled at its offset from the first reading divided by
+    speed (as fast as possible when speed is 0) and sent by a pool of
+    concurrency workers. Latency is measured both from the send (service time)
+    and from the scheduled time (including time spent queued behind busy
+    workers), so an overloaded service shows up in the latter. Readings are
+    consumed chunk by chunk, so only the chunks in flight are held in memory.
+
+    Parameters:
+    - chunks: DataFrame, or iterable of DataFrames, as produced by load_readings
+    - client: HttpClient or InProcessClient
+    - target: 'predict' to post to /predict, 'sensors' to post to /sensors/data
+    - speed: Replay speed relative to real time (0 for as fast as possible)
+    - concurrency: Maximum requests in flight
+
+    Returns:
+    - DataFrame with one row per reading: timestamp, location, status, threat_level,
+      service_latency and scheduled_latency (seconds)
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    path = '/predict' if target == 'predict' else '/sensors/data'
+
+    # Bound the readings waiting for a worker so huge files do not pile up in memory
+    slots = threading.BoundedSemaphore(concurrency * 4)
+
+    def send(rows, results, index, scheduled):
+        try:
+            start = time.perf_counter()
+            try:
+                results['status'][index], body = client.post(path, reading_payload(rows[index], target))
+            except Exception as e:
+                logger.error(f"Error sending reading {index}: {str(e)}")
+                results['status'][index], body = 0, None
+            end = time.perf_counter()
+            results['service_latency'][index] = end - start
+            results['scheduled_latency'][index] = end - scheduled
+            if isinstance(body, dict):
+                results['threat_level'][index] = body.get('threat_level')
+        finally:
+            slots.release()
+
+    chunk_results = []
+    first = None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for data in chunks:
+            n = len(data)
+            if n == 0:
+                continue
+            if first is None:
+                first = data['timestamp'].iloc[0]
+            offsets = (data['timestamp'] - first).dt.total_seconds().to_numpy()
+
+            # Only the records of the chunk being sent are materialized
+            rows = data.to_dict('records')
+            results = {
+                'timestamp': data['timestamp'].to_numpy(),
+                'location': data['location'].to_numpy(),
+                'status': np.zeros(n, dtype=np.int32),
+                'threat_level': np.empty(n, dtype=object),
+                'service_latency': np.full(n, np.nan),
+                'scheduled_latency': np.full(n, np.nan)
+            }
+            chunk_results.append(results)
+
+            for index in range(n):
+                scheduled = started + offsets[index] / speed if speed > 0 else time.perf_counter()
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                slots.acquire()
+                executor.submit(send, rows, results, index, scheduled)
+    elapsed = time.perf_counter() - started
+
+    columns = ['timestamp', 'location', 'status', 'threat_level', 'service_latency', 'scheduled_latency']
+    results = pd.concat([pd.DataFrame(r) for r in chunk_results], ignore_index=True) if chunk_results \
+        else pd.DataFrame(columns=columns)
+    results.attrs['elapsed'] = elapsed
+    return results
+
+def detection_lead_times(results, incidents, lookback_hours=24, grace_hours=1, alert_levels=ALERT_LEVELS):
+    """
+    Measure how long before each reported incident the replay raised an alert
+
+    An incident counts as detected by the first alert at its location between
+    lookback_hours before and grace_hours after its reported time.
+
+    Parameters:
+    - results: DataFrame returned by replay
+    - incidents: DataFrame of incident_reports.csv
+    - lookback_hours: How far before an incident an alert is attributed to it
+    - grace_hours: How far after an incident a late alert still counts
+    - alert_levels: Predicted threat levels that count as an alert
+
+    Returns:
+    - DataFrame with one row per incident: incident_id, location_id, severity,
+      detected_at and lead_minutes (negative when the alert came after the report,
+      NaN when the incident was missed)
+    """
+    alerts = results[results['threat_level'].isin(alert_levels)]
+    rows = []
+    for incident in incidents.itertuples(index=False):
+        reported = pd.Timestamp(incident.timestamp)
+        window = alerts[
+            (alerts['location'] == str(incident.location_id)) &
+            (alerts['timestamp'] >= reported - pd.Timedelta(hours=lookback_hours)) &
+            (alerts['timestamp'] <= reported + pd.Timedelta(hours=grace_hours))
+        ]
+        detected_at = window['timestamp'].min() if len(window) else pd.NaT
+        rows.append({
+            'incident_id': incident.incident_id,
+            'location_id': incident.location_id,
+            'severity': incident.severity,
+            'detected_at': detected_at,
+            'lead_minutes': (reported - detected_at).total_seconds() / 60 if len(window) else np.nan
+        })
+    return pd.DataFrame(rows)
+
+def summarize(results, leads=None):
+    """
+    Summarize a replay
+
+    Parameters:
+    - results: DataFrame returned by replay
+    - leads: DataFrame returned by detection_lead_times
+
+    Returns:
+    - Dictionary with throughput, error counts, latency percentiles (ms) and detection statistics
+    """
+    elapsed = results.attrs.get('elapsed', np.nan)
+    ok = results['status'] == 200
+    summary = {
+        'requests': int(len(results)),
+        'errors': int((~ok).sum()),
+        'elapsed_seconds': round(float(elapsed), 3),
+        'throughput_per_second': round(len(results) / elapsed, 1) if elapsed else None
+    }
+    for column in ('service_latency', 'scheduled_latency'):
+        latency = results[column].dropna().to_numpy() * 1000
+        if len(latency):
+            p50, p90, p99 = np.percentile(latency, [50, 90, 99])
+            summary[column + '_ms'] = {'p50': round(p50, 2), 'p90': round(p90, 2), 'p99': round(p99, 2),
+                                       'max': round(float(latency.max()), 2)}
+
+    if leads is not None and len(leads):
+        detected = leads['lead_minutes'].dropna()
+        summary['incidents'] = int(len(leads))
+        summary['detected'] = int(len(detected))
+        summary['detected_before_report'] = int((detected > 0).sum())
+        if len(detected):
+            summary['lead_minutes'] = {'median': float(detected.median()), 'min': float(detected.min()),
+                                       'max': float(detected.max())}
+    return summary
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Replay historical sensor readings against the service')
+
+    parser.add_argument('--readings', '-r', type=str,
+                        default=os.path.join(Config.HISTORICAL_DATA_DIR, 'historical_readings.csv'),
+                        help='CSV file of readings to replay')
+    parser.add_argument('--incidents', '-i', type=str,
+                        default=os.path.join(Config.HISTORICAL_DATA_DIR, 'incident_reports.csv'),
+                        help='CSV file of incident reports for detection lead times')
+    parser.add_argument('--url', '-u', type=str,
+                        help='Base URL of a running service (replays in process if omitted)')
+    parser.add_argument('--target', '-t', choices=['predict', 'sensors'], default='predict',
+                        help='Endpoint to drive: /predict or /sensors/data')
+    parser.add_argument('--speed', '-s', type=float, default=0.0,
+                        help='Replay speed relative to real time (0 for as fast as possible)')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='Maximum requests in flight')
+    parser.add_argument('--locations', type=str,
+                        help='JSON file mapping location ids to [latitude, longitude]')
+    parser.add_argument('--lookback_hours', type=float, default=24,
+                        help='How far before an incident an alert is attributed to it')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Readings read from the file at a time')
+    parser.add_argument('--output', '-o', type=str, help='Write the summary as JSON to this file')
+
+    args = parser.parse_args()
+
+    locations = None
+    if args.locations:
+        with open(args.locations) as f:
+            locations = json.load(f)
+
+    chunks = load_readings(args.readings, locations, chunksize=args.chunksize)
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    logger.info(f"Replaying {args.readings} to {args.url or 'in-process app'} "
+                f"({'as fast as possible' if args.speed <= 0 else f'{args.speed}x real time'})")
+
+    results = replay(chunks, client, args.target, args.speed, args.concurrency)
+
+    leads = None
+    if args.target == 'predict' and args.incidents and os.path.exists(args.incidents):
+        leads = detection_lead_times(results, pd.read_csv(args.incidents), args.lookback_hours)
+        logger.info("Detection lead times:\n" + leads.to_string(index=False))
+
+    summary = summarize(results, leads)
+    logger.info("Replay summary:\n" + json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -73,7 +73,8 @@ def train_threat_model(training_data_path, model_output_dir=None):
     
     # Create and train the model
     logger.info("Training threat model")
-    threat_model = ThreatModel(model_path=os.path.join(model_output_dir, 'threat_model.joblib'))
+    threat_model = ThreatModel(model_path=os.path.join(model_output_dir, 'threat_model.joblib'),
+                               profile_path=os.path.join(model_output_dir, 'threat_profile.joblib'))
     threat_model.train(X, y)
     
     logger.info(f"Threat model trained and saved to {os.path.join(model_output_dir, 'threat_model.joblib')}")
@@ -109,6 +110,20 @@ def train_explosion_model(training_data_path, model_output_dir=None):
         joblib.dump(explosion_model.model, os.path.join(model_output_dir, 'explosion_model.joblib'))
         logger.info(f"Explosion model saved to {os.path.join(model_output_dir, 'explosion_model.joblib')}")
     
+    # Fit the correction of the physics-based threshold distances on observed explosions
+    explosion_data_path = training_data_path
+    explosion_data = load_data(explosion_data_path)
+    if explosion_data is None or 'distance_to_overpressure_15kPa' not in explosion_data.columns:
+        explosion_data_path = os.path.join(config.TRAINING_DATA_DIR, 'explosion_data.csv')
+        explosion_data = load_data(explosion_data_path) if os.path.exists(explosion_data_path) else None
+    
+    if explosion_data is not None:
+        logger.info(f"Fitting consequence correction on {explosion_data_path}")
+        explosion_model.consequences.fit_correction(explosion_data)
+        explosion_model.consequences.save_correction(os.path.join(model_output_dir, 'explosion_correction.joblib'))
+    else:
+        logger.warning("No explosion data found; threshold distances stay uncorrected")
+    
     return explosion_model
 
 def train_dispersion_model(training_data_path, model_output_dir=None):
@@ -0,0 +1,43 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from models.explosion_model import MergedBoostingRegressor
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def test_merged_boosting_matches_multioutput():
+    rng = np.random.default_rng(0)
+
+    # Gas concentration (fraction) and temperature (°C) with five nonlinear outputs
+    X = np.column_stack([rng.uniform(0, 1, 400), rng.uniform(-10, 900, 400)])
+    y = np.column_stack([
+        X[:, 0] * X[:, 1],
+        np.sqrt(X[:, 0]) * 30,
+        np.sin(X[:, 1] / 100),
+        np.where(X[:, 0] > 0.5, X[:, 1], -X[:, 1]),
+        rng.normal(0, 1, 400)
+    ])
+
+    settings = [
+        {},
+        {'init': 'zero', 'max_depth': 5},
+        {'n_estimators': 30, 'max_depth': 2, 'subsample': 0.7, 'learning_rate': 0.3}
+    ]
+    for params in settings:
+        model = MultiOutputRegressor(GradientBoostingRegressor(random_state=42, **params)).fit(X, y)
+        merged = MergedBoostingRegressor(model, max_rows=64)
+
+        # Single rows and small batches take the merged traversal, larger ones the wrapped model;
+        # new readings include values outside the training range
+        readings = np.column_stack([rng.uniform(-0.2, 1.2, 200), rng.uniform(-50, 1000, 200)])
+        for batch in (readings[:1], readings[:17], readings[:64], readings):
+            assert np.allclose(merged.predict(batch), model.predict(batch), rtol=1e-9, atol=1e-9), \
+                f"Merged predictions differ for {params} on {len(batch)} rows"
+
+    print("Merged boosting predictions match MultiOutputRegressor.predict")
+
+if __name__ == "__main__":
+    test_merged_boosting_matches_multioutput()
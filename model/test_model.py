@@ -1,4 +1,7 @@
 from models.threat_model import ThreatModel
+from models.cascade import THREAT_FEATURES
+from config import Config
+import numpy as np
 import logging
 
 # Set up logging
@@ -65,5 +68,34 @@ def test_model():
         for sensor, status in result['sensor_status'].items():
             print(f"- {sensor}: {status}")
 
+def test_predict_matches_predict_batch():
+    model = ThreatModel()
+    model.prefilter = None  # compare the forest itself
+    rng = np.random.default_rng(0)
+
+    # Readings just past split thresholds, where rounding to the attribution cache's
+    # quantum would cross the split, plus ordinary readings
+    internal = np.flatnonzero(model.flat.left >= 0)
+    readings = []
+    for node in rng.choice(internal, size=min(50, len(internal)), replace=False):
+        reading = rng.normal(0, 0.5, len(THREAT_FEATURES))
+        reading[model.flat.feature[node]] = model.flat.threshold[node] + Config.ATTRIBUTION_QUANTUM * 0.3
+        readings.append(reading)
+    readings = np.vstack(readings + [rng.normal(0, 1, (20, len(THREAT_FEATURES)))]).astype(np.float32)
+
+    batch = model.predict_batch(readings, attributions=True)
+    for i, reading in enumerate(readings):
+        # Warm the cache with the rounded reading first, then score the exact one
+        model.predict(*np.round(reading / Config.ATTRIBUTION_QUANTUM) * Config.ATTRIBUTION_QUANTUM)
+        result = model.predict(*reading)
+        assert result['risk_score'] == batch['risk_score'][i], f"Risk scores differ for reading {i}"
+        assert result['risk_level'] == batch['risk_level'][i], f"Risk levels differ for reading {i}"
+        assert result['confidence'] == batch['confidence'][i], f"Confidences differ for reading {i}"
+        if result['attributions'] is not None:
+            assert np.allclose([result['attributions'][f] for f in THREAT_FEATURES], batch['attributions'][i])
+
+    print("predict and predict_batch agree on every reading")
+
 if __name__ == "__main__":
-    test_model() 
\ No newline at end of file
+    test_model()
+    test_predict_matches_predict_batch() 
\ No newline at end of file
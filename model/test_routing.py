@@ -0,0 +1,64 @@
+import numpy as np
+from shapely.geometry import Point
+from utils.routing import SiteGraph, EvacuationRouter
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def grid_graph(size=40, spacing=0.0001, seed=0):
+    """Jittered grid of paths with exits along the western edge"""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    lats = 28.6 + rows * spacing + rng.uniform(-0.3, 0.3, size * size) * spacing
+    lons = 77.2 + cols * spacing + rng.uniform(-0.3, 0.3, size * size) * spacing
+
+    index = np.arange(size * size).reshape(size, size)
+    edges_from = np.concatenate([index[:, :-1].ravel(), index[:-1, :].ravel()])
+    edges_to = np.concatenate([index[:, 1:].ravel(), index[1:, :].ravel()])
+    return SiteGraph(lats, lons, edges_from, edges_to, exits=index[:, 0])
+
+def test_incremental_repair_matches_full_solve():
+    graph = grid_graph()
+    router = EvacuationRouter(graph)
+    rng = np.random.default_rng(1)
+
+    # Hazard grows step by step: each step adds a zone or raises an existing one
+    zones = []
+    hazard = router.edge_hazard(zones)
+    solution = router.solve(hazard)
+    for step in range(20):
+        if zones and rng.random() < 0.3:
+            i = int(rng.integers(len(zones)))
+            level, polygon = zones[i]
+            zones[i] = ({'low': 'medium', 'medium': 'high'}.get(level, 'high'), polygon)
+        else:
+            node = int(rng.integers(graph.node_count))
+            radius = rng.uniform(0.0002, 0.0006)
+            zones.append((str(rng.choice(['low', 'medium', 'high'])),
+                          Point(graph.node_lons[node], graph.node_lats[node]).buffer(radius)))
+
+        new_hazard = router.edge_hazard(zones)
+        weights = router.edge_weights(new_hazard)
+        repaired = router._update(hazard, solution, new_hazard, weights)
+        full_distances, _ = router._full_solve(weights)
+
+        if repaired is not None:
+            distances, next_hops = repaired
+            assert np.allclose(distances, full_distances), f"Repaired distances differ at step {step}"
+
+            # Every next hop must lie on a shortest path under the new weights
+            hop = next_hops[graph.rows] == graph.indices
+            assert np.allclose(distances[graph.rows[hop]],
+                               weights[hop] + distances[graph.indices[hop]]), f"Stale next hop at step {step}"
+
+        # The cached entry point must agree as well
+        solution = router.solve(new_hazard)
+        assert np.allclose(solution[0], full_distances)
+        hazard = new_hazard
+
+    print("Incremental route repair matches a full Dijkstra recompute")
+
+if __name__ == "__main__":
+    test_incremental_repair_matches_full_solve()
@@ -0,0 +1,82 @@
+import numpy as np
+from utils.sensor_index import SensorGridIndex
+from utils.geo_utils import haversine_distances
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def check_nearby(index, sensors, latitude, longitude, radii):
+    """Compare radius queries with a brute-force haversine filter over every registered sensor"""
+    ids = np.array(list(sensors), dtype=object)
+    coords = np.array([sensors[sensor_id] for sensor_id in ids]).reshape(-1, 2)
+    distances = haversine_distances(latitude, longitude, coords[:, 0], coords[:, 1])
+
+    for radius in radii:
+        found = index.nearby(latitude, longitude, radius)
+        within = distances <= radius
+        assert sorted(s['sensor_id'] for s in found) == sorted(ids[within]), \
+            f"Sensors within {radius} m of ({latitude}, {longitude}) differ"
+        expected = dict(zip(ids[within], distances[within]))
+        for s in found:
+            assert (s['latitude'], s['longitude']) == sensors[s['sensor_id']], \
+                f"Stale coordinates for {s['sensor_id']}"
+        assert np.allclose([s['distance'] for s in found], [expected[s['sensor_id']] for s in found])
+        assert all(a['distance'] <= b['distance'] for a, b in zip(found, found[1:])), "Not sorted by distance"
+
+def test_nearby_matches_brute_force():
+    index = SensorGridIndex()
+    rng = np.random.default_rng(0)
+    sensors = {}
+
+    def site_coordinates(count):
+        # Clustered around a site, where sensors share cells at the finer levels
+        return 28.6 + rng.normal(0, 0.02, count), 77.2 + rng.normal(0, 0.02, count)
+
+    # Registered in batches and one by one
+    for batch in range(4):
+        ids = [f"s{batch}-{i}" for i in range(500)]
+        lats, lons = site_coordinates(len(ids))
+        index.register_many(ids, lats, lons)
+        sensors.update(zip(ids, zip(lats.tolist(), lons.tolist())))
+    for i in range(200):
+        lat, lon = float(rng.uniform(-80, 80)), float(rng.uniform(-180, 180))
+        index.register(f"far-{i}", lat, lon)
+        sensors[f"far-{i}"] = (lat, lon)
+
+    queries = [(28.6, 77.2)] + [sensors[sensor_id] for sensor_id in rng.choice(list(sensors), 5)]
+    for step in range(10):
+        ids = list(sensors)
+
+        # Small moves mostly stay in their finest cell, large ones cross cells at every level
+        for sensor_id in rng.choice(ids, 100, replace=False):
+            lat, lon = sensors[sensor_id]
+            if rng.random() < 0.5:
+                lat, lon = lat + float(rng.normal(0, 1e-5)), lon + float(rng.normal(0, 1e-5))
+            else:
+                lat, lon = float(rng.uniform(28.5, 28.7)), float(rng.uniform(77.1, 77.3))
+            index.register(sensor_id, lat, lon)
+            sensors[sensor_id] = (lat, lon)
+
+        # Removals fill the hole with the last row; removing the last row itself too
+        for sensor_id in rng.choice(ids, 50, replace=False).tolist() + [index._ids[len(index) - 1]]:
+            if sensor_id in sensors:
+                assert index.remove(sensor_id)
+                del sensors[sensor_id]
+        assert not index.remove('unknown')
+
+        # Removed ids come back as new sensors
+        ids = [f"s{step}-{i}" for i in range(20)] + [f"new{step}-{i}" for i in range(20)]
+        lats, lons = site_coordinates(len(ids))
+        index.register_many(ids, lats, lons)
+        sensors.update(zip(ids, zip(lats.tolist(), lons.tolist())))
+
+        assert len(index) == len(sensors)
+        for latitude, longitude in queries:
+            check_nearby(index, sensors, latitude, longitude, (20, 50, 500, 5000, 1e6, 3e7))
+
+    print("SensorGridIndex.nearby matches a brute-force haversine filter")
+
+if __name__ == "__main__":
+    test_nearby_matches_brute_force()
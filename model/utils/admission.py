@@ -0,0 +1,95 @@
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class AdmissionController:
+    """
+    Bounded concurrency with a queueing deadline.
+
+    At most max_concurrent requests do full work at once. Others wait for a
+    slot, but no longer than queue_timeout and only while fewer than
+    max_waiting requests are already waiting; past either bound the request
+    is shed so the caller can answer with a cheaper degraded response
+    instead of letting it time out upstream.
+    """
+
+    def __init__(self, max_concurrent=None, queue_timeout=None, max_waiting=None):
+        """
+        Initialize the controller
+
+        Parameters:
+        - max_concurrent: Requests allowed to do full work at the same time
+        - queue_timeout: Seconds a request may wait for a slot
+        - max_waiting: Requests allowed to wait for a slot at the same time
+        """
+        self.max_concurrent = max_concurrent or Config.ADMISSION_MAX_CONCURRENT
+        self.queue_timeout = queue_timeout if queue_timeout is not None else Config.ADMISSION_QUEUE_TIMEOUT
+        self.max_waiting = max_waiting if max_waiting is not None else Config.ADMISSION_MAX_WAITING
+
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._shed = 0
+
+    @contextmanager
+    def admit(self):
+        """
+        Try to get a slot for the duration of a request
+
+        Yields:
+        - True if the request was admitted, False if it should be shed
+        """
+        with self._lock:
+            full_queue = self._waiting >= self.max_waiting
+            if not full_queue:
+                self._waiting += 1
+
+        admitted = False
+        if not full_queue:
+            start = time.time()
+            try:
+                admitted = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+        with self._lock:
+            if admitted:
+                self._active += 1
+                self._admitted += 1
+            else:
+                self._shed += 1
+
+        if not admitted:
+            reason = "queue full" if full_queue else f"no slot within {time.time() - start:.2f}s"
+            logger.warning(f"Shedding request: {reason}")
+
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                with self._lock:
+                    self._active -= 1
+                self._slots.release()
+
+    def stats(self):
+        """
+        Report current load and counters
+
+        Returns:
+        - Dictionary with active, waiting, admitted and shed request counts
+        """
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self._active,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "shed": self._shed
+            }
@@ -8,30 +8,64 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
-def load_data(file_path):
+# Feature order of ThreatModel inputs
+THREAT_FEATURES = ['mq2', 'mq4', 'mq6', 'mq8', 'temperature', 'humidity']
+
+# Model input columns, the only ones stored in the feature dtype; targets,
+# coordinates and timestamps stay float64, where float32 would lose precision
+EXPLOSION_FEATURES = ['gas_concentration', 'temperature']
+FEATURE_COLUMNS = list(dict.fromkeys(THREAT_FEATURES + EXPLOSION_FEATURES))
+
+def apply_dtype_policy(data, dtype=None, columns=None):
+    """
+    Store the floating point feature columns of a DataFrame in the feature dtype
+    
+    Parameters:
+    - data: DataFrame to convert in place
+    - dtype: Floating point type (defaults to Config.FEATURE_DTYPE)
+    - columns: Columns eligible for conversion (defaults to FEATURE_COLUMNS)
+    
+    Returns:
+    - The same DataFrame
+    """
+    dtype = np.dtype(dtype or Config.FEATURE_DTYPE)
+    columns = FEATURE_COLUMNS if columns is None else columns
+    columns = [column for column in columns
+               if column in data.columns and pd.api.types.is_float_dtype(data[column])
+               and data[column].dtype != dtype]
+    if columns:
+        data[columns] = data[columns].astype(dtype)
+    return data
+
+def load_data(file_path, dtype=None):
     """
     Load data from various file formats
     
     Parameters:
     - file_path: Path to the data file
+    - dtype: Floating point type of the feature columns (defaults to Config.FEATURE_DTYPE)
     
     Returns:
     - DataFrame with loaded data
     """
     _, ext = os.path.splitext(file_path)
+    dtype = np.dtype(dtype or Config.FEATURE_DTYPE)
     
     try:
         if ext.lower() == '.csv':
-            return pd.read_csv(file_path)
+            # Parse feature columns straight into the feature dtype
+            header = pd.read_csv(file_path, nrows=0).columns
+            data = pd.read_csv(file_path, dtype={column: dtype for column in FEATURE_COLUMNS if column in header})
         elif ext.lower() == '.json':
-            return pd.read_json(file_path)
+            data = pd.read_json(file_path)
         elif ext.lower() == '.xlsx' or ext.lower() == '.xls':
-            return pd.read_excel(file_path)
+            data = pd.read_excel(file_path)
         elif ext.lower() == '.parquet':
-            return pd.read_parquet(file_path)
+            data = pd.read_parquet(file_path)
         else:
             logger.error(f"Unsupported file format: {ext}")
             return None
+        return apply_dtype_policy(data, dtype)
     except Exception as e:
         logger.error(f"Error loading data from {file_path}: {str(e)}")
         return None
@@ -155,18 +189,21 @@ def parse_arduino_data(serial_data):
         logger.error(f"Error parsing Arduino data: {str(e)}")
         return {}
 
-def generate_synthetic_arduino_data(n_samples=100, include_anomalies=True):
+def generate_synthetic_arduino_data(n_samples=100, include_anomalies=True, seed=None):
     """
     Generate synthetic Arduino sensor data for testing
     
+    For large volumes or time series use utils.synthetic_stream.SyntheticSensorStream.
+    
     Parameters:
     - n_samples: Number of samples to generate
     - include_anomalies: Whether to include anomalous readings
+    - seed: Seed of the random generator
     
     Returns:
     - List of dictionaries with synthetic sensor readings
     """
-    data = []
+    rng = np.random.default_rng(seed)
     
     # Base parameters for normal conditions
     normal_params = {
@@ -180,33 +217,19 @@ def generate_synthetic_arduino_data(n_samples=100, include_anomalies=True):
         'longitude': {'mean': 77.2090, 'std': 0.01}
     }
     
-    # Generate normal samples
-    for i in range(n_samples):
-        sample = {}
-        
-        # Decide if this sample should be anomalous
-        is_anomalous = include_anomalies and (np.random.random() < 0.1)
-        
-        for key, params in normal_params.items():
-            # Generate value based on normal distribution
-            value = np.random.normal(params['mean'], params['std'])
-            
-            # If anomalous, increase gas readings
-            if is_anomalous and key in ['mq2', 'mq4', 'mq6', 'mq8']:
-                value *= 3 + np.random.random()  # 3-4x higher
-            
-            # If anomalous, increase temperature
-            if is_anomalous and key == 'temperature':
-                value += 20 + 10 * np.random.random()  # 20-30 degrees higher
-            
-            sample[key] = float(value)
-            
-        # Add timestamp
-        sample['timestamp'] = pd.Timestamp.now() - pd.Timedelta(seconds=(n_samples-i)*5)
-        
-        data.append(sample)
+    columns = {key: rng.normal(params['mean'], params['std'], n_samples)
+               for key, params in normal_params.items()}
     
-    return data
+    # Anomalous samples: gas readings 3-4x higher, temperature 20-30 degrees higher
+    is_anomalous = rng.random(n_samples) < 0.1 if include_anomalies else np.zeros(n_samples, dtype=bool)
+    for key in ['mq2', 'mq4', 'mq6', 'mq8']:
+        columns[key][is_anomalous] *= 3 + rng.random(is_anomalous.sum())
+    columns['temperature'][is_anomalous] += 20 + 10 * rng.random(is_anomalous.sum())
+    
+    # One reading every 5 seconds up to now
+    columns['timestamp'] = pd.Timestamp.now() - pd.to_timedelta((n_samples - np.arange(n_samples)) * 5, unit='s')
+    
+    return pd.DataFrame(columns).to_dict('records')
 
 def sample_to_arduino_format(sample):
     """
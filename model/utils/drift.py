@@ -0,0 +1,208 @@
+import threading
+import numpy as np
+import joblib
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Readings of sensors not assigned to a site are monitored together under this key
+UNASSIGNED_SITE = 'unassigned'
+
+class TrainingProfile:
+    """
+    Distribution of each feature in the data a model was trained on.
+
+    Every feature is cut into bins at its training quantiles, so each bin
+    held an equal share of the training readings; the first and last bins
+    are open-ended and also catch values outside the training range. The
+    share of training readings per bin is kept as the reference.
+    """
+
+    def __init__(self, features, edges, reference):
+        """
+        Initialize the profile
+
+        Parameters:
+        - features: Feature names
+        - edges: Inner bin edges, shape (n_features, n_bins - 1)
+        - reference: Share of training readings per bin, shape (n_features, n_bins)
+        """
+        self.features = list(features)
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.reference = np.asarray(reference, dtype=np.float64)
+
+    @property
+    def n_bins(self):
+        return self.reference.shape[1]
+
+    def bin(self, X):
+        """
+        Bin index of every value
+
+        Parameters:
+        - X: Readings of shape (n_samples, n_features)
+
+        Returns:
+        - Integer array of the same shape (-1 for missing values)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        bins = np.empty(X.shape, dtype=np.int64)
+        for i, edges in enumerate(self.edges):
+            bins[:, i] = np.searchsorted(edges, X[:, i], side='right')
+        bins[np.isnan(X)] = -1
+        return bins
+
+    @classmethod
+    def from_data(cls, X, features, n_bins=None):
+        """
+        Profile training readings
+
+        Parameters:
+        - X: Training readings of shape (n_samples, n_features)
+        - features: Feature names
+        - n_bins: Bins per feature (defaults to Config.DRIFT_BINS)
+
+        Returns:
+        - TrainingProfile
+        """
+        n_bins = n_bins or Config.DRIFT_BINS
+        X = np.asarray(X, dtype=np.float64)
+        edges = np.nanquantile(X, np.linspace(0, 1, n_bins + 1)[1:-1], axis=0).T
+        profile = cls(features, edges, np.zeros((X.shape[1], n_bins)))
+        profile.reference = _shares(_histogram(profile.bin(X), n_bins))
+        return profile
+
+    def save(self, path):
+        joblib.dump({'features': self.features, 'edges': self.edges, 'reference': self.reference}, path)
+        logger.info(f"Training profile saved to {path}")
+
+    @classmethod
+    def load(cls, path):
+        state = joblib.load(path)
+        return cls(state['features'], state['edges'], state['reference'])
+
+def _histogram(bins, n_bins):
+    """Counts per feature and bin of binned readings, shape (n_features, n_bins)"""
+    n_features = bins.shape[1]
+    valid = bins >= 0
+    index = (np.arange(n_features) * n_bins)[None, :] + bins
+    return np.bincount(index[valid], minlength=n_features * n_bins).reshape(n_features, n_bins).astype(np.float64)
+
+def _shares(counts, floor=1e-4):
+    """Share of each bin per feature, floored so empty bins keep the PSI finite"""
+    shares = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    shares = np.maximum(shares, floor)
+    return shares / shares.sum(axis=1, keepdims=True)
+
+def population_stability_index(reference, live):
+    """PSI per feature between two binned distributions of shape (n_features, n_bins)"""
+    return ((live - reference) * np.log(live / reference)).sum(axis=1)
+
+class DriftMonitor:
+    """
+    Compares live sensor readings with a model's training profile, per site.
+
+    Each site keeps one histogram per feature over the profile's bins, so
+    memory is fixed per site and feature and a reading costs one binary
+    search over the bin edges per feature. Once a site's histogram holds
+    more than the window of readings, its counts are halved; older readings
+    thus fade out and the histogram follows the recent distribution. Drift
+    is scored with the population stability index against the training
+    shares.
+    """
+
+    def __init__(self, profile=None, window=None):
+        """
+        Initialize the monitor
+
+        Parameters:
+        - profile: TrainingProfile to compare with (monitoring is off without one)
+        - window: Readings per site after which older readings are down-weighted
+        """
+        self.window = window or Config.DRIFT_WINDOW
+        self._lock = threading.Lock()
+        self._sensor_sites = {}
+        self.set_profile(profile)
+
+    def set_profile(self, profile):
+        """Compare with another training profile, starting the histograms over"""
+        with self._lock:
+            self.profile = profile
+            self._counts = {}   # site -> (n_features, n_bins) counts
+
+    def assign(self, sensor_ids, site_id):
+        """
+        Attribute the readings of sensors to a site
+
+        Parameters:
+        - sensor_ids: Sensor ids
+        - site_id: Site key
+        """
+        with self._lock:
+            for sensor_id in sensor_ids:
+                self._sensor_sites[int(sensor_id)] = str(site_id)
+
+    def update(self, sensor_ids, X):
+        """
+        Add live readings to the histograms of their sites
+
+        Parameters:
+        - sensor_ids: Sensor id of every reading (integers)
+        - X: Readings of shape (n_samples, n_features) in the profile's feature order
+        """
+        profile = self.profile
+        if profile is None or len(X) == 0:
+            return
+        bins = profile.bin(X)
+
+        sensor_ids = np.asarray(sensor_ids, dtype=np.int64)
+        unique_ids, sensor_index = np.unique(sensor_ids, return_inverse=True)
+        with self._lock:
+            if profile is not self.profile:
+                return  # the profile changed while binning
+            sites = np.array([self._sensor_sites.get(int(s), UNASSIGNED_SITE) for s in unique_ids])[sensor_index]
+            for site in np.unique(sites).tolist():
+                counts = self._counts.get(site)
+                if counts is None:
+                    counts = self._counts[site] = np.zeros_like(profile.reference)
+                counts += _histogram(bins[sites == site], profile.n_bins)
+                while counts.sum(axis=1).max() > self.window:
+                    counts *= 0.5
+
+    def scores(self):
+        """
+        Drift of every monitored site
+
+        Returns:
+        - Dictionary per site with the readings currently weighted, the PSI per feature,
+          the largest PSI and a status: insufficient_data (fewer than Config.DRIFT_MIN_READINGS
+          readings), stable, warning (above Config.DRIFT_PSI_WARNING) or drifted (above
+          Config.DRIFT_PSI_ALERT)
+        """
+        with self._lock:
+            profile = self.profile
+            counts = {site: c.copy() for site, c in self._counts.items()}
+        if profile is None:
+            return {}
+
+        result = {}
+        for site, site_counts in sorted(counts.items()):
+            psi = population_stability_index(profile.reference, _shares(site_counts))
+            readings = float(site_counts.sum(axis=1).max())
+            worst = float(psi.max())
+            if readings < Config.DRIFT_MIN_READINGS:
+                status = 'insufficient_data'
+            elif worst > Config.DRIFT_PSI_ALERT:
+                status = 'drifted'
+            elif worst > Config.DRIFT_PSI_WARNING:
+                status = 'warning'
+            else:
+                status = 'stable'
+            result[site] = {
+                'readings': readings,
+                'psi': {feature: float(value) for feature, value in zip(profile.features, psi)},
+                'max_psi': worst,
+                'status': status
+            }
+        return result
@@ -8,6 +8,33 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Mean radius of the earth in meters
+EARTH_RADIUS = 6371000
+
+# Explosion model thresholds bounding the high/medium/low blast and thermal zones
+BLAST_ZONE_THRESHOLDS = ('15kPa', '7kPa', '3kPa')
+THERMAL_ZONE_THRESHOLDS = ('10kW/m²', '5kW/m²', '2kW/m²')
+
+# Radii in meters of the high/medium/low zones when the explosion model gives none
+DEFAULT_ZONE_RADII = (100.0, 200.0, 300.0)
+
+def zone_radii(explosion_params, key, thresholds):
+    """
+    Read the high/medium/low zone radii from explosion parameters
+
+    Parameters:
+    - explosion_params: Dictionary with explosion model outputs
+    - key: 'distance_to_overpressure' or 'distance_to_radiation'
+    - thresholds: Threshold names of the high, medium and low zones
+
+    Returns:
+    - Tuple of three radii in meters, DEFAULT_ZONE_RADII where a distance is missing
+    """
+    distances = (explosion_params or {}).get(key)
+    if not isinstance(distances, dict):
+        return DEFAULT_ZONE_RADII
+    return tuple(float(distances.get(t, d)) for t, d in zip(thresholds, DEFAULT_ZONE_RADII))
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
     Calculate the great circle distance between two points 
@@ -20,17 +47,101 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     Returns:
     - Distance in meters
     """
-    # Convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
+    return float(haversine_distances(lat1, lon1, lat2, lon2))
+
+def haversine_distances(lat1, lon1, lat2, lon2):
+    """
+    Vectorized great circle distance between arrays of points
+
+    Parameters:
+    - lat1, lon1: Coordinates of the first points (scalars or arrays)
+    - lat2, lon2: Coordinates of the second points (scalars or arrays)
+
+    Returns:
+    - Array of distances in meters, broadcast over the inputs
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+
     dlon = lon2 - lon1
     dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371000  # Radius of earth in meters
-    
-    return c * r
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    return c * EARTH_RADIUS
+
+def haversine_distance_matrix(lats1, lons1, lats2=None, lons2=None):
+    """
+    Distances between every point of one set and every point of another
+
+    Parameters:
+    - lats1, lons1: Coordinates of the first set (n points)
+    - lats2, lons2: Coordinates of the second set (m points), defaults to the first set
+
+    Returns:
+    - (n, m) array of distances in meters
+    """
+    lats1 = np.asarray(lats1, dtype=float).ravel()
+    lons1 = np.asarray(lons1, dtype=float).ravel()
+    if lats2 is None or lons2 is None:
+        lats2, lons2 = lats1, lons1
+    lats2 = np.asarray(lats2, dtype=float).ravel()
+    lons2 = np.asarray(lons2, dtype=float).ravel()
+
+    return haversine_distances(lats1[:, None], lons1[:, None], lats2[None, :], lons2[None, :])
+
+def iter_pairwise_distances(lats, lons, chunk_size=1024):
+    """
+    Compute all-pairs distances in row blocks to bound memory
+
+    Only chunk_size x n distances are held at a time, so fleets too large for
+    a full distance matrix can still be processed.
+
+    Parameters:
+    - lats, lons: Coordinates of the points (n points)
+    - chunk_size: Number of rows per block
+
+    Yields:
+    - (start, block) where block is the (rows, n) distance array for rows start..start+rows
+    """
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+
+    # Convert once rather than in every block
+    lat_rad = np.radians(lats)
+    lon_rad = np.radians(lons)
+    cos_lat = np.cos(lat_rad)
+
+    for start in range(0, len(lats), chunk_size):
+        stop = min(start + chunk_size, len(lats))
+        dlat = lat_rad[None, :] - lat_rad[start:stop, None]
+        dlon = lon_rad[None, :] - lon_rad[start:stop, None]
+        a = np.sin(dlat / 2) ** 2 + cos_lat[start:stop, None] * cos_lat[None, :] * np.sin(dlon / 2) ** 2
+        yield start, 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * EARTH_RADIUS
+
+def pairs_within_distance(lats, lons, max_distance, chunk_size=1024):
+    """
+    Find all pairs of points closer than a distance
+
+    Parameters:
+    - lats, lons: Coordinates of the points
+    - max_distance: Distance threshold in meters
+    - chunk_size: Number of rows per block (bounds memory to chunk_size x n)
+
+    Returns:
+    - (i, j, distance) arrays for every pair with i < j
+    """
+    rows, cols, dists = [], [], []
+    for start, block in iter_pairwise_distances(lats, lons, chunk_size):
+        i, j = np.nonzero(block <= max_distance)
+        i += start
+        keep = i < j
+        rows.append(i[keep])
+        cols.append(j[keep])
+        dists.append(block[i[keep] - start, j[keep]])
+
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=float)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(dists)
 
 def get_point_at_distance(lat, lon, bearing, distance):
     """
@@ -44,26 +155,49 @@ def get_point_at_distance(lat, lon, bearing, distance):
     Returns:
     - (lat, lon) of destination point
     """
-    # Convert to radians
-    lat1 = math.radians(lat)
-    lon1 = math.radians(lon)
-    bearing = math.radians(bearing)
-    
-    # Earth's radius in meters
-    R = 6371000
-    
-    # Calculate new coordinates
-    lat2 = math.asin(math.sin(lat1) * math.cos(distance/R) + 
-                     math.cos(lat1) * math.sin(distance/R) * math.cos(bearing))
-    
-    lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(distance/R) * math.cos(lat1),
-                             math.cos(distance/R) - math.sin(lat1) * math.sin(lat2))
-    
-    # Convert back to degrees
-    lat2 = math.degrees(lat2)
-    lon2 = math.degrees(lon2)
-    
-    return lat2, lon2
+    lat2, lon2 = destination_points(lat, lon, bearing, distance)
+    return float(lat2), float(lon2)
+
+def destination_points(lat, lon, bearing, distance):
+    """
+    Vectorized destination points at given distances and bearings
+
+    Parameters:
+    - lat, lon: Starting coordinates in decimal degrees (scalars or arrays)
+    - bearing: Bearings in degrees (0 = north, 90 = east, etc.)
+    - distance: Distances in meters
+
+    Returns:
+    - (lats, lons) arrays of destination points, broadcast over the inputs
+    """
+    lat1 = np.radians(np.asarray(lat, dtype=float))
+    lon1 = np.radians(np.asarray(lon, dtype=float))
+    bearing = np.radians(np.asarray(bearing, dtype=float))
+    angular = np.asarray(distance, dtype=float) / EARTH_RADIUS
+
+    sin_lat1 = np.sin(lat1)
+    cos_lat1 = np.cos(lat1)
+    cos_ang = np.cos(angular)
+    sin_ang = np.sin(angular)
+
+    lat2 = np.arcsin(sin_lat1 * cos_ang + cos_lat1 * sin_ang * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(np.sin(bearing) * sin_ang * cos_lat1,
+                             cos_ang - sin_lat1 * np.sin(lat2))
+
+    return np.degrees(lat2), np.degrees(lon2)
+
+def incident_key(latitude, longitude, precision=4):
+    """
+    Build a stable key identifying an incident by its source location
+
+    Parameters:
+    - latitude, longitude: Source coordinates
+    - precision: Number of decimal places kept (4 places is roughly 11 m)
+
+    Returns:
+    - String key such as "28.6139,77.2090"
+    """
+    return f"{float(latitude):.{precision}f},{float(longitude):.{precision}f}"
 
 def calculate_threat_zone(latitude, longitude, explosion_params, dispersion_params, wind_speed, wind_direction):
     """
@@ -82,17 +216,11 @@ def calculate_threat_zone(latitude, longitude, explosion_params, dispersion_para
     try:
         # Extract key parameters
         energy_release = explosion_params.get('energy_release', 100)  # MJ
-        blast_radii = {
-            'high': explosion_params['distance_to_overpressure'].get('15kPa', 100),
-            'medium': explosion_params['distance_to_overpressure'].get('7kPa', 200),
-            'low': explosion_params['distance_to_overpressure'].get('3kPa', 300)
-        }
-        
-        thermal_radii = {
-            'high': explosion_params['distance_to_radiation'].get('10kW/m²', 100),
-            'medium': explosion_params['distance_to_radiation'].get('5kW/m²', 200),
-            'low': explosion_params['distance_to_radiation'].get('2kW/m²', 300)
-        }
+        levels = ('high', 'medium', 'low')
+        blast_radii = dict(zip(levels, zone_radii(explosion_params, 'distance_to_overpressure',
+                                                  BLAST_ZONE_THRESHOLDS)))
+        thermal_radii = dict(zip(levels, zone_radii(explosion_params, 'distance_to_radiation',
+                                                    THERMAL_ZONE_THRESHOLDS)))
         
         plume_length = dispersion_params.get('plume_length', 500)
         plume_width = dispersion_params.get('plume_width', 200)
@@ -158,16 +286,11 @@ def _create_circle_polygon(center_lat, center_lon, radius, num_points=36):
     Returns:
     - Shapely Polygon object
     """
-    coords = []
-    for i in range(num_points):
-        angle = math.radians(i * (360 / num_points))
-        lat, lon = get_point_at_distance(center_lat, center_lon, angle, radius)
-        coords.append((lon, lat))  # Note: GeoJSON is (lon, lat)
-    
-    # Close the polygon
-    coords.append(coords[0])
-    
-    return Polygon(coords)
+    bearings = np.arange(num_points) * (360 / num_points)
+    lats, lons = destination_points(center_lat, center_lon, bearings, radius)
+
+    # GeoJSON order is (lon, lat); Polygon closes the ring
+    return Polygon(np.column_stack([lons, lats]))
 
 def _create_ellipse_polygon(center_lat, center_lon, major_axis, minor_axis, rotation, num_points=36):
     """
@@ -183,32 +306,25 @@ def _create_ellipse_polygon(center_lat, center_lon, major_axis, minor_axis, rota
     Returns:
     - Shapely Polygon object
     """
-    coords = []
-    
     # Generate a circle, then scale to make an ellipse
-    for i in range(num_points):
-        angle = math.radians(i * (360 / num_points))
-        
-        # Calculate distances along the axes
-        dx = minor_axis * math.sin(angle)
-        dy = major_axis * math.cos(angle)
-        
-        # Apply rotation
-        rot_rad = math.radians(rotation)
-        dx_rot = dx * math.cos(rot_rad) - dy * math.sin(rot_rad)
-        dy_rot = dx * math.sin(rot_rad) + dy * math.cos(rot_rad)
-        
-        # Calculate the lat/lon of this point
-        dist = math.sqrt(dx_rot**2 + dy_rot**2)
-        bearing = math.degrees(math.atan2(dx_rot, dy_rot))
-        
-        lat, lon = get_point_at_distance(center_lat, center_lon, bearing, dist)
-        coords.append((lon, lat))  # Note: GeoJSON is (lon, lat)
-    
-    # Close the polygon
-    coords.append(coords[0])
-    
-    return Polygon(coords)
+    angles = np.radians(np.arange(num_points) * (360 / num_points))
+
+    # Calculate distances along the axes
+    dx = minor_axis * np.sin(angles)
+    dy = major_axis * np.cos(angles)
+
+    # Apply rotation
+    rot_rad = math.radians(rotation)
+    dx_rot = dx * math.cos(rot_rad) - dy * math.sin(rot_rad)
+    dy_rot = dx * math.sin(rot_rad) + dy * math.cos(rot_rad)
+
+    # Calculate the lat/lon of every point
+    dists = np.hypot(dx_rot, dy_rot)
+    bearings = np.degrees(np.arctan2(dx_rot, dy_rot))
+    lats, lons = destination_points(center_lat, center_lon, bearings, dists)
+
+    # GeoJSON order is (lon, lat); Polygon closes the ring
+    return Polygon(np.column_stack([lons, lats]))
 
 def _polygon_to_coordinates(polygon):
     """
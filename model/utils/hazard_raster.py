@@ -0,0 +1,260 @@
+import numpy as np
+from collections import OrderedDict
+import math
+import threading
+import time
+import logging
+from config import Config
+from utils.routing import SiteGraph, EvacuationRouter
+from utils.geo_utils import zone_radii, BLAST_ZONE_THRESHOLDS, THERMAL_ZONE_THRESHOLDS
+from models.dispersion_model import get_stability_class
+
+logger = logging.getLogger(__name__)
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111320.0
+
+# Fraction of the plume length bounding the high/medium/low plume hazard,
+# matching the dispersion ellipses drawn by calculate_threat_zone
+PLUME_LEVEL_FRACTIONS = (0.3, 0.6, 1.0)
+
+# 8-connected neighbour offsets (half of them; edges are undirected)
+NEIGHBOUR_OFFSETS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+class HazardRaster:
+    """
+    Combined hazard of one incident rasterized on a local grid.
+
+    Each cell holds the worst hazard level (0 = none, 1 = low, 2 = medium,
+    3 = high) of the blast, thermal and plume fields. The raster doubles as a
+    grid graph so evacuation routes for any number of origins can share one
+    precomputed shortest-path field.
+    """
+
+    def __init__(self, latitude, longitude, levels, cell_size):
+        """
+        Wrap a rasterized hazard field
+
+        Parameters:
+        - latitude, longitude: Incident source (center of the raster)
+        - levels: Square int8 array of hazard levels, rows going north, columns going east
+        - cell_size: Cell size in meters
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.levels = levels
+        self.cell_size = cell_size
+        self.half_extent = (levels.shape[0] - 1) / 2 * cell_size
+        self._meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(latitude))
+
+        self._lock = threading.Lock()
+        self._router = None
+        self._grid_hazard = None
+        self._edge_levels = {}
+
+    def _to_cells(self, latitudes, longitudes):
+        """Row/column of points, with a mask of points inside the raster"""
+        x = (np.asarray(longitudes, dtype=float) - self.longitude) * self._meters_per_lon
+        y = (np.asarray(latitudes, dtype=float) - self.latitude) * METERS_PER_DEGREE
+        cols = np.rint((x + self.half_extent) / self.cell_size).astype(np.int64)
+        rows = np.rint((y + self.half_extent) / self.cell_size).astype(np.int64)
+        n = self.levels.shape[0]
+        inside = (rows >= 0) & (rows < n) & (cols >= 0) & (cols < n)
+        return np.clip(rows, 0, n - 1), np.clip(cols, 0, n - 1), inside
+
+    def levels_at(self, latitudes, longitudes):
+        """
+        Look up the hazard level at many points
+
+        Parameters:
+        - latitudes, longitudes: Point coordinates
+
+        Returns:
+        - int8 array of hazard levels (0 outside the raster)
+        """
+        rows, cols, inside = self._to_cells(latitudes, longitudes)
+        return np.where(inside, self.levels[rows, cols], 0).astype(np.int8)
+
+    def edge_levels(self, graph):
+        """
+        Hazard level of every edge of a site graph, computed once per graph
+
+        Parameters:
+        - graph: SiteGraph whose edges should be rated
+
+        Returns:
+        - int8 array aligned with the graph edges
+        """
+        with self._lock:
+            key = id(graph)
+            if key not in self._edge_levels:
+                self._edge_levels[key] = self.levels_at(graph.mid_lats, graph.mid_lons)
+            return self._edge_levels[key]
+
+    def _build_router(self):
+        """Turn the raster into an 8-connected grid graph with safe border cells as exits"""
+        n = self.levels.shape[0]
+        offsets = (np.arange(n) * self.cell_size) - self.half_extent
+        ys, xs = np.meshgrid(offsets, offsets, indexing='ij')
+        node_lats = (self.latitude + ys / METERS_PER_DEGREE).ravel()
+        node_lons = (self.longitude + xs / self._meters_per_lon).ravel()
+
+        index = np.arange(n * n).reshape(n, n)
+        edges_from, edges_to = [], []
+        for dr, dc in NEIGHBOUR_OFFSETS:
+            r0, r1 = max(0, -dr), n - max(0, dr)
+            c0, c1 = max(0, -dc), n - max(0, dc)
+            edges_from.append(index[r0:r1, c0:c1].ravel())
+            edges_to.append(index[r0 + dr:r1 + dr, c0 + dc:c1 + dc].ravel())
+
+        border = np.zeros((n, n), dtype=bool)
+        border[0, :] = border[-1, :] = border[:, 0] = border[:, -1] = True
+        exits = index[border & (self.levels == 0)]
+        if len(exits) == 0:
+            exits = index[border]
+
+        graph = SiteGraph(node_lats, node_lons, np.concatenate(edges_from), np.concatenate(edges_to), exits)
+        flat = self.levels.ravel()
+        self._grid_hazard = np.maximum(flat[graph.rows], flat[graph.indices])
+        self._router = EvacuationRouter(graph)
+
+    def routes(self, latitudes, longitudes):
+        """
+        Evacuation routes over the raster for a batch of origins
+
+        Parameters:
+        - latitudes, longitudes: Origin coordinates
+
+        Returns:
+        - List of route dictionaries (None for origins with no reachable exit)
+        """
+        with self._lock:
+            if self._router is None:
+                self._build_router()
+        return self._router.routes(latitudes, longitudes, hazard=self._grid_hazard)
+
+def build_hazard_raster(latitude, longitude, explosion_params, dispersion_params, source_strength,
+                        wind_speed, wind_direction, dispersion_model, cell_size=None, max_cells=None):
+    """
+    Rasterize the combined blast, thermal and plume hazard of an incident
+
+    Parameters:
+    - latitude, longitude: Source coordinates
+    - explosion_params: Dictionary with explosion model outputs
+    - dispersion_params: Dictionary with dispersion model outputs
+    - source_strength: Release strength passed to the dispersion model
+    - wind_speed: Wind speed in m/s
+    - wind_direction: Bearing the plume travels towards, in degrees from north
+    - dispersion_model: DispersionModel used to evaluate plume concentration
+    - cell_size: Target cell size in meters
+    - max_cells: Maximum number of cells along each side
+
+    Returns:
+    - HazardRaster
+    """
+    cell_size = cell_size or Config.HAZARD_RASTER_CELL_SIZE
+    max_cells = max_cells or Config.HAZARD_RASTER_MAX_CELLS
+
+    # Same radii, fallbacks included, as the zones drawn by calculate_threat_zone
+    blast = zone_radii(explosion_params, 'distance_to_overpressure', BLAST_ZONE_THRESHOLDS)
+    thermal = zone_radii(explosion_params, 'distance_to_radiation', THERMAL_ZONE_THRESHOLDS)
+    plume_length = float((dispersion_params or {}).get('plume_length', 500))
+
+    # Square grid centered on the source, large enough to leave a safe border
+    extent = max(max(blast), max(thermal), plume_length) * 1.25 + 2 * cell_size
+    n = min(int(math.ceil(2 * extent / cell_size)) + 1, max_cells)
+    n += (n + 1) % 2  # odd, so the source sits on the center cell
+    cell_size = 2 * extent / (n - 1)
+
+    offsets = np.arange(n) * cell_size - extent
+    y, x = np.meshgrid(offsets, offsets, indexing='ij')
+    r = np.hypot(x, y)
+
+    # Blast and thermal: concentric circles
+    blast_level = sum((r <= radius).astype(np.int8) for radius in blast)
+    thermal_level = sum((r <= radius).astype(np.int8) for radius in thermal)
+
+    # Plume: concentration thresholds taken on the centerline at the ellipse extents
+    theta = math.radians(wind_direction)
+    downwind = x * math.sin(theta) + y * math.cos(theta)
+    crosswind = -x * math.cos(theta) + y * math.sin(theta)
+    stability = get_stability_class(wind_speed)
+    concentration = dispersion_model.concentration_field(source_strength, wind_speed, downwind,
+                                                         crosswind, stability)
+    thresholds = dispersion_model.concentration_field(
+        source_strength, wind_speed, np.array(PLUME_LEVEL_FRACTIONS) * plume_length, 0.0, stability)
+    plume_level = sum((concentration >= c).astype(np.int8) for c in thresholds if c > 0)
+
+    levels = np.maximum(np.maximum(blast_level, thermal_level), plume_level).astype(np.int8)
+    logger.info(f"Rasterized hazard on a {n}x{n} grid with {cell_size:.1f} m cells")
+
+    return HazardRaster(latitude, longitude, levels, cell_size)
+
+class HazardRasterCache:
+    """
+    Per-incident hazard rasters with expiry.
+
+    Incidents are registered with the inputs needed to rasterize them; the
+    raster is built on first use and shared by every later query against the
+    same incident until the incident is re-registered or expires.
+    """
+
+    def __init__(self, dispersion_model, ttl=None, max_entries=None):
+        """
+        Initialize an empty cache
+
+        Parameters:
+        - dispersion_model: DispersionModel used to evaluate plume concentration
+        - ttl: Seconds an incident stays cached
+        - max_entries: Maximum number of incidents kept (least recently used are dropped)
+        """
+        self.dispersion_model = dispersion_model
+        self.ttl = ttl if ttl is not None else Config.ZONE_TTL_SECONDS
+        self.max_entries = max_entries or Config.HAZARD_RASTER_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def register(self, incident_id, **incident):
+        """
+        Register (or replace) the inputs of an incident
+
+        Parameters:
+        - incident_id: Identifier of the incident
+        - incident: Keyword arguments for build_hazard_raster (except dispersion_model)
+        """
+        with self._lock:
+            self._entries[incident_id] = {
+                'incident': incident,
+                'raster': None,
+                'build_lock': threading.Lock(),
+                'expires_at': time.time() + self.ttl
+            }
+            self._entries.move_to_end(incident_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, incident_id):
+        """
+        Get the raster of an incident, building it on first use
+
+        Parameters:
+        - incident_id: Identifier of the incident
+
+        Returns:
+        - HazardRaster, or None if the incident is unknown or expired
+        """
+        with self._lock:
+            entry = self._entries.get(incident_id)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                del self._entries[incident_id]
+                return None
+            self._entries.move_to_end(incident_id)
+
+        # Concurrent queries for a new incident wait for a single build
+        with entry['build_lock']:
+            if entry['raster'] is None:
+                entry['raster'] = build_hazard_raster(dispersion_model=self.dispersion_model,
+                                                      **entry['incident'])
+        return entry['raster']
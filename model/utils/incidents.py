@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Scheduling order of risk levels (higher first)
+RISK_RANK = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1, 'SAFE': 0}
+
+class IncidentManager:
+    """
+    Schedules zone recomputation for concurrently active incidents.
+
+    Incidents are keyed by location. Updates to an incident replace its
+    pending inputs, so a burst of readings from one location costs a single
+    recomputation. Recomputations run on a fixed worker pool and are started
+    highest risk first, then stalest first; each risk level also has a minimum
+    refresh interval, so low-risk incidents keep serving their previous result
+    instead of competing with high-risk ones for workers.
+    """
+
+    def __init__(self, compute, workers=None, refresh_intervals=None, ttl=None):
+        """
+        Initialize the manager and start its dispatcher
+
+        Parameters:
+        - compute: Function taking an incident's inputs dictionary and returning its result
+        - workers: Number of concurrent recomputations
+        - refresh_intervals: Minimum seconds between recomputations per risk level
+        - ttl: Seconds an incident is kept after its last update
+        """
+        self.compute = compute
+        self.workers = workers or Config.INCIDENT_WORKERS
+        self.refresh_intervals = refresh_intervals or Config.INCIDENT_REFRESH_INTERVALS
+        self.ttl = ttl if ttl is not None else Config.ZONE_TTL_SECONDS
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._incidents = {}
+        self._ready = []      # (-rank, pending_since, seq, incident_id)
+        self._delayed = []    # (due_at, seq, incident_id)
+        self._seq = itertools.count()
+        self._running = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='incident')
+        self._dispatcher = threading.Thread(target=self._dispatch, name='incident-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+    def _interval(self, risk_level):
+        return self.refresh_intervals.get(risk_level, max(self.refresh_intervals.values()))
+
+    def update(self, incident_id, inputs, risk_score, risk_level, wait=None):
+        """
+        Record new inputs for an incident and get its zones
+
+        A fresh result is waited for when the incident has none yet or its
+        last one is older than the refresh interval of its risk level;
+        otherwise the previous result is returned and the new inputs are
+        picked up at the next scheduled refresh.
+
+        Parameters:
+        - incident_id: Identifier of the incident (see geo_utils.incident_key)
+        - inputs: Dictionary passed to the compute function
+        - risk_score: Risk score of the latest reading
+        - risk_level: Risk level of the latest reading
+        - wait: Maximum seconds to wait for a recomputation
+
+        Returns:
+        - Latest result of the incident (None if nothing has been computed yet)
+        """
+        wait = Config.INCIDENT_WAIT_TIMEOUT if wait is None else wait
+        now = time.time()
+
+        with self._lock:
+            self._purge_expired(now)
+
+            incident = self._incidents.get(incident_id)
+            if incident is None:
+                incident = {
+                    'inputs': None,
+                    'result': None,
+                    'computed_at': None,
+                    'version': 0,
+                    'result_version': 0,
+                    'pending_since': None,
+                    'scheduled': False,
+                    'running': False
+                }
+                self._incidents[incident_id] = incident
+
+            incident['risk_score'] = risk_score
+            incident['risk_level'] = risk_level
+            incident['updated_at'] = now
+
+            if (incident['running'] or incident['scheduled']) and inputs == incident['inputs']:
+                # Identical inputs join the recomputation already in flight
+                version = incident['version']
+            else:
+                # Coalesce: only the newest inputs are ever computed
+                incident['inputs'] = inputs
+                incident['version'] += 1
+                if incident['pending_since'] is None:
+                    incident['pending_since'] = now
+                version = incident['version']
+                self._schedule(incident_id, incident, now)
+
+            deadline = now + wait
+            interval = self._interval(risk_level)
+            while incident['result_version'] < version:
+                # A result computed within the refresh interval is fresh enough
+                if incident['result'] is not None and time.time() - incident['computed_at'] < interval:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+
+            return incident['result']
+
+    def _schedule(self, incident_id, incident, now):
+        """Queue an incident for recomputation at its next due time (caller holds the lock)"""
+        if incident['running']:
+            # Rescheduled when the running recomputation completes
+            return
+
+        computed_at = incident['computed_at']
+        due_at = now if computed_at is None else computed_at + self._interval(incident['risk_level'])
+
+        # Pushing again is cheap; outdated heap entries are skipped when popped
+        if due_at <= now:
+            heapq.heappush(self._ready, (-RISK_RANK.get(incident['risk_level'], 0), incident['pending_since'],
+                                         next(self._seq), incident_id))
+        else:
+            heapq.heappush(self._delayed, (due_at, next(self._seq), incident_id))
+        incident['scheduled'] = True
+        self._changed.notify_all()
+
+    def _dispatch(self):
+        """Start recomputations in priority order as workers become free"""
+        with self._lock:
+            while True:
+                now = time.time()
+
+                # Move incidents whose refresh interval has passed to the ready queue
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, _, incident_id = heapq.heappop(self._delayed)
+                    incident = self._incidents.get(incident_id)
+                    if incident is not None and incident['scheduled'] and not incident['running']:
+                        heapq.heappush(self._ready, (-RISK_RANK.get(incident['risk_level'], 0),
+                                                     incident['pending_since'], next(self._seq), incident_id))
+
+                started = False
+                while self._ready and self._running < self.workers:
+                    _, _, _, incident_id = heapq.heappop(self._ready)
+                    incident = self._incidents.get(incident_id)
+                    if incident is None or not incident['scheduled'] or incident['running']:
+                        continue
+
+                    incident['scheduled'] = False
+                    incident['running'] = True
+                    incident['pending_since'] = None
+                    self._running += 1
+                    self._executor.submit(self._run, incident_id, incident, incident['inputs'], incident['version'])
+                    started = True
+
+                if started:
+                    continue
+
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._changed.wait(timeout)
+
+    def _run(self, incident_id, incident, inputs, version):
+        """Recompute one incident on a worker thread"""
+        start = time.time()
+        try:
+            result = self.compute(inputs)
+        except Exception as e:
+            logger.error(f"Error recomputing incident {incident_id}: {str(e)}")
+            result = None
+
+        with self._lock:
+            self._running -= 1
+            incident['running'] = False
+            if result is not None:
+                incident['result'] = result
+                incident['computed_at'] = start
+            # Waiters for this version give up on a failed recomputation rather than block
+            incident['result_version'] = max(incident['result_version'], version)
+
+            # Inputs that arrived during the recomputation still need to be computed
+            if incident['version'] > version:
+                self._schedule(incident_id, incident, time.time())
+            self._changed.notify_all()
+
+    def _purge_expired(self, now):
+        """Drop idle incidents (caller holds the lock)"""
+        expired = [incident_id for incident_id, incident in self._incidents.items()
+                   if not incident['running'] and incident['updated_at'] + self.ttl <= now]
+        for incident_id in expired:
+            del self._incidents[incident_id]
+
+    def status(self):
+        """
+        Summarize the tracked incidents
+
+        Returns:
+        - List of dictionaries with risk, freshness and scheduling state per incident
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    'incident_id': incident_id,
+                    'risk_level': incident['risk_level'],
+                    'risk_score': incident['risk_score'],
+                    'age': None if incident['computed_at'] is None else now - incident['computed_at'],
+                    'pending': incident['scheduled'],
+                    'running': incident['running']
+                }
+                for incident_id, incident in self._incidents.items()
+            ]
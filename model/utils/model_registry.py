@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Version served when the manifest names none: the model's built-in default paths
+DEFAULT_VERSION = 'default'
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ModelRegistry:
+    """
+    Versioned model artifacts with hot swapping.
+
+    Every published version lives in its own directory under the registry
+    directory, and manifest.json records the versions of each model and the
+    active one. Activating a version loads and warms it in a background
+    thread while the current one keeps serving, then swaps it in with a
+    single reference assignment, so requests see either the old or the new
+    model and never a half-loaded one. Each process also polls the manifest
+    and activates whatever version it names, which is how a rollout made in
+    one worker reaches all of them.
+    """
+
+    def __init__(self, factories, directory=None, poll_interval=None, staging_dir=None, companions=None):
+        """
+        Initialize the registry and load the active version of every model
+
+        Parameters:
+        - factories: Dictionary mapping model names to (load, warmup) pairs, where
+          load(path) builds a model from an artifact path (None for the default model)
+          and warmup(model) runs sample predictions, raising if the model is unusable
+        - directory: Directory holding the manifest and the artifacts
+        - poll_interval: Seconds between manifest checks (0 disables watching)
+        - staging_dir: The only directory artifacts may be published from
+        - companions: Dictionary mapping model names to file names fitted with the model
+          (prefilters, corrections); those next to a published artifact are published with it
+        """
+        self.factories = factories
+        self.directory = directory or Config.MODEL_REGISTRY_DIR
+        self.poll_interval = Config.MODEL_REGISTRY_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.staging_dir = staging_dir or Config.MODEL_STAGING_DIR
+        self.companions = companions or {}
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._active = {}     # name -> (version, model)
+        self._loading = {}    # name -> version being loaded
+        self._errors = {}     # name -> last load error
+        self._manifest_mtime = None
+
+        manifest = self._read_manifest()
+        for name in factories:
+            version = manifest.get(name, {}).get('active', DEFAULT_VERSION)
+            try:
+                self._active[name] = (version, self._load(name, version, manifest))
+            except Exception as e:
+                logger.error(f"Failed to load {name} model version {version}: {str(e)}")
+                self._active[name] = (DEFAULT_VERSION, self._load(name, DEFAULT_VERSION, manifest))
+
+        if self.poll_interval:
+            threading.Thread(target=self._watch_loop, name='model-registry-watch', daemon=True).start()
+
+    def get(self, name):
+        """Currently active model instance"""
+        return self._active[name][1]
+
+    def version(self, name):
+        """Currently active version of a model"""
+        return self._active[name][0]
+
+    def _read_manifest(self):
+        """Manifest contents: model name -> {'active', 'previous', 'versions'}"""
+        try:
+            self._manifest_mtime = os.path.getmtime(self.manifest_path)
+            with open(self.manifest_path) as f:
+                return json.load(f).get('models', {})
+        except FileNotFoundError:
+            return {}
+
+    @contextmanager
+    def _manifest_update(self):
+        """Read-modify-write the manifest under a lock shared by every process"""
+        with open(self.manifest_path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                models = self._read_manifest()
+                yield models
+                self._write_manifest(models)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_manifest(self, models):
+        """Replace the manifest atomically"""
+        tmp_path = self.manifest_path + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'models': models}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def _artifact_path(self, name, version, manifest):
+        if version == DEFAULT_VERSION:
+            return None
+        entry = manifest.get(name, {}).get('versions', {}).get(version)
+        if entry is None:
+            raise KeyError(f"Unknown {name} model version {version}")
+        path = os.path.join(self.directory, entry['artifact'])
+        # Artifacts are unpickled, so only ever load the bytes that were published
+        checksums = entry.get('files') or {os.path.basename(path): entry['sha256']}
+        for file_name, checksum in checksums.items():
+            if _sha256(os.path.join(os.path.dirname(path), file_name)) != checksum:
+                raise ValueError(f"Checksum mismatch for {file_name} of {name} model version {version}")
+        return path
+
+    def _load(self, name, version, manifest=None):
+        """Build and warm a model version without activating it"""
+        load, warmup = self.factories[name]
+        path = self._artifact_path(name, version, self._read_manifest() if manifest is None else manifest)
+        start = time.perf_counter()
+        model = load(path)
+        warmup(model)
+        logger.info(f"Loaded {name} model version {version} in {time.perf_counter() - start:.2f}s")
+        return model
+
+    def load(self, name, version):
+        """
+        Build and warm a specific model version without activating it
+
+        Parameters:
+        - name: Model name
+        - version: Version to load
+
+        Returns:
+        - Model instance
+        """
+        return self._load(name, version)
+
+    def publish(self, name, files, version=None):
+        """
+        Copy artifact files into the registry as a new version
+
+        Parameters:
+        - name: Model name
+        - files: Artifact file paths relative to the staging directory; the first is the
+          one the model is loaded from, and the model's companion files next to it are added
+        - version: Version label (defaults to a UTC timestamp)
+
+        Returns:
+        - The version label
+        """
+        if name not in self.factories:
+            raise KeyError(f"Unknown model {name}")
+        version = str(version or time.strftime('%Y%m%d-%H%M%S', time.gmtime()))
+        if version == DEFAULT_VERSION:
+            raise ValueError(f"'{DEFAULT_VERSION}' is reserved for the built-in model")
+        if version in ('.', '..') or os.path.basename(version) != version:
+            raise ValueError(f"Invalid version label {version}")
+        if not files:
+            raise ValueError("No artifact files given")
+        files = [self._staged(path) for path in files]
+        listed = {os.path.basename(path) for path in files}
+        for companion in self.companions.get(name, ()):
+            path = os.path.join(os.path.dirname(files[0]), companion)
+            if companion not in listed and os.path.isfile(path):
+                logger.info(f"Publishing {companion} with the {name} model")
+                files.append(path)
+
+        version_dir = os.path.join(self.directory, name, version)
+        os.makedirs(version_dir, exist_ok=False)
+        for path in files:
+            shutil.copy2(path, version_dir)
+
+        artifact = os.path.join(name, version, os.path.basename(files[0]))
+        checksums = {os.path.basename(path): _sha256(os.path.join(version_dir, os.path.basename(path)))
+                     for path in files}
+        with self._manifest_update() as models:
+            entry = models.setdefault(name, {'active': DEFAULT_VERSION, 'versions': {}})
+            entry['versions'][version] = {
+                'artifact': artifact,
+                'sha256': checksums[os.path.basename(files[0])],
+                'files': checksums,
+                'published': time.time()
+            }
+
+        logger.info(f"Published {name} model version {version}")
+        return version
+
+    def _staged(self, path):
+        """Resolve an artifact path inside the staging directory, refusing anything outside it"""
+        staging = os.path.realpath(self.staging_dir)
+        resolved = os.path.realpath(os.path.join(staging, path))
+        if os.path.commonpath([staging, resolved]) != staging or not os.path.isfile(resolved):
+            raise ValueError(f"Artifact {path} is not a file in the staging directory")
+        return resolved
+
+    def activate(self, name, version, wait=False):
+        """
+        Load, warm and swap in a model version in the background
+
+        The manifest is only updated once the new version is serving, so other
+        processes never pick up a version that failed to load here.
+
+        Parameters:
+        - name: Model name
+        - version: Version to activate
+        - wait: Block until the swap is done (or failed)
+
+        Returns:
+        - False if the version is already active or loading, True otherwise
+        """
+        with self._lock:
+            if self._active[name][0] == version or self._loading.get(name) == version:
+                return False
+            self._loading[name] = version
+
+        thread = threading.Thread(target=self._swap, args=(name, version, True), name=f'model-load-{name}',
+                                  daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def rollback(self, name, wait=False):
+        """Activate the version that was active before the current one"""
+        previous = self._read_manifest().get(name, {}).get('previous')
+        if previous is None:
+            raise ValueError(f"No previous {name} model version to roll back to")
+        return self.activate(name, previous, wait)
+
+    def _swap(self, name, version, record):
+        try:
+            model = self._load(name, version)
+        except Exception as e:
+            logger.error(f"Failed to load {name} model version {version}: {str(e)}")
+            with self._lock:
+                self._errors[name] = {'version': version, 'error': str(e)}
+                self._loading.pop(name, None)
+            return
+
+        with self._lock:
+            previous = self._active[name][0]
+            self._active[name] = (version, model)
+            self._errors.pop(name, None)
+            self._loading.pop(name, None)
+        logger.info(f"Swapped {name} model from version {previous} to {version}")
+
+        if record:
+            with self._manifest_update() as models:
+                entry = models.setdefault(name, {'versions': {}})
+                if entry.get('active') != version:
+                    entry['previous'] = entry.get('active', previous)
+                    entry['active'] = version
+
+    def _watch_loop(self):
+        """Follow activations made by other processes through the manifest"""
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                mtime = os.path.getmtime(self.manifest_path) if os.path.exists(self.manifest_path) else None
+                if mtime is None or mtime == self._manifest_mtime:
+                    continue
+                models = self._read_manifest()
+                for name in self.factories:
+                    version = models.get(name, {}).get('active', DEFAULT_VERSION)
+                    with self._lock:
+                        if self._active[name][0] == version or self._loading.get(name) == version:
+                            continue
+                        if self._errors.get(name, {}).get('version') == version:
+                            continue  # already failed here; wait for another version
+                        self._loading[name] = version
+                    self._swap(name, version, record=False)
+            except Exception as e:
+                logger.error(f"Error watching model manifest: {str(e)}")
+
+    def status(self):
+        """
+        Describe the registry
+
+        Returns:
+        - Dictionary per model with the active version, the version loading (if any),
+          the last load error and the published versions
+        """
+        manifest = self._read_manifest()
+        with self._lock:
+            return {
+                name: {
+                    'active': self._active[name][0],
+                    'loading': self._loading.get(name),
+                    'error': self._errors.get(name),
+                    'previous': manifest.get(name, {}).get('previous'),
+                    'versions': sorted(manifest.get(name, {}).get('versions', {}))
+                }
+                for name in self.factories
+            }
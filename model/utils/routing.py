@@ -0,0 +1,458 @@
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import logging
+from config import Config
+from utils.geo_utils import haversine_distances
+
+logger = logging.getLogger(__name__)
+
+# Edge cost multipliers for edges whose midpoint lies inside a threat zone
+HAZARD_MULTIPLIERS = {
+    'low': 3.0,
+    'medium': 10.0,
+    'high': 100.0
+}
+
+# Hazard level index used in per-edge arrays (0 = no hazard)
+HAZARD_LEVELS = ['none', 'low', 'medium', 'high']
+
+# Coordinates are rounded to this many decimals when merging graph nodes (about 1 cm)
+NODE_PRECISION = 7
+
+class SiteGraph:
+    """
+    Road/path network of a site stored as compact CSR adjacency arrays.
+
+    Edges are undirected; each one is stored in both directions so that
+    indptr/indices/lengths describe the full adjacency of every node.
+    """
+
+    def __init__(self, node_lats, node_lons, edges_from, edges_to, exits):
+        """
+        Build the graph from node coordinates and an edge list
+
+        Parameters:
+        - node_lats, node_lons: Node coordinates
+        - edges_from, edges_to: Node indices of each undirected edge
+        - exits: Node indices of safe exits
+        """
+        self.node_lats = np.asarray(node_lats, dtype=float)
+        self.node_lons = np.asarray(node_lons, dtype=float)
+        self.exits = np.unique(np.asarray(exits, dtype=np.int64))
+        n = len(self.node_lats)
+
+        edges_from = np.asarray(edges_from, dtype=np.int64)
+        edges_to = np.asarray(edges_to, dtype=np.int64)
+        keep = edges_from != edges_to
+        edges_from, edges_to = edges_from[keep], edges_to[keep]
+
+        # Store both directions, drop parallel edges and sort into CSR order
+        rows = np.concatenate([edges_from, edges_to])
+        cols = np.concatenate([edges_to, edges_from])
+        pairs = np.unique(rows * n + cols)
+        rows, cols = pairs // n, pairs % n
+
+        self.indptr = np.searchsorted(rows, np.arange(n + 1)).astype(np.int64)
+        self.indices = cols
+        self.rows = rows
+
+        # Zero-length edges would be treated as missing by scipy
+        lengths = haversine_distances(self.node_lats[rows], self.node_lons[rows],
+                                      self.node_lats[cols], self.node_lons[cols])
+        self.lengths = np.maximum(lengths, 1e-3)
+
+        # Edge midpoints are used to look up the hazard an edge is exposed to
+        self.mid_lats = (self.node_lats[rows] + self.node_lats[cols]) / 2
+        self.mid_lons = (self.node_lons[rows] + self.node_lons[cols]) / 2
+
+        # Nearest-node lookup on a local equirectangular projection
+        self._cos_lat = np.cos(np.radians(np.mean(self.node_lats))) if n else 1.0
+        self._tree = cKDTree(np.column_stack([self.node_lons * self._cos_lat, self.node_lats])) if n else None
+
+    @property
+    def node_count(self):
+        return len(self.node_lats)
+
+    @property
+    def edge_count(self):
+        return len(self.indices)
+
+    def nearest_nodes(self, latitudes, longitudes):
+        """
+        Snap points to their nearest graph nodes
+
+        Parameters:
+        - latitudes, longitudes: Point coordinates
+
+        Returns:
+        - Array of node indices
+        """
+        lats = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        lons = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        _, nodes = self._tree.query(np.column_stack([lons * self._cos_lat, lats]))
+        return np.asarray(nodes, dtype=np.int64)
+
+    def to_csr(self, weights):
+        """
+        Build a scipy CSR matrix for the given per-edge weights
+
+        Parameters:
+        - weights: Array aligned with self.indices
+
+        Returns:
+        - scipy.sparse.csr_matrix
+        """
+        n = self.node_count
+        return csr_matrix((weights, self.indices, self.indptr), shape=(n, n))
+
+def _node_lookup(coords):
+    """Merge coordinates into unique nodes, returning node coordinates and per-coordinate node ids"""
+    coords = np.round(np.asarray(coords, dtype=float).reshape(-1, 2), NODE_PRECISION)
+    unique, inverse = np.unique(coords, axis=0, return_inverse=True)
+    return unique, inverse.ravel()
+
+def load_site_graph(path):
+    """
+    Load a site graph from a GeoJSON or CSV file
+
+    GeoJSON files hold LineString/MultiLineString features for paths (every
+    consecutive pair of coordinates becomes an edge) and Point features with
+    an "exit" property for safe exits. CSV files hold one edge per row with
+    from_lat, from_lon, to_lat, to_lon columns and an optional exit column
+    marking the "to" node as a safe exit.
+
+    Parameters:
+    - path: Path to the graph file
+
+    Returns:
+    - SiteGraph, or None if the file could not be loaded
+    """
+    _, ext = os.path.splitext(path)
+
+    try:
+        if ext.lower() in ('.geojson', '.json'):
+            with open(path) as f:
+                collection = json.load(f)
+
+            segments = []
+            exit_points = []
+            for feature in collection.get('features', []):
+                geometry = feature.get('geometry') or {}
+                properties = feature.get('properties') or {}
+                if geometry.get('type') == 'LineString':
+                    lines = [geometry['coordinates']]
+                elif geometry.get('type') == 'MultiLineString':
+                    lines = geometry['coordinates']
+                elif geometry.get('type') == 'Point' and properties.get('exit'):
+                    lon, lat = geometry['coordinates'][:2]
+                    exit_points.append((lat, lon))
+                    continue
+                else:
+                    continue
+
+                for line in lines:
+                    line = np.asarray(line, dtype=float)[:, :2]
+                    for (lon1, lat1), (lon2, lat2) in zip(line[:-1], line[1:]):
+                        segments.append((lat1, lon1, lat2, lon2))
+
+            segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+            exit_points = np.asarray(exit_points, dtype=float).reshape(-1, 2)
+
+        elif ext.lower() == '.csv':
+            edges = pd.read_csv(path)
+            segments = edges[['from_lat', 'from_lon', 'to_lat', 'to_lon']].to_numpy(dtype=float)
+            if 'exit' in edges.columns:
+                is_exit = edges['exit'].astype(str).str.lower().isin(['1', 'true', 'yes'])
+                exit_points = segments[is_exit.to_numpy(), 2:4]
+            else:
+                exit_points = np.empty((0, 2))
+        else:
+            logger.error(f"Unsupported site graph format: {ext}")
+            return None
+
+        nodes, node_ids = _node_lookup(np.vstack([segments[:, 0:2], segments[:, 2:4]]))
+        edges_from = node_ids[:len(segments)]
+        edges_to = node_ids[len(segments):]
+
+        # Exits are snapped to the nearest node of the network
+        graph = SiteGraph(nodes[:, 0], nodes[:, 1], edges_from, edges_to, exits=[])
+        if len(exit_points):
+            graph.exits = np.unique(graph.nearest_nodes(exit_points[:, 0], exit_points[:, 1]))
+
+        logger.info(f"Loaded site graph from {path}: {graph.node_count} nodes, "
+                    f"{graph.edge_count // 2} edges, {len(graph.exits)} exits")
+        return graph
+
+    except Exception as e:
+        logger.error(f"Error loading site graph from {path}: {str(e)}")
+        return None
+
+class EvacuationRouter:
+    """
+    Hazard-aware shortest paths from any node of a site graph to the nearest safe exit.
+
+    A single multi-source Dijkstra from all exits gives every node its
+    distance and next hop towards safety. Results are cached per hazard state;
+    when hazard weights only increase, nodes whose path to an exit avoids every
+    changed edge keep their cached path and only the affected subtrees are
+    recomputed.
+    """
+
+    def __init__(self, graph, walking_speed=None, cache_size=8):
+        """
+        Initialize the router
+
+        Parameters:
+        - graph: SiteGraph to route over
+        - walking_speed: Evacuation speed in m/s used for time estimates
+        - cache_size: Number of hazard states whose solutions are kept
+        """
+        self.graph = graph
+        self.walking_speed = walking_speed or Config.EVACUATION_WALKING_SPEED
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._last = None
+
+    def edge_hazard(self, zone_polygons):
+        """
+        Get the hazard level of every edge
+
+        Parameters:
+        - zone_polygons: Iterable of (level, shapely polygon) pairs
+
+        Returns:
+        - Array of hazard level indices (see HAZARD_LEVELS) aligned with the graph edges
+        """
+        hazard = np.zeros(self.graph.edge_count, dtype=np.int8)
+        for level, polygon in zone_polygons:
+            rank = HAZARD_LEVELS.index(level) if level in HAZARD_LEVELS else 0
+            if rank == 0:
+                continue
+            inside = shapely.contains_xy(polygon, self.graph.mid_lons, self.graph.mid_lats)
+            np.maximum(hazard, np.where(inside, rank, 0).astype(np.int8), out=hazard)
+        return hazard
+
+    def edge_weights(self, hazard):
+        """
+        Turn per-edge hazard levels into traversal costs
+
+        Parameters:
+        - hazard: Array of hazard level indices aligned with the graph edges
+
+        Returns:
+        - Array of edge weights in meters-equivalent
+        """
+        multipliers = np.array([1.0] + [HAZARD_MULTIPLIERS[level] for level in HAZARD_LEVELS[1:]])
+        return self.graph.lengths * multipliers[hazard]
+
+    def solve(self, hazard):
+        """
+        Compute distance and next hop to the nearest exit for every node
+
+        Parameters:
+        - hazard: Array of hazard level indices aligned with the graph edges
+
+        Returns:
+        - (distances, next_hops) arrays; next hop is -9999 for exits and unreachable nodes
+        """
+        key = hashlib.sha1(hazard.tobytes()).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._last = (hazard, self._cache[key])
+                return self._cache[key]
+            last = self._last
+
+        weights = self.edge_weights(hazard)
+        solution = None
+        if last is not None:
+            solution = self._update(last[0], last[1], hazard, weights)
+        if solution is None:
+            solution = self._full_solve(weights)
+
+        with self._lock:
+            self._cache[key] = solution
+            self._last = (hazard, solution)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return solution
+
+    def _full_solve(self, weights):
+        """Multi-source Dijkstra from every exit"""
+        if len(self.graph.exits) == 0:
+            n = self.graph.node_count
+            return np.full(n, np.inf), np.full(n, -9999, dtype=np.int64)
+
+        # The graph is symmetric, so searching outwards from the exits gives
+        # each node its path to the nearest exit with predecessors as next hops
+        distances, next_hops, _ = dijkstra(self.graph.to_csr(weights), directed=True,
+                                           indices=self.graph.exits, min_only=True,
+                                           return_predecessors=True)
+        return distances, next_hops.astype(np.int64)
+
+    def _update(self, old_hazard, old_solution, hazard, weights):
+        """
+        Reuse a previous solution when hazard only increased
+
+        Returns None when a full solve is required.
+        """
+        if np.any(hazard < old_hazard):
+            return None
+
+        old_distances, old_next = old_solution
+        graph = self.graph
+        n = graph.node_count
+
+        changed = hazard > old_hazard
+        if not np.any(changed):
+            return old_solution
+
+        # Nodes whose first hop uses an edge that became more expensive
+        tree_edge = old_next[graph.rows] == graph.indices
+        roots = np.zeros(n + 1, dtype=bool)
+        roots[graph.rows[changed & tree_edge]] = True
+
+        # Everything below such a node in the shortest-path tree is affected
+        # (pointer jumping: log2(depth) vectorized passes)
+        ancestor = np.where(old_next >= 0, old_next, n)
+        ancestor = np.append(ancestor, n)
+        affected = roots.copy()
+        while True:
+            spread = affected | affected[ancestor]
+            jumped = ancestor[ancestor]
+            if np.array_equal(spread, affected) and np.array_equal(jumped, ancestor):
+                break
+            affected, ancestor = spread, jumped
+        affected = affected[:n]
+
+        if not np.any(affected):
+            return old_solution
+        if affected.sum() > n // 2:
+            return None
+
+        return self._repair(old_distances, old_next, affected, weights)
+
+    def _repair(self, old_distances, old_next, affected, weights):
+        """Recompute only the affected nodes, seeded from their unaffected neighbours"""
+        graph = self.graph
+        sub_nodes = np.flatnonzero(affected)
+        m = len(sub_nodes)
+        local = np.full(graph.node_count, -1, dtype=np.int64)
+        local[sub_nodes] = np.arange(m)
+
+        rows, cols = graph.rows, graph.indices
+        from_affected = affected[rows]
+
+        # Best exit path through an unaffected neighbour for every affected node
+        boundary = from_affected & ~affected[cols]
+        seed = np.full(m, np.inf)
+        seed_via = np.full(m, -9999, dtype=np.int64)
+        if np.any(boundary):
+            b_rows = local[rows[boundary]]
+            b_cost = weights[boundary] + old_distances[cols[boundary]]
+            order = np.lexsort((b_cost, b_rows))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = b_rows[order][1:] != b_rows[order][:-1]
+            best = order[first]
+            seed[b_rows[best]] = b_cost[best]
+            seed_via[b_rows[best]] = cols[boundary][best]
+
+        # Subgraph of affected nodes plus a virtual source (index m) feeding the seeds
+        internal = from_affected & affected[cols]
+        src = np.concatenate([local[cols[internal]], np.full(np.isfinite(seed).sum(), m)])
+        dst = np.concatenate([local[rows[internal]], np.flatnonzero(np.isfinite(seed))])
+        w = np.concatenate([weights[internal], seed[np.isfinite(seed)]])
+        sub = csr_matrix((np.maximum(w, 1e-9), (src, dst)), shape=(m + 1, m + 1))
+
+        sub_distances, sub_pred = dijkstra(sub, directed=True, indices=m, return_predecessors=True)
+
+        distances = old_distances.copy()
+        next_hops = old_next.copy()
+        distances[sub_nodes] = sub_distances[:m]
+
+        pred = sub_pred[:m]
+        from_seed = pred == m
+        next_hops[sub_nodes[from_seed]] = seed_via[from_seed]
+        internal_pred = (pred >= 0) & ~from_seed
+        next_hops[sub_nodes[internal_pred]] = sub_nodes[pred[internal_pred]]
+        next_hops[sub_nodes[pred < 0]] = -9999
+
+        return distances, next_hops
+
+    def routes(self, latitudes, longitudes, zone_polygons=(), hazard=None):
+        """
+        Compute evacuation routes for a batch of origins
+
+        Parameters:
+        - latitudes, longitudes: Origin coordinates
+        - zone_polygons: Iterable of (level, shapely polygon) pairs describing active hazards
+        - hazard: Precomputed per-edge hazard levels, used instead of zone_polygons when given
+
+        Returns:
+        - List of route dictionaries (None for origins with no reachable exit)
+        """
+        if hazard is None:
+            hazard = self.edge_hazard(zone_polygons)
+        distances, next_hops = self.solve(hazard)
+        origins = self.graph.nearest_nodes(latitudes, longitudes)
+
+        # Per-node hazard of the edge towards the next hop, for route safety levels
+        step_hazard = np.zeros(self.graph.node_count, dtype=np.int8)
+        tree_edge = next_hops[self.graph.rows] == self.graph.indices
+        step_hazard[self.graph.rows[tree_edge]] = hazard[tree_edge]
+
+        step_length = np.zeros(self.graph.node_count)
+        step_length[self.graph.rows[tree_edge]] = self.graph.lengths[tree_edge]
+
+        # Walk every origin towards its exit in lockstep, one hop per pass
+        reachable = np.isfinite(distances[origins])
+        steps = [np.where(reachable, origins, -1)]
+        while True:
+            current = steps[-1]
+            nxt = np.where(current >= 0, next_hops[np.maximum(current, 0)], -1)
+            nxt[nxt < 0] = -1
+            if not np.any(nxt >= 0):
+                break
+            steps.append(nxt)
+        paths = np.column_stack(steps)
+        valid = paths >= 0
+        hops = np.where(valid, paths, 0)
+
+        # Totals over the hops of each path (the last node of a path is its exit)
+        moving = valid.copy()
+        moving[:, :-1] &= valid[:, 1:]
+        moving[:, -1] = False
+        lengths = np.where(moving, step_length[hops], 0.0).sum(axis=1)
+        worst = np.where(moving, step_hazard[hops], 0).max(axis=1)
+        node_lats = self.graph.node_lats[hops]
+        node_lons = self.graph.node_lons[hops]
+
+        results = []
+        for i in range(len(origins)):
+            if not reachable[i]:
+                results.append(None)
+                continue
+
+            count = int(valid[i].sum())
+            length = float(lengths[i])
+            results.append({
+                "type": "LineString",
+                "coordinates": np.column_stack([node_lats[i, :count], node_lons[i, :count]]).tolist(),
+                "safetyLevel": "safe" if worst[i] == 0 else "riskyButNecessary",
+                "hazardLevel": HAZARD_LEVELS[int(worst[i])],
+                "distanceMeters": length,
+                "estimatedTimeMinutes": round(length / self.walking_speed / 60, 1)
+            })
+
+        return results
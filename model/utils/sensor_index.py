@@ -0,0 +1,278 @@
+import numpy as np
+import itertools
+import math
+import threading
+import logging
+from utils.geo_utils import haversine_distances
+
+logger = logging.getLogger(__name__)
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111320.0
+
+def _spread_bits(values):
+    """Spread the low 32 bits of each value so that they occupy the even bit positions"""
+    x = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x3333333333333333)
+    x = (x | (x << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return x
+
+def cell_indices(latitudes, longitudes, level):
+    """
+    Get the grid column and row of points at a given level
+
+    Parameters:
+    - latitudes, longitudes: Arrays of coordinates
+    - level: Grid level; the world is split into 2**level x 2**level cells
+
+    Returns:
+    - (ix, iy) integer arrays
+    """
+    n = 1 << level
+    lats = np.asarray(latitudes, dtype=float)
+    lons = np.asarray(longitudes, dtype=float)
+    ix = np.floor((lons + 180.0) / 360.0 * n).astype(np.int64) % n
+    iy = np.clip(np.floor((lats + 90.0) / 180.0 * n).astype(np.int64), 0, n - 1)
+    return ix, iy
+
+def encode_cells(latitudes, longitudes, level):
+    """
+    Encode points as hierarchical cell ids (geohash-style bit interleaving)
+
+    The id of a cell at level L-1 is the id at level L shifted right by two
+    bits, so ids share prefixes exactly like geohash strings do.
+
+    Parameters:
+    - latitudes, longitudes: Arrays of coordinates
+    - level: Grid level (at most 31)
+
+    Returns:
+    - Array of uint64 cell ids
+    """
+    ix, iy = cell_indices(latitudes, longitudes, level)
+    return _interleave(ix, iy)
+
+def _interleave(ix, iy):
+    """Interleave column bits (even positions) and row bits (odd positions)"""
+    return _spread_bits(ix) | (_spread_bits(iy) << np.uint64(1))
+
+class SensorGridIndex:
+    """
+    Spatial index of registered sensor locations.
+
+    Every sensor is assigned a cell id at each level of a hierarchical grid.
+    A radius query picks the finest level whose cells are at least as large as
+    the radius, gathers the sensors of the 3x3 block of cells around the query
+    point, and refines the candidates with a vectorized haversine distance.
+
+    Each level keeps a dictionary of cell id to the rows of the sensors in it,
+    updated in place: registering, moving or removing a sensor only touches
+    that sensor's entries, and a move stops at the first level where the old
+    and new cells agree, since all coarser cells then agree too.
+    """
+
+    def __init__(self, min_level=4, max_level=20):
+        """
+        Initialize an empty index
+
+        Parameters:
+        - min_level: Coarsest grid level kept in the index
+        - max_level: Finest grid level kept in the index (level 20 cells are about 19 m tall)
+        """
+        self.min_level = min_level
+        self.max_level = max_level
+        self._lock = threading.Lock()
+
+        # Sensor rows; arrays grow by doubling and the first _count rows are in use
+        self._rows = {}   # sensor id -> row
+        self._count = 0
+        self._ids = np.empty(0, dtype=object)
+        self._lats = np.empty(0, dtype=float)
+        self._lons = np.empty(0, dtype=float)
+        self._finest = np.empty(0, dtype=np.uint64)  # cell id at max_level; coarser ids are its prefixes
+
+        # Per level, cell id -> set of rows
+        self._cells = {level: {} for level in range(min_level, max_level + 1)}
+
+    def __len__(self):
+        return self._count
+
+    def register(self, sensor_id, latitude, longitude):
+        """
+        Register or move a sensor
+
+        Parameters:
+        - sensor_id: Identifier of the sensor
+        - latitude, longitude: Sensor coordinates
+        """
+        self.register_many([sensor_id], [latitude], [longitude])
+
+    def register_many(self, sensor_ids, latitudes, longitudes):
+        """
+        Register or move many sensors at once
+
+        Parameters:
+        - sensor_ids: Sequence of sensor identifiers
+        - latitudes, longitudes: Sequences of sensor coordinates
+        """
+        lats = np.asarray(latitudes, dtype=float).ravel()
+        lons = np.asarray(longitudes, dtype=float).ravel()
+        finest = encode_cells(lats, lons, self.max_level).tolist()
+
+        with self._lock:
+            for sensor_id, lat, lon, cell in zip(sensor_ids, lats.tolist(), lons.tolist(), finest):
+                self._place(sensor_id, lat, lon, cell)
+
+    def remove(self, sensor_id):
+        """
+        Remove a sensor from the index
+
+        Parameters:
+        - sensor_id: Identifier of the sensor
+
+        Returns:
+        - True if the sensor was registered, False otherwise
+        """
+        with self._lock:
+            row = self._rows.pop(sensor_id, None)
+            if row is None:
+                return False
+            self._unbucket(row, int(self._finest[row]))
+
+            # Fill the hole with the last row so the rows in use stay contiguous
+            last = self._count - 1
+            if row != last:
+                last_cell = int(self._finest[last])
+                self._unbucket(last, last_cell)
+                self._ids[row] = self._ids[last]
+                self._lats[row] = self._lats[last]
+                self._lons[row] = self._lons[last]
+                self._finest[row] = last_cell
+                self._rows[self._ids[row]] = row
+                self._bucket(row, last_cell)
+            self._ids[last] = None
+            self._count = last
+        return True
+
+    def _place(self, sensor_id, lat, lon, cell):
+        """Add or move one sensor (caller holds the lock)"""
+        row = self._rows.get(sensor_id)
+        if row is None:
+            row = self._count
+            if row == len(self._ids):
+                self._grow(max(16, 2 * row))
+            self._rows[sensor_id] = row
+            self._count += 1
+            self._ids[row] = sensor_id
+            self._bucket(row, cell)
+        elif self._lats[row] == lat and self._lons[row] == lon:
+            return
+        else:
+            self._move(row, int(self._finest[row]), cell)
+
+        self._lats[row] = lat
+        self._lons[row] = lon
+        self._finest[row] = cell
+
+    def _grow(self, capacity):
+        """Enlarge the row arrays (caller holds the lock)"""
+        for name in ('_ids', '_lats', '_lons', '_finest'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _level_cells(self, cell):
+        """(level, cell id) pairs of a finest-level cell, finest first"""
+        for level in range(self.max_level, self.min_level - 1, -1):
+            yield level, cell >> (2 * (self.max_level - level))
+
+    def _bucket(self, row, cell):
+        for level, cell_id in self._level_cells(cell):
+            self._cells[level].setdefault(cell_id, set()).add(row)
+
+    def _unbucket(self, row, cell):
+        for level, cell_id in self._level_cells(cell):
+            rows = self._cells[level][cell_id]
+            rows.discard(row)
+            if not rows:
+                del self._cells[level][cell_id]
+
+    def _move(self, row, old_cell, new_cell):
+        """Move a row between cells, up to the first level where they coincide"""
+        for (level, old_id), (_, new_id) in zip(self._level_cells(old_cell), self._level_cells(new_cell)):
+            if old_id == new_id:
+                break
+            table = self._cells[level]
+            table[old_id].discard(row)
+            if not table[old_id]:
+                del table[old_id]
+            table.setdefault(new_id, set()).add(row)
+
+    def _level_for_radius(self, latitude, radius):
+        """Finest indexed level whose cells are at least radius meters in both directions"""
+        # Use the latitude farthest from the equator reachable within the radius
+        lat_extent = min(abs(latitude) + radius / METERS_PER_DEGREE, 89.9)
+        width_factor = math.cos(math.radians(lat_extent))
+
+        for level in range(self.max_level, self.min_level - 1, -1):
+            n = 1 << level
+            cell_height = 180.0 / n * METERS_PER_DEGREE
+            cell_width = 360.0 / n * METERS_PER_DEGREE * width_factor
+            if cell_height >= radius and cell_width >= radius:
+                return level
+        return None
+
+    def _candidates(self, latitude, longitude, radius):
+        """Row indices of sensors in the cells around the point (caller holds the lock)"""
+        level = self._level_for_radius(latitude, radius)
+        if level is None:
+            return np.arange(self._count)
+
+        n = 1 << level
+        ix, iy = cell_indices(latitude, longitude, level)
+        cols = (int(ix) + np.array([-1, 0, 1])) % n
+        rows = np.clip(int(iy) + np.array([-1, 0, 1]), 0, n - 1)
+        neighbour_ids = np.unique(_interleave(np.repeat(cols, 3), np.tile(rows, 3)))
+
+        table = self._cells[level]
+        groups = [table[cell_id] for cell_id in neighbour_ids.tolist() if cell_id in table]
+        return np.fromiter(itertools.chain.from_iterable(groups), dtype=np.int64)
+
+    def nearby(self, latitude, longitude, radius):
+        """
+        Find the sensors within a radius of a point
+
+        Parameters:
+        - latitude, longitude: Query coordinates
+        - radius: Search radius in meters
+
+        Returns:
+        - List of dictionaries with sensor id, coordinates and distance, nearest first
+        """
+        # Copy the candidates out under the lock; the rows change in place
+        with self._lock:
+            if not self._count:
+                return []
+            candidates = self._candidates(latitude, longitude, radius)
+            ids, lats, lons = self._ids[candidates], self._lats[candidates], self._lons[candidates]
+
+        if len(candidates) == 0:
+            return []
+
+        distances = haversine_distances(latitude, longitude, lats, lons)
+        within = np.flatnonzero(distances <= radius)
+        order = within[np.argsort(distances[within])]
+
+        return [
+            {
+                'sensor_id': ids[i],
+                'latitude': float(lats[i]),
+                'longitude': float(lons[i]),
+                'distance': float(distances[i])
+            }
+            for i in order
+        ]
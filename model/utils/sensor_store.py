@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+import os
+import glob
+import re
+import time
+import zlib
+import threading
+import logging
+from config import Config
+from models.preprocessing import SENSOR_VALID_RANGES
+
+logger = logging.getLogger(__name__)
+
+# Fixed-layout little-endian record for bulk sensor uploads (52 bytes, no padding)
+SENSOR_RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),   # seconds since the epoch
+    ('sensor_id', '<u4'),
+    ('mq2', '<f4'),
+    ('mq4', '<f4'),
+    ('mq6', '<f4'),
+    ('mq8', '<f4'),
+    ('temperature', '<f4'),
+    ('humidity', '<f4'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8')
+])
+
+SENSOR_COLUMNS = list(SENSOR_VALID_RANGES)
+
+def decode_sensor_records(payload):
+    """
+    View a binary upload as an array of sensor records without copying it
+
+    Parameters:
+    - payload: bytes-like object holding consecutive SENSOR_RECORD_DTYPE records
+
+    Returns:
+    - Read-only structured array backed by the payload
+    """
+    if len(payload) % SENSOR_RECORD_DTYPE.itemsize:
+        raise ValueError(f"Payload size {len(payload)} is not a multiple of the "
+                         f"{SENSOR_RECORD_DTYPE.itemsize}-byte record size")
+    return np.frombuffer(payload, dtype=SENSOR_RECORD_DTYPE)
+
+def validate_sensor_records(records):
+    """
+    Apply the clean_sensor_data rules to sensor records
+
+    Out-of-range readings become NaN and records left with fewer than half of
+    their readings valid are rejected, as clean_sensor_data does for frames.
+
+    Parameters:
+    - records: Structured array of SENSOR_RECORD_DTYPE records
+
+    Returns:
+    - (columns, accepted) where columns maps field names to arrays of the
+      accepted records and accepted is the boolean mask over the input
+    """
+    valid = np.empty((len(SENSOR_COLUMNS), len(records)), dtype=bool)
+    for i, (column, (min_val, max_val)) in enumerate(SENSOR_VALID_RANGES.items()):
+        values = records[column]
+        # NaN fails both comparisons, so missing readings count as invalid
+        np.logical_and(values >= min_val, values <= max_val, out=valid[i])
+
+    accepted = valid.sum(axis=0) >= len(SENSOR_COLUMNS) // 2
+    accepted &= np.isfinite(records['timestamp'])
+
+    columns = {}
+    for name in SENSOR_RECORD_DTYPE.names:
+        values = records[name][accepted]
+        if name in SENSOR_VALID_RANGES:
+            values[~valid[SENSOR_COLUMNS.index(name)][accepted]] = np.nan
+        columns[name] = values
+
+    return columns, accepted
+
+def sensor_record_id(sensor_id):
+    """Numeric id of a sensor in records: numeric ids as is, others hashed into the 32-bit id space"""
+    try:
+        return int(sensor_id)
+    except (TypeError, ValueError):
+        return zlib.crc32(str(sensor_id).encode())
+
+def reading_to_record(data):
+    """
+    Convert a JSON sensor reading into a single-record array
+
+    Parameters:
+    - data: Dictionary as posted to /sensors/data
+
+    Returns:
+    - Structured array holding one SENSOR_RECORD_DTYPE record
+    """
+    record = np.zeros(1, dtype=SENSOR_RECORD_DTYPE)
+    record['timestamp'] = data.get('timestamp', time.time())
+
+    record['sensor_id'] = sensor_record_id(data.get('sensor_id', data.get('sensorId', 0)))
+
+    for column in SENSOR_COLUMNS:
+        value = data.get(column, data.get(f"{column}_reading"))
+        record[column] = np.nan if value is None else value
+
+    location = data.get('location')
+    if isinstance(location, list) and len(location) == 2:
+        latitude, longitude = location
+    elif isinstance(location, dict):
+        latitude, longitude = location.get('latitude'), location.get('longitude')
+    else:
+        latitude, longitude = data.get('latitude'), data.get('longitude')
+    record['latitude'] = np.nan if latitude is None else latitude
+    record['longitude'] = np.nan if longitude is None else longitude
+
+    return record
+
+def columns_to_records(columns):
+    """
+    Pack column arrays into SENSOR_RECORD_DTYPE records
+
+    Parameters:
+    - columns: Dictionary of equal-length arrays keyed by field name
+
+    Returns:
+    - Structured array of records
+    """
+    records = np.empty(len(columns['timestamp']), dtype=SENSOR_RECORD_DTYPE)
+    for name in SENSOR_RECORD_DTYPE.names:
+        records[name] = columns[name]
+    return records
+
+class HistoricalStore:
+    """
+    Append-only columnar store of sensor readings.
+
+    Each append is written as one segment file holding a contiguous array per
+    column, so reads load whole columns with no per-row parsing. Segments are
+    named in append order and read back in that order.
+    """
+
+    def __init__(self, directory=None):
+        """
+        Open (or create) a store
+
+        Parameters:
+        - directory: Directory holding the segment files
+        """
+        self.directory = directory or Config.SENSOR_STORE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Continue after the highest numbered segment; counting the segments
+        # would reuse a number written explicitly or left by a removed segment
+        numbers = [int(match.group(1)) for match in
+                   (re.fullmatch(r'segment-(\d+)\.npz', os.path.basename(path)) for path in self._segments())
+                   if match]
+        self._next_segment = max(numbers) + 1 if numbers else 0
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'segment-*.npz')))
+
+    def append(self, columns, segment=None):
+        """
+        Append readings to the store
+
+        Parameters:
+        - columns: Dictionary of equal-length arrays keyed by SENSOR_RECORD_DTYPE field name
+        - segment: Name for the segment; appending again under the same name replaces it
+
+        Returns:
+        - Number of readings appended
+        """
+        count = len(columns['timestamp'])
+        if count == 0:
+            return 0
+
+        arrays = {name: np.ascontiguousarray(columns[name], dtype=SENSOR_RECORD_DTYPE[name].newbyteorder('='))
+                  for name in SENSOR_RECORD_DTYPE.names}
+
+        with self._lock:
+            if segment is None:
+                segment = f"{self._next_segment:08d}"
+                self._next_segment += 1
+            path = os.path.join(self.directory, f"segment-{segment}.npz")
+
+            # Write under a temporary name so readers never see a partial segment
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+        logger.info(f"Appended {count} readings to {path}")
+        return count
+
+    def read(self, columns=None):
+        """
+        Read stored readings
+
+        Parameters:
+        - columns: Field names to read (all fields if None)
+
+        Returns:
+        - Dictionary of arrays keyed by field name
+        """
+        names = columns or list(SENSOR_RECORD_DTYPE.names)
+        parts = {name: [] for name in names}
+        for path in self._segments():
+            with np.load(path) as segment:
+                for name in names:
+                    parts[name].append(segment[name])
+
+        return {
+            name: np.concatenate(chunks) if chunks else np.zeros(0, dtype=SENSOR_RECORD_DTYPE[name])
+            for name, chunks in parts.items()
+        }
+
+    def to_frame(self, columns=None):
+        """
+        Read stored readings into a DataFrame
+
+        Parameters:
+        - columns: Field names to read (all fields if None)
+
+        Returns:
+        - DataFrame with one row per reading
+        """
+        return pd.DataFrame(self.read(columns))
@@ -0,0 +1,169 @@
+import queue
+import random
+import threading
+import time
+import logging
+from collections import deque
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept for percentiles; older ones are discarded
+LATENCY_WINDOW = 2048
+
+class ShadowScorer:
+    """
+    Scores a sample of live readings with a candidate threat model.
+
+    The request thread only draws a random number and, for sampled
+    readings, puts them on a bounded queue without blocking; a reading that
+    does not fit is dropped and counted. A fixed pool of worker threads
+    drains the queue, runs the candidate and compares its answer with the
+    one the primary model gave, so the candidate never holds up a response.
+    """
+
+    def __init__(self, sample_rate=None, workers=None, queue_size=None):
+        """
+        Initialize the scorer (idle until a candidate is started)
+
+        Parameters:
+        - sample_rate: Fraction of submitted readings scored by the candidate
+        - workers: Worker threads running the candidate
+        - queue_size: Readings waiting for a worker beyond which new ones are dropped
+        """
+        self.sample_rate = Config.SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.workers = workers or Config.SHADOW_WORKERS
+        self._queue = queue.Queue(maxsize=queue_size or Config.SHADOW_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._candidate = None   # (version, model)
+        self._threads = []
+        self._reset()
+
+    def _reset(self):
+        self._started = None
+        self._counts = {'sampled': 0, 'dropped': 0, 'scored': 0, 'agreed': 0, 'failed': 0}
+        self._levels = {}        # (primary level, candidate level) -> count
+        self._delta_sum = 0.0
+        self._abs_delta_sum = 0.0
+        self._max_abs_delta = 0.0
+        self._primary_latencies = deque(maxlen=LATENCY_WINDOW)
+        self._candidate_latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self, model, version, sample_rate=None):
+        """
+        Shadow a candidate model, replacing the current one and its statistics
+
+        Parameters:
+        - model: Candidate ThreatModel
+        - version: Label of the candidate in the statistics
+        - sample_rate: Fraction of readings to score (keeps the current rate if None)
+        """
+        with self._lock:
+            self._candidate = (version, model)
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            self._reset()
+            self._started = time.time()
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'shadow-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Shadow scoring threat model version {version} on {self.sample_rate:.0%} of readings")
+
+    def stop(self):
+        """Stop shadowing; queued readings are discarded"""
+        with self._lock:
+            version = self._candidate[0] if self._candidate else None
+            self._candidate = None
+        if version is not None:
+            logger.info(f"Stopped shadow scoring threat model version {version}")
+
+    def submit(self, readings, primary_result, primary_latency):
+        """
+        Offer a reading scored by the primary model; never blocks
+
+        Parameters:
+        - readings: Keyword arguments of ThreatModel.predict
+        - primary_result: What the primary model returned for them
+        - primary_latency: Seconds the primary model took
+
+        Returns:
+        - True if the reading was queued for the candidate
+        """
+        candidate = self._candidate
+        if candidate is None or random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait((candidate, readings, primary_result, primary_latency))
+        except queue.Full:
+            with self._lock:
+                self._counts['dropped'] += 1
+            return False
+        with self._lock:
+            self._counts['sampled'] += 1
+        return True
+
+    def _work(self):
+        while True:
+            candidate, readings, primary_result, primary_latency = self._queue.get()
+            if candidate is not self._candidate:
+                continue  # queued before the candidate was stopped or replaced
+
+            version, model = candidate
+            start = time.perf_counter()
+            try:
+                result = model.predict(**readings)
+            except Exception as e:
+                logger.error(f"Shadow threat model version {version} failed: {str(e)}")
+                with self._lock:
+                    if candidate is self._candidate:
+                        self._counts['failed'] += 1
+                continue
+            latency = time.perf_counter() - start
+
+            delta = result['risk_score'] - primary_result['risk_score']
+            levels = (primary_result['risk_level'], result['risk_level'])
+            with self._lock:
+                if candidate is not self._candidate:
+                    continue
+                self._counts['scored'] += 1
+                self._counts['agreed'] += levels[0] == levels[1]
+                self._levels[levels] = self._levels.get(levels, 0) + 1
+                self._delta_sum += delta
+                self._abs_delta_sum += abs(delta)
+                self._max_abs_delta = max(self._max_abs_delta, abs(delta))
+                self._primary_latencies.append(primary_latency)
+                self._candidate_latencies.append(latency)
+
+    def stats(self):
+        """
+        Report how the candidate compares with the primary model
+
+        Returns:
+        - Dictionary with the candidate version, sampling counters, risk level agreement
+          and transitions, risk score deltas (candidate minus primary) and the
+          p50/p99 latencies in milliseconds of both models on the scored readings
+        """
+        with self._lock:
+            scored = self._counts['scored']
+            stats = {
+                'version': self._candidate[0] if self._candidate else None,
+                'sample_rate': self.sample_rate,
+                'started': self._started,
+                'queued': self._queue.qsize(),
+                **self._counts,
+                'agreement': self._counts['agreed'] / scored if scored else None,
+                'risk_level_transitions': {f'{primary}->{candidate}': count
+                                           for (primary, candidate), count in sorted(self._levels.items())},
+                'mean_risk_delta': self._delta_sum / scored if scored else None,
+                'mean_abs_risk_delta': self._abs_delta_sum / scored if scored else None,
+                'max_abs_risk_delta': self._max_abs_delta
+            }
+            latencies = {'primary': np.array(self._primary_latencies), 'candidate': np.array(self._candidate_latencies)}
+
+        for name, values in latencies.items():
+            stats[f'{name}_latency_ms'] = ({'p50': float(np.percentile(values, 50) * 1000),
+                                            'p99': float(np.percentile(values, 99) * 1000)}
+                                           if len(values) else None)
+        return stats
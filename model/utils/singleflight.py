@@ -0,0 +1,67 @@
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls with the same key.
+
+    The first caller for a key runs the computation; callers arriving while it
+    is in flight wait for it and receive the same result (or exception).
+    Nothing is kept once the computation finishes, so this only removes
+    duplicate work during bursts and never serves an outdated result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._shared = 0
+
+    def do(self, key, fn):
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Parameters:
+        - key: Hashable key identifying the computation
+        - fn: Function without arguments performing the computation
+
+        Returns:
+        - (result, shared) where shared is True if the result came from another caller's computation
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+            else:
+                self._shared += 1
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn()
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+        return call['result'], False
+
+    def stats(self):
+        """
+        Report in-flight computations and how many calls were deduplicated
+
+        Returns:
+        - Dictionary with in_flight and shared counts
+        """
+        with self._lock:
+            return {"in_flight": len(self._calls), "shared": self._shared}
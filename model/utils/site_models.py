@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from config import Config
+from utils.singleflight import SingleFlight
+from models.cascade import model_nbytes
+
+logger = logging.getLogger(__name__)
+
+class SiteModelCache:
+    """
+    Per-site models loaded on demand into a memory-bounded LRU cache.
+
+    Each site may have its own model directory under the site model
+    directory. A site's model is loaded the first time a request needs it;
+    concurrent requests for a site that is still loading wait on that one
+    load. Once the models in memory exceed the byte budget, the least
+    recently used sites are evicted, except pinned ones, which stay loaded
+    (and count against the budget) until unpinned. Sites without a model of
+    their own get None, so callers fall back to the global model; that
+    answer is remembered for a short TTL so such requests skip the
+    filesystem check.
+    """
+
+    def __init__(self, load, directory=None, max_bytes=None, pinned=None, artifact='threat_model.joblib',
+                 negative_ttl=None, max_negative=1024):
+        """
+        Initialize the cache
+
+        Parameters:
+        - load: Function building a model from an artifact path
+        - directory: Directory holding one subdirectory per site
+        - max_bytes: Memory budget of the cached models
+        - pinned: Sites never evicted
+        - artifact: File name of the model in each site directory
+        - negative_ttl: Seconds a site found without a model is answered None without checking again
+        - max_negative: Sites remembered without a model (oldest are forgotten first)
+        """
+        self.load = load
+        self.directory = directory or Config.SITE_MODEL_DIR
+        self.max_bytes = max_bytes or Config.SITE_MODEL_CACHE_BYTES
+        self.artifact = artifact
+        self.pinned = set(Config.SITE_MODEL_PINNED if pinned is None else pinned)
+        self.negative_ttl = negative_ttl if negative_ttl is not None else Config.SITE_MODEL_NEGATIVE_TTL
+        self.max_negative = max_negative
+
+        self._lock = threading.Lock()
+        self._models = OrderedDict()   # site -> (model, nbytes), least recently used first
+        self._bytes = 0
+        self._missing = OrderedDict()  # site -> time it was found without a model, oldest first
+        self._loads = SingleFlight()
+        self._counts = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'loads': 0, 'evictions': 0, 'failures': 0}
+
+    def path(self, site_id):
+        """Artifact path of a site's model (None for ids that are not plain directory names)"""
+        site = str(site_id)
+        if site in ('', '.', '..') or os.path.basename(site) != site:
+            return None
+        return os.path.join(self.directory, site, self.artifact)
+
+    def get(self, site_id):
+        """
+        Model of a site, loading it if needed
+
+        Parameters:
+        - site_id: Site key
+
+        Returns:
+        - The site's model, or None if the site has no model of its own
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._models.get(site_id)
+            if entry is not None:
+                self._models.move_to_end(site_id)
+                self._counts['hits'] += 1
+                return entry[0]
+            missing_since = self._missing.get(site_id)
+            if missing_since is not None and now - missing_since < self.negative_ttl:
+                self._counts['negative_hits'] += 1
+                return None
+
+        path = self.path(site_id)
+        if path is None or not os.path.exists(path):
+            if self.negative_ttl > 0:
+                with self._lock:
+                    self._missing.pop(site_id, None)
+                    self._missing[site_id] = now
+                    while len(self._missing) > self.max_negative:
+                        self._missing.popitem(last=False)
+            return None
+
+        with self._lock:
+            self._counts['misses'] += 1
+        model, _ = self._loads.do(site_id, lambda: self._load(site_id, path))
+        return model
+
+    def _load(self, site_id, path):
+        with self._lock:
+            entry = self._models.get(site_id)
+        if entry is not None:
+            return entry[0]  # loaded by a call that finished just before this one started
+
+        try:
+            model = self.load(path)
+            nbytes = model_nbytes(model)
+        except Exception as e:
+            with self._lock:
+                self._counts['failures'] += 1
+            logger.error(f"Failed to load model of site {site_id}: {str(e)}")
+            raise
+
+        with self._lock:
+            self._models[site_id] = (model, nbytes)
+            self._bytes += nbytes
+            self._counts['loads'] += 1
+            self._evict(keep=site_id)
+        logger.info(f"Loaded model of site {site_id} ({nbytes / 1e6:.1f} MB)")
+        return model
+
+    def _evict(self, keep):
+        """Drop least recently used unpinned sites until the cache fits its budget (lock held)"""
+        for site_id in list(self._models):
+            if self._bytes <= self.max_bytes:
+                break
+            if site_id == keep or site_id in self.pinned:
+                continue
+            _, nbytes = self._models.pop(site_id)
+            self._bytes -= nbytes
+            self._counts['evictions'] += 1
+            logger.info(f"Evicted model of site {site_id}")
+        if self._bytes > self.max_bytes:
+            logger.warning(f"Site models use {self._bytes / 1e6:.1f} MB, over the "
+                           f"{self.max_bytes / 1e6:.1f} MB budget, because of pinned sites")
+
+    def pin(self, site_id):
+        """Keep a site's model loaded once it is loaded"""
+        with self._lock:
+            self.pinned.add(site_id)
+
+    def unpin(self, site_id):
+        """Make a site's model evictable again"""
+        with self._lock:
+            self.pinned.discard(site_id)
+            self._evict(keep=None)
+
+    def invalidate(self, site_id):
+        """Drop a site's model, or its absence, so the next request checks again (after retraining)"""
+        with self._lock:
+            self._missing.pop(site_id, None)
+            entry = self._models.pop(site_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def stats(self):
+        """
+        Report the cache contents and counters
+
+        Returns:
+        - Dictionary with the cached sites (most recently used last), pinned sites,
+          bytes used and budget, sites remembered without a model, and hit, negative hit,
+          miss, load, eviction and failure counts
+        """
+        with self._lock:
+            return {
+                'sites': list(self._models),
+                'pinned': sorted(self.pinned),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'missing_sites': len(self._missing),
+                **self._counts,
+                'coalesced_loads': self._loads.stats()['shared']
+            }
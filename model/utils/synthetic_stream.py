@@ -0,0 +1,218 @@
+import numpy as np
+import logging
+from scipy.signal import lfilter
+from models.preprocessing import FEATURE_DTYPE
+
+logger = logging.getLogger(__name__)
+
+GAS_SENSORS = ['mq2', 'mq4', 'mq6', 'mq8']
+
+# Typical clean-air readings (ppm) and the relative response of each sensor to a leak
+BASELINE_MEAN = np.array([500.0, 300.0, 400.0, 200.0])
+BASELINE_STD = np.array([100.0, 80.0, 90.0, 50.0])
+LEAK_RESPONSE = np.array([1.0, 0.8, 0.9, 0.5])
+
+# Sensor fault kinds
+FAULT_DROPOUT, FAULT_STUCK, FAULT_SPIKE = 0, 1, 2
+
+class SyntheticSensorStream:
+    """
+    Seeded generator of realistic multi-location sensor time series.
+
+    Every location reports once per interval. Gas readings combine a per-site
+    baseline, slow random-walk drift and noise; leaks start at random, ramp up,
+    hold and stop, raising all gas sensors (and slightly the temperature);
+    sensor faults drop readings, freeze them or produce out-of-range spikes.
+    Wind follows a mean-reverting process per location. All of it is computed
+    for a whole chunk of time steps at once into preallocated arrays, and the
+    state carried between chunks makes consecutive chunks one continuous series.
+    """
+
+    def __init__(self, n_locations=50, interval=5.0, start_time=1704067200.0, seed=None,
+                 leak_rate=1e-4, leak_duration=(60, 720), leak_peak=(1000.0, 8000.0),
+                 fault_rate=5e-5, fault_duration=(1, 120), drift_std=0.5,
+                 origin=(28.6139, 77.2090), spread=0.05):
+        """
+        Initialize the stream
+
+        Parameters:
+        - n_locations: Number of sensor locations
+        - interval: Seconds between readings of a location
+        - start_time: Timestamp of the first reading (seconds since the epoch)
+        - seed: Seed of the numpy random Generator
+        - leak_rate: Probability per reading that a leak starts at a location
+        - leak_duration: Range of leak durations in readings
+        - leak_peak: Range of peak leak concentrations added to the gas readings (ppm)
+        - fault_rate: Probability per reading that a sensor fault starts at a location
+        - fault_duration: Range of fault durations in readings
+        - drift_std: Standard deviation of the per-reading baseline drift (ppm)
+        - origin: Center of the site (latitude, longitude)
+        - spread: Spread of locations around the origin in degrees
+        """
+        self.rng = np.random.default_rng(seed)
+        self.n_locations = n_locations
+        self.interval = interval
+        self.start_time = start_time
+        self.leak_rate = leak_rate
+        self.leak_duration = leak_duration
+        self.leak_peak = leak_peak
+        self.fault_rate = fault_rate
+        self.fault_duration = fault_duration
+        self.drift_std = drift_std
+
+        rng = self.rng
+        self.latitude = origin[0] + rng.normal(0, spread, n_locations)
+        self.longitude = origin[1] + rng.normal(0, spread, n_locations)
+        self.baseline = BASELINE_MEAN + rng.normal(0, 0.3, (n_locations, 4)) * BASELINE_STD
+        self.base_temperature = rng.normal(25, 3, n_locations)
+        self.base_humidity = rng.normal(60, 8, n_locations)
+        self.mean_wind = rng.uniform(1, 8, n_locations)
+        self.prevailing_direction = rng.uniform(0, 360, n_locations)
+
+        # State carried from one chunk to the next
+        self.step = 0
+        self._drift = np.zeros((n_locations, 4))
+        self._wind_state = np.zeros(n_locations)
+        self._direction_state = np.zeros(n_locations)
+        self._leak_start = np.full(n_locations, -np.inf)
+        self._leak_length = np.zeros(n_locations)
+        self._leak_height = np.zeros(n_locations)
+        self._fault_start = np.full(n_locations, -np.inf)
+        self._fault_length = np.zeros(n_locations)
+        self._fault_kind = np.zeros(n_locations, dtype=np.int64)
+        self._fault_sensor = np.zeros(n_locations, dtype=np.int64)
+        self._fault_value = np.zeros(n_locations)
+
+    def _latest_event(self, onset, steps, previous_start, *attributes):
+        """
+        Carry the most recent event forward along the time axis
+
+        Parameters:
+        - onset: (steps, locations) boolean array of event starts in this chunk
+        - steps: Absolute step index of each row
+        - previous_start: Start step of the event active at the end of the last chunk
+        - attributes: Pairs of (per-onset values of shape (steps, locations), previous value)
+
+        Returns:
+        - Start step and the attribute values of the latest event at each (step, location)
+        """
+        rows = np.where(onset, steps[:, None], -1)
+        latest_row = np.maximum.accumulate(rows, axis=0)
+        has_new = latest_row >= 0
+        row_index = np.maximum(latest_row - steps[0], 0).astype(np.int64)
+        columns = np.arange(onset.shape[1])
+
+        start = np.where(has_new, latest_row, previous_start)
+        values = [np.where(has_new, new[row_index, columns], old) for new, old in attributes]
+        return start, values
+
+    def next_chunk(self, n_steps):
+        """
+        Generate the next n_steps readings of every location
+
+        Parameters:
+        - n_steps: Number of time steps
+
+        Returns:
+        - Dictionary of flat arrays with n_steps * n_locations rows, ordered by time
+          then location: timestamp, sensor_id, latitude, longitude, mq2, mq4, mq6,
+          mq8, temperature, humidity, wind_speed, wind_direction, threat_level
+        """
+        rng = self.rng
+        n = self.n_locations
+        steps = self.step + np.arange(n_steps)
+        shape = (n_steps, n)
+
+        # Baseline drift: random walk continued from the previous chunk
+        drift = np.cumsum(rng.normal(0, self.drift_std, (n_steps, n, 4)), axis=0) + self._drift
+        gas = self.baseline + drift
+        gas += rng.normal(0, 1, (n_steps, n, 4)) * (0.1 * BASELINE_STD)
+
+        # Leaks: latest onset per location, ramping up over a tenth of their duration
+        onset = rng.random(shape) < self.leak_rate
+        length = rng.integers(*self.leak_duration, size=shape).astype(np.float64)
+        height = rng.uniform(*self.leak_peak, size=shape)
+        leak_start, (leak_length, leak_height) = self._latest_event(
+            onset, steps, self._leak_start, (length, self._leak_length), (height, self._leak_height))
+        age = steps[:, None] - leak_start
+        ramp = np.clip((age + 1) / np.maximum(0.1 * leak_length, 1), 0, 1)
+        intensity = np.where(age < leak_length, leak_height * ramp, 0.0)
+        gas += intensity[:, :, None] * LEAK_RESPONSE
+
+        # Temperature and humidity: daily cycle, noise and a little heat from leaks
+        hour_angle = 2 * np.pi * (self.start_time + steps * self.interval) / 86400.0
+        daily = np.sin(hour_angle)[:, None]
+        temperature = self.base_temperature + 5 * daily + rng.normal(0, 0.5, shape) + intensity * 0.002
+        humidity = np.clip(self.base_humidity - 10 * daily + rng.normal(0, 2, shape), 0, 100)
+
+        # Wind: mean-reverting speed and direction per location
+        wind_noise = rng.normal(0, 0.5, shape)
+        wind, self._wind_state = self._ar1(wind_noise, self._wind_state, 0.98)
+        wind_speed = np.maximum(self.mean_wind + wind, 0.0)
+        direction_noise = rng.normal(0, 5, shape)
+        direction, self._direction_state = self._ar1(direction_noise, self._direction_state, 0.995)
+        wind_direction = (self.prevailing_direction + direction) % 360
+
+        # Sensor faults on one gas sensor per fault
+        onset = rng.random(shape) < self.fault_rate
+        length = rng.integers(*self.fault_duration, size=shape).astype(np.float64)
+        kind = rng.integers(0, 3, size=shape)
+        sensor = rng.integers(0, 4, size=shape)
+        value = gas[np.arange(n_steps)[:, None], np.arange(n), sensor]
+        fault_start, (fault_length, fault_kind, fault_sensor, fault_value) = self._latest_event(
+            onset, steps, self._fault_start, (length, self._fault_length), (kind, self._fault_kind),
+            (sensor, self._fault_sensor), (value, self._fault_value))
+        faulty = steps[:, None] - fault_start < fault_length
+        t_index, l_index = np.nonzero(faulty)
+        s_index = fault_sensor[t_index, l_index]
+        replacement = np.select(
+            [fault_kind[t_index, l_index] == FAULT_DROPOUT, fault_kind[t_index, l_index] == FAULT_STUCK],
+            [np.nan, fault_value[t_index, l_index]],
+            -1.0
+        )
+        gas[t_index, l_index, s_index] = replacement
+
+        # Save state for the next chunk
+        self._drift = drift[-1]
+        self._leak_start, self._leak_length, self._leak_height = leak_start[-1], leak_length[-1], leak_height[-1]
+        self._fault_start, self._fault_length = fault_start[-1], fault_length[-1]
+        self._fault_kind, self._fault_sensor, self._fault_value = fault_kind[-1], fault_sensor[-1], fault_value[-1]
+        self.step += n_steps
+
+        chunk = {
+            'timestamp': np.repeat(self.start_time + steps * self.interval, n),
+            'sensor_id': np.tile(np.arange(n, dtype=np.uint32), n_steps),
+            'latitude': np.tile(self.latitude, n_steps),
+            'longitude': np.tile(self.longitude, n_steps)
+        }
+        for i, sensor_name in enumerate(GAS_SENSORS):
+            chunk[sensor_name] = gas[:, :, i].astype(FEATURE_DTYPE).ravel()
+        chunk['temperature'] = temperature.astype(FEATURE_DTYPE).ravel()
+        chunk['humidity'] = humidity.astype(FEATURE_DTYPE).ravel()
+        chunk['wind_speed'] = wind_speed.astype(FEATURE_DTYPE).ravel()
+        chunk['wind_direction'] = wind_direction.astype(FEATURE_DTYPE).ravel()
+        chunk['threat_level'] = (intensity > 0.5 * self.leak_peak[0]).astype(np.int8).ravel()
+        return chunk
+
+    def _ar1(self, noise, state, phi):
+        """Filter noise through x[t] = phi * x[t-1] + noise[t] along time, starting from state"""
+        filtered, final = lfilter([1.0], [1.0, -phi], noise, axis=0, zi=(phi * state)[None, :])
+        return filtered, final[0] / phi
+
+    def chunks(self, n_rows, chunk_rows=1000000):
+        """
+        Stream readings in chunks
+
+        Parameters:
+        - n_rows: Total number of readings (rounded up to whole time steps)
+        - chunk_rows: Approximate number of readings per chunk
+
+        Yields:
+        - Dictionaries of column arrays as returned by next_chunk
+        """
+        total_steps = -(-n_rows // self.n_locations)
+        steps_per_chunk = max(1, chunk_rows // self.n_locations)
+        while total_steps > 0:
+            n_steps = min(steps_per_chunk, total_steps)
+            yield self.next_chunk(n_steps)
+            total_steps -= n_steps
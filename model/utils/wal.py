@@ -0,0 +1,302 @@
+import os
+import glob
+import fcntl
+import struct
+import threading
+import time
+import zlib
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Frame header: payload length and CRC32 of the payload, little-endian
+FRAME_HEADER = struct.Struct('<II')
+
+def read_frames(path):
+    """
+    Read the intact frames of a log segment
+
+    Reading stops at the first truncated or corrupt frame, which is where a
+    crash interrupted the last write.
+
+    Parameters:
+    - path: Path of the segment file
+
+    Returns:
+    - (payloads, valid_size) with the frame payloads and the byte length of the intact prefix
+    """
+    payloads = []
+    offset = 0
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        payloads.append(payload)
+        offset = start + length
+
+    return payloads, offset
+
+class WriteAheadLog:
+    """
+    Durable append-only log with group commit.
+
+    Appends are written to the active segment immediately but acknowledged
+    only after an fsync, which a background flusher issues every
+    flush_interval seconds or as soon as flush_records frames are waiting, so
+    one fsync covers every append made in between. Segments are rotated by
+    size; closed segments are handed to a compaction callback in order and
+    deleted once it succeeds. Intact frames left over from a previous run are
+    recovered on startup and compacted like any other closed segment. The
+    fsync itself runs outside the log lock, so appends continue while it is
+    in progress.
+    """
+
+    def __init__(self, compact, directory=None, flush_interval=None, flush_records=None,
+                 segment_bytes=None, compact_interval=None):
+        """
+        Open the log, recover leftover segments and start the background threads
+
+        Parameters:
+        - compact: Function taking the frame payloads and the name of a closed segment;
+          it must be idempotent per segment name since a crash can repeat it
+        - directory: Directory of the log; each open log writes to its own writer subdirectory
+        - flush_interval: Maximum seconds between fsyncs
+        - flush_records: Pending frames that trigger an immediate fsync
+        - segment_bytes: Size after which the active segment is closed
+        - compact_interval: Seconds between compaction passes
+        """
+        self.compact = compact
+        self.flush_interval = flush_interval if flush_interval is not None else Config.WAL_FLUSH_INTERVAL
+        self.flush_records = flush_records or Config.WAL_FLUSH_RECORDS
+        self.segment_bytes = segment_bytes or Config.WAL_SEGMENT_BYTES
+        self.compact_interval = compact_interval if compact_interval is not None else Config.WAL_COMPACT_INTERVAL
+        self.directory, self._dir_lock = self._claim(directory or Config.WAL_DIR)
+
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._pending = threading.Condition(self._lock)
+        self._sync_lock = threading.Lock()   # serializes fsyncs; taken before self._lock
+        self._compact_lock = threading.Lock()
+        self._written = 0     # frames written to the active file
+        self._synced = 0      # frames known to be on disk
+        self._closed = False
+
+        # Segment numbers keep increasing across restarts (they also name the
+        # compacted output), so a fresh log starts from the current time in ms
+        segments = self._segments()
+        self._recover(segments)
+        self._segment = self._segment_number(segments[-1]) + 1 if segments else int(time.time() * 1000)
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._size = 0
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='wal-flusher', daemon=True)
+        self._flusher.start()
+        self._compactor = threading.Thread(target=self._compact_loop, name='wal-compactor', daemon=True)
+        self._compactor.start()
+
+    def _claim(self, base):
+        """
+        Lock a writer directory of the log for this process
+
+        Every process appending to the log (gunicorn workers, the debug
+        reloader) gets its own writer directory, held with an exclusive flock
+        for as long as the log is open, so segment numbers never collide and
+        no compactor touches another live writer's segments. A directory left
+        by a process that died is taken over, with its segments, by the next
+        log that opens.
+
+        Parameters:
+        - base: Directory of the log
+
+        Returns:
+        - (writer directory, open lock file)
+        """
+        slot = 0
+        while True:
+            directory = os.path.join(base, f"writer-{slot}")
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, 'LOCK'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                slot += 1
+                continue
+            return directory, lock_file
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"wal-{number:016d}.log")
+
+    def _segment_number(self, path):
+        return int(os.path.splitext(os.path.basename(path))[0][4:])
+
+    def _segment_name(self, path):
+        """Name of a segment, unique across writer directories"""
+        directory, name = os.path.split(path)
+        return f"{os.path.basename(directory)}-{os.path.splitext(name)[0]}"
+
+    def _segments(self, directory=None):
+        return sorted(glob.glob(os.path.join(directory or self.directory, 'wal-*.log')))
+
+    def _recover(self, segments):
+        """Cut torn writes off the segments left by a previous run"""
+        for path in segments:
+            payloads, valid_size = read_frames(path)
+            if valid_size < os.path.getsize(path):
+                logger.warning(f"Truncating torn write at byte {valid_size} of {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_size)
+                    f.flush()
+                    os.fsync(f.fileno())
+            if payloads:
+                logger.info(f"Recovered {len(payloads)} frames from {path}")
+
+    def append(self, payload, wait=True):
+        """
+        Append one frame to the log
+
+        Parameters:
+        - payload: Bytes to store
+        - wait: Block until the frame is on disk
+
+        Returns:
+        - Sequence number of the frame
+        """
+        frame = FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write-ahead log is closed")
+
+            self._file.write(frame)
+            self._size += len(frame)
+            self._written += 1
+            sequence = self._written
+
+            if self._written - self._synced >= self.flush_records:
+                self._pending.notify()
+
+            if wait:
+                while self._synced < sequence and not self._closed:
+                    self._flushed.wait()
+
+        return sequence
+
+    def _sync(self):
+        """fsync everything written so far, holding the log lock only to flush the write buffer"""
+        with self._sync_lock:
+            with self._lock:
+                if self._closed or self._written == self._synced:
+                    return
+                self._file.flush()
+                sequence = self._written
+                fd = self._file.fileno()
+            os.fsync(fd)
+            self._publish(sequence)
+
+    def _publish(self, sequence):
+        """Acknowledge the frames up to a sequence number as on disk"""
+        with self._lock:
+            if sequence > self._synced:
+                self._synced = sequence
+                self._flushed.notify_all()
+
+    def _flush_loop(self):
+        """Group commit: one fsync for all frames appended since the last one"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                if self._written - self._synced < self.flush_records:
+                    self._pending.wait(self.flush_interval)
+                full = self._size >= self.segment_bytes
+            if full:
+                self.rotate()
+            else:
+                self._sync()
+
+    def _compact_loop(self):
+        while not self._closed:
+            time.sleep(self.compact_interval)
+            try:
+                # Close the active segment too, so quiet periods still get compacted
+                self.rotate()
+                self.compact_closed()
+            except Exception as e:
+                logger.error(f"Error compacting write-ahead log: {str(e)}")
+
+    def compact_closed(self):
+        """
+        Hand every closed segment to the compaction callback and delete it
+
+        Segments left in the writer directories of processes that have exited
+        are compacted too.
+
+        Returns:
+        - Number of segments compacted
+        """
+        with self._compact_lock:
+            with self._lock:
+                active = self._segment
+            closed = [path for path in self._segments() if self._segment_number(path) < active]
+            for path in closed:
+                self._compact_segment(path)
+
+            return len(closed) + self._compact_orphans()
+
+    def _compact_segment(self, path):
+        payloads, _ = read_frames(path)
+        if payloads:
+            self.compact(payloads, self._segment_name(path))
+        os.remove(path)
+        logger.info(f"Compacted {len(payloads)} frames from {path}")
+
+    def _compact_orphans(self):
+        """Compact the segments of writer directories no live process holds (compaction lock held)"""
+        count = 0
+        for directory in sorted(glob.glob(os.path.join(os.path.dirname(self.directory), 'writer-*'))):
+            if directory == self.directory or not self._segments(directory):
+                continue
+            with open(os.path.join(directory, 'LOCK'), 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live writer owns it
+                for path in self._segments(directory):
+                    self._compact_segment(path)
+                    count += 1
+        return count
+
+    def rotate(self):
+        """Close the active segment so its frames become eligible for compaction"""
+        with self._sync_lock:
+            with self._lock:
+                if self._closed or not self._size:
+                    return
+                self._file.flush()
+                closed, sequence = self._file, self._written
+                self._segment += 1
+                self._file = open(self._segment_path(self._segment), 'ab')
+                self._size = 0
+            os.fsync(closed.fileno())
+            closed.close()
+            self._publish(sequence)
+
+    def close(self):
+        """Flush the log, compact everything in it and release its writer directory"""
+        self.rotate()
+        with self._sync_lock:
+            with self._lock:
+                self._closed = True
+                self._file.close()
+                self._pending.notify_all()
+                self._flushed.notify_all()
+        self.compact_closed()
+        fcntl.flock(self._dir_lock, fcntl.LOCK_UN)
+        self._dir_lock.close()
@@ -0,0 +1,224 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from shapely.strtree import STRtree
+import threading
+import time
+import logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ordering used to report the most severe zone containing a point
+LEVEL_RANK = {'low': 1, 'medium': 2, 'high': 3}
+
+class ActiveZoneRegistry:
+    """
+    In-memory registry of active threat zones.
+
+    Zones produced by calculate_threat_zone are kept until they expire and are
+    indexed with an STRtree so that large batches of points can be matched
+    against every active zone at once.
+    """
+
+    def __init__(self, default_ttl=None):
+        """
+        Initialize an empty registry
+
+        Parameters:
+        - default_ttl: Seconds a zone stays active when ingested without an explicit ttl
+        """
+        self.default_ttl = default_ttl if default_ttl is not None else Config.ZONE_TTL_SECONDS
+        self._lock = threading.Lock()
+        self._zones = {}
+
+        # Spatial index state, rebuilt lazily after zones are added or removed
+        self._tree = None
+        self._geoms = None
+        self._entries = []
+        self._dirty = False
+
+    def ingest(self, zone_id, threat_zones, ttl=None):
+        """
+        Register (or replace) the zones of an incident
+
+        Parameters:
+        - zone_id: Identifier of the incident owning the zones
+        - threat_zones: Dictionary returned by calculate_threat_zone
+        - ttl: Seconds until the zones expire (defaults to the registry ttl)
+
+        Returns:
+        - Number of polygons indexed for the incident
+        """
+        polygons = []
+        for zone_type, levels in (threat_zones or {}).items():
+            if not isinstance(levels, dict):
+                continue
+            for level, coords in levels.items():
+                # A closed ring needs at least four coordinates
+                if not coords or len(coords) < 4:
+                    continue
+                polygon = Polygon(coords)
+                if not polygon.is_valid:
+                    polygon = shapely.make_valid(polygon)
+                polygons.append((zone_type, level, polygon))
+
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+
+        with self._lock:
+            if polygons:
+                self._zones[zone_id] = {
+                    'polygons': polygons,
+                    'created_at': now,
+                    'expires_at': expires_at
+                }
+            else:
+                self._zones.pop(zone_id, None)
+            self._dirty = True
+
+        logger.info(f"Registered {len(polygons)} zone polygons for {zone_id}")
+        return len(polygons)
+
+    def remove(self, zone_id):
+        """
+        Remove the zones of an incident
+
+        Parameters:
+        - zone_id: Identifier of the incident
+
+        Returns:
+        - True if the incident was registered, False otherwise
+        """
+        with self._lock:
+            removed = self._zones.pop(zone_id, None) is not None
+            if removed:
+                self._dirty = True
+        return removed
+
+    def purge_expired(self, now=None):
+        """
+        Drop every incident whose zones have expired
+
+        Parameters:
+        - now: Current time in seconds since the epoch (defaults to time.time())
+
+        Returns:
+        - Number of incidents removed
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [zone_id for zone_id, zone in self._zones.items() if zone['expires_at'] <= now]
+            for zone_id in expired:
+                del self._zones[zone_id]
+            if expired:
+                self._dirty = True
+
+        if expired:
+            logger.info(f"Expired zones for {len(expired)} incidents")
+        return len(expired)
+
+    def _rebuild_index(self):
+        """Rebuild the STRtree over all active polygons (caller holds the lock)"""
+        entries = []
+        geoms = []
+        for zone_id, zone in self._zones.items():
+            for zone_type, level, polygon in zone['polygons']:
+                entries.append((zone_id, zone_type, level))
+                geoms.append(polygon)
+
+        if geoms:
+            self._geoms = np.array(geoms, dtype=object)
+            shapely.prepare(self._geoms)
+            self._tree = STRtree(self._geoms)
+        else:
+            self._geoms = None
+            self._tree = None
+
+        self._entries = entries
+        self._dirty = False
+
+    def query(self, latitudes, longitudes):
+        """
+        Find the active zones containing each point
+
+        Parameters:
+        - latitudes, longitudes: Sequences of point coordinates
+
+        Returns:
+        - List with one entry per point holding the containing zones and the most severe level
+        """
+        xs = np.asarray(longitudes, dtype=float).ravel()
+        ys = np.asarray(latitudes, dtype=float).ravel()
+        if xs.shape != ys.shape:
+            raise ValueError("latitudes and longitudes must have the same length")
+
+        self.purge_expired()
+
+        with self._lock:
+            if self._dirty:
+                self._rebuild_index()
+            tree = self._tree
+            geoms = self._geoms
+            entries = self._entries
+
+        results = [{'zones': [], 'max_level': None} for _ in range(len(xs))]
+        if tree is None or len(xs) == 0:
+            return results
+
+        # Bounding-box candidates from the tree, refined with an exact vectorized test
+        point_idx, geom_idx = tree.query(shapely.points(xs, ys))
+        inside = shapely.contains_xy(geoms[geom_idx], xs[point_idx], ys[point_idx])
+
+        for p, g in zip(point_idx[inside], geom_idx[inside]):
+            zone_id, zone_type, level = entries[g]
+            result = results[p]
+            result['zones'].append({
+                'zone_id': zone_id,
+                'zone_type': zone_type,
+                'level': level
+            })
+            if LEVEL_RANK.get(level, 0) > LEVEL_RANK.get(result['max_level'], 0):
+                result['max_level'] = level
+
+        return results
+
+    def zone_polygons(self):
+        """
+        List the polygons of every active incident with their levels
+
+        Combined zones are used when an incident has them, since they already
+        cover its blast, thermal and dispersion zones.
+
+        Returns:
+        - List of (level, shapely polygon) pairs
+        """
+        self.purge_expired()
+        with self._lock:
+            zones = list(self._zones.values())
+
+        polygons = []
+        for zone in zones:
+            combined = [(level, polygon) for zone_type, level, polygon in zone['polygons']
+                        if zone_type == 'combined_threat_zones']
+            polygons.extend(combined or [(level, polygon) for _, level, polygon in zone['polygons']])
+        return polygons
+
+    def active_zones(self):
+        """
+        Summarize the registered incidents
+
+        Returns:
+        - List of dictionaries with zone id, polygon count and expiry time
+        """
+        self.purge_expired()
+        with self._lock:
+            return [
+                {
+                    'zone_id': zone_id,
+                    'polygon_count': len(zone['polygons']),
+                    'created_at': zone['created_at'],
+                    'expires_at': zone['expires_at']
+                }
+                for zone_id, zone in self._zones.items()
+            ]